@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+benchmark.py - Per-stage latency benchmark for the GAGAN NETRA hot path
+
+Drives the real main.py pipeline stages with synthetic frames, synthetic
+PMS7003/BME688 readings and stub detectors of configurable latency, so it
+runs on any CPU (no camera, sensors, GPU or model files needed).
+
+Reports p50/p95/p99 latency and throughput for every pipeline stage, every
+timed step inside the stages (YOLO calls, box drawing, overlay, evidence
+encode/write, CSV append, video write) and end to end, and writes the
+results as JSON so runs can be compared across commits and Jetson models.
+
+Usage:
+    python3 benchmark.py --frames 500 --output bench_orin.json
+    python3 benchmark.py --fire-ms 40 --human-ms 25 --object-ms 25 --width 1920 --height 1080
+    python3 benchmark.py --output new.json --compare bench_orin.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import types
+
+import cv2
+import numpy as np
+
+from bme688_sampler import BMESample
+from pms7003_reader import PMSSample
+from tiled_inference import TILE_MODES
+
+# ============================================================
+# STUB DETECTORS
+# ============================================================
+class StubBoxes:
+    """Minimal stand-in for ultralytics Boxes (truthiness, len, iteration)"""
+
+    def __init__(self, boxes):
+        self._boxes = boxes
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __iter__(self):
+        return iter(self._boxes)
+
+
+class StubResult:
+    def __init__(self, boxes):
+        self.boxes = StubBoxes(boxes)
+
+
+class StubDetector:
+    """
+    Callable with the YOLO call signature that sleeps for `latency_ms`
+    (+/- jitter) and returns boxes on `detect_rate` of the frames: random
+    ones, or with `fires` > 0 boxes that wander around that many fixed
+    positions (so the fire tracker sees persistent fires). A list of images
+    is one batched call costing `batch_cost` of a call per extra image.
+    Raw frames are letterboxed and normalised like Ultralytics does, so the
+    benchmark sees the cost that shared preprocessing removes.
+    Sleeping releases the GIL the same way a TensorRT call does.
+    """
+
+    def __init__(self, latency_ms, jitter=0.1, detect_rate=0.3, max_boxes=3, fires=0, batch_cost=0.4,
+                 seed=0):
+        self.latency = latency_ms / 1000.0
+        self.batch_cost = batch_cost
+        self.jitter = jitter
+        self.detect_rate = detect_rate
+        self.max_boxes = max_boxes
+        self.fires = fires
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._fire_boxes = None
+        self._frame_shape = None
+
+    def __call__(self, frame, conf=0.25, verbose=False):
+        self.calls += 1
+        images = frame if isinstance(frame, list) else [frame]
+        for image in images:
+            if image.ndim == 3:
+                self._preprocess(image)
+        if self.latency > 0:
+            # Batched calls (tiled inference) cost a fraction of a call per extra image
+            batch = 1.0 + self.batch_cost * (len(images) - 1)
+            time.sleep(max(0.0, self.latency * batch * (1.0 + self._rng.gauss(0.0, self.jitter))))
+        if self._frame_shape is None:
+            self._frame_shape = images[0].shape
+        # Crops smaller than a frame come back empty: the stub only knows frame positions
+        return [StubResult(self._detect(image, conf) if image.shape == self._frame_shape else [])
+                for image in images]
+
+    def _preprocess(self, image, size=640):
+        """The CPU work Ultralytics does on a raw BGR frame: letterbox, RGB, CHW, 0-1"""
+        scale = min(size / image.shape[0], size / image.shape[1])
+        resized = cv2.resize(image, (round(image.shape[1] * scale), round(image.shape[0] * scale)))
+        canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+        top, left = (size - resized.shape[0]) // 2, (size - resized.shape[1]) // 2
+        canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+        return np.ascontiguousarray(canvas[..., ::-1].transpose(2, 0, 1))[None].astype(np.float32) / 255
+
+    def _detect(self, frame, conf):
+        boxes = []
+        if self._rng.random() < self.detect_rate:
+            # Raw HWC frame, or an NCHW input tensor from preprocess.py
+            height, width = frame.shape[-2:] if frame.ndim == 4 else frame.shape[:2]
+            if self.fires and self._fire_boxes is None:
+                self._fire_boxes = [self._random_box(width, height) for _ in range(self.fires)]
+            if self.fires:
+                candidates = []
+                for x1, y1, x2, y2 in self._fire_boxes:
+                    dx, dy = self._rng.randint(-8, 8), self._rng.randint(-8, 8)
+                    candidates.append((x1 + dx, y1 + dy, x2 + dx, y2 + dy))
+            else:
+                candidates = [self._random_box(width, height)
+                              for _ in range(self._rng.randint(1, self.max_boxes))]
+            for x1, y1, x2, y2 in candidates:
+                score = self._rng.uniform(conf, 0.95)
+                boxes.append(types.SimpleNamespace(conf=np.array([score], dtype=np.float32),
+                                                   xyxy=np.array([[x1, y1, x2, y2]], dtype=np.float32),
+                                                   cls=np.array([0.0], dtype=np.float32)))
+        return boxes
+
+    def _random_box(self, width, height):
+        x1, y1 = self._rng.randint(0, width - 64), self._rng.randint(64, height - 64)
+        return (x1, y1, min(width, x1 + self._rng.randint(32, 256)), min(height, y1 + self._rng.randint(32, 256)))
+
+
+# ============================================================
+# SYNTHETIC SOURCES
+# ============================================================
+class SyntheticCamera:
+    """
+    ThreadedCamera stand-in that hands out `frames` noise frames, each
+    repeated `hold` times in a row (a static scene for the scene gate).
+    fps=0 delivers as fast as the pipeline consumes them; timestamps
+    always advance by 1/nominal_fps so time-based logic (fire tracks,
+    sensor lookups) behaves like a real flight.
+    """
+
+    def __init__(self, frames, width=1280, height=720, fps=0.0, nominal_fps=30.0, pool=8, hold=1, seed=0):
+        rng = np.random.default_rng(seed)
+        self._pool = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(pool)]
+        self.frames = frames
+        self.hold = max(1, hold)
+        self.fps = fps
+        self.nominal_fps = nominal_fps
+        self.start_time = time.time()
+        self.seq = 0
+        self.finished = False
+        self._next_due = None
+
+    def read_new(self, timeout=None):
+        if self.seq >= self.frames:
+            self.finished = True
+            return self.seq, self.start_time + self.seq / self.nominal_fps, None
+        if self.fps > 0:
+            now = time.perf_counter()
+            if self._next_due is None:
+                self._next_due = now
+            if self._next_due > now:
+                time.sleep(self._next_due - now)
+            self._next_due += 1.0 / self.fps
+        frame = self._pool[(self.seq // self.hold) % len(self._pool)]
+        timestamp = self.start_time + self.seq / self.nominal_fps
+        self.seq += 1
+        return self.seq, timestamp, frame
+
+    def read(self):
+        return self.read_new()
+
+    def wait_ready(self, timeout=10.0):
+        return True
+
+    def get_frame_size(self):
+        return self._pool[0].shape[1], self._pool[0].shape[0]
+
+    def get_stats(self):
+        return {'frames': self.seq, 'dropped': 0, 'duplicates': 0,
+                'read_failures': 0, 'reconnects': 0}
+
+    def release(self):
+        pass
+
+
+class SyntheticPMS7003:
+    """PMS7003Reader stand-in: PM2.5 sweeps 10..300 so every fusion branch is hit"""
+
+    def sample_at(self, timestamp):
+        pm25 = 10 + int(timestamp * 7) % 290
+        return PMSSample(timestamp, pm25, pm25, pm25, pm25, pm25, pm25, 0, 0, 0, 0, 0, 0)
+
+    def get_latest(self):
+        return self.sample_at(time.time())
+
+    def close(self):
+        pass
+
+
+class SyntheticBME688:
+    """BME688Sampler stand-in with slowly varying temperature and gas resistance"""
+
+    def sample_at(self, timestamp):
+        temp = 25.0 + 10.0 * (0.5 + 0.5 * np.sin(timestamp / 5.0))
+        gas_res = 15000 + int(timestamp * 1000) % 200000
+        return BMESample(timestamp, float(temp), 40.0, 1013.0, float(gas_res), True)
+
+    def get_latest(self):
+        return self.sample_at(time.time())
+
+    def close(self):
+        pass
+
+
+# ============================================================
+# RUN
+# ============================================================
+def get_environment():
+    """Identify the machine and commit so results can be compared"""
+    env = {
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'hostname': platform.node(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        with open('/proc/device-tree/model') as f:  # e.g. "NVIDIA Jetson Orin Nano Developer Kit"
+            env['device_model'] = f.read().strip('\x00\n ')
+    except OSError:
+        env['device_model'] = None
+    try:
+        here = os.path.dirname(os.path.abspath(__file__))
+        env['git_commit'] = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=here, stderr=subprocess.DEVNULL).decode().strip()
+        env['git_dirty'] = bool(subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=here,
+            stderr=subprocess.DEVNULL).strip())
+    except (OSError, subprocess.CalledProcessError):
+        env['git_commit'] = None
+    return env
+
+
+def run_benchmark(args):
+    import main
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="gagan_bench_")
+    main.HEADLESS_MODE = True
+    main.RECORD_VIDEO = not args.no_record
+    main.CSV_FILE = os.path.join(work_dir, "flight_log.csv")
+    main.FLIGHT_SEGMENT_DIR = os.path.join(work_dir, "flight_segments")
+    main.EVIDENCE_DIR = os.path.join(work_dir, "evidence")
+    main.CLIP_DIR = os.path.join(work_dir, "evidence_clips")
+    main.SPOOL_DIR = os.path.join(work_dir, "upload_spool")
+    main.VIDEO_SAVE_PATH = os.path.join(work_dir, "flight_recordings")
+
+    main.fire_model = StubDetector(args.fire_ms, args.jitter, args.detect_rate, fires=args.fires,
+                                   seed=args.seed)
+    main.human_model = StubDetector(args.human_ms, args.jitter, args.detect_rate, seed=args.seed + 1)
+    main.object_model = StubDetector(args.object_ms, args.jitter, args.detect_rate, seed=args.seed + 2)
+    main.TILE_MODE = args.tile_mode
+    main.SHARED_PREPROCESS = not args.no_shared_preprocess
+    main.init_scheduler()
+    main.pms_sensor = SyntheticPMS7003()
+    main.bme_sampler = SyntheticBME688()
+    main.gps = None
+    main.cap = SyntheticCamera(args.frames, args.width, args.height, fps=args.fps, hold=args.hold,
+                               seed=args.seed)
+
+    main.init_spool(offline=True)  # Spool writes are measured, uploads are not
+    main.init_flight_log()
+    main.init_clip_buffer()
+    main.init_video_recorder()
+    # A paced source behaves like the live camera; unpaced, nothing may be dropped
+    main.build_pipeline(block=args.fps <= 0)
+
+    print(f"[BENCH] {args.frames} frames {args.width}x{args.height} | detectors "
+          f"{args.fire_ms}/{args.human_ms}/{args.object_ms} ms | output {work_dir}")
+    started = time.time()
+    main.pipeline.start()
+    try:
+        while not (main.cap.finished and main.pipeline.is_idle()):
+            time.sleep(0.05)
+    finally:
+        elapsed = time.time() - started
+        main.pipeline.stop()
+        if main.clip_buffer is not None:
+            main.clip_buffer.close()
+        main.spool.stop()
+        main.flight_log.close()
+        if main.video_recorder is not None:
+            main.video_recorder.close()
+
+    report = main.get_run_report(elapsed)
+    report['config'] = vars(args)
+    report['environment'] = get_environment()
+    report['detector_calls'] = {'fire': main.fire_model.calls, 'human': main.human_model.calls,
+                                'object': main.object_model.calls}
+    if not args.work_dir and not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+# ============================================================
+# REPORTING
+# ============================================================
+def print_report(report):
+    print(f"\n[BENCH] {report['frames']} frames in {report['elapsed_s']:.2f}s = {report['fps']:.1f} FPS")
+    print(f"{'name':<22}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'fps':>8}")
+    for name, s in report['pipeline']['stages'].items():
+        print(f"{'stage:' + name:<22}{s['processed']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+              f"{s['p99_ms']:>10.2f}{s['fps']:>8.1f}")
+    for name, s in sorted(report['steps'].items()):
+        print(f"{name:<22}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}")
+    drops = {name: q['dropped'] for name, q in report['pipeline']['queues'].items() if q['dropped']}
+    if drops:
+        print(f"[BENCH] Dropped: {drops}")
+
+
+def _flatten(report):
+    """name -> (p50, p95) for every stage and step of a report"""
+    rows = {f"stage:{name}": (s['p50_ms'], s['p95_ms'])
+            for name, s in report['pipeline']['stages'].items()}
+    rows.update({name: (s['p50_ms'], s['p95_ms']) for name, s in report['steps'].items()})
+    return rows
+
+
+def compare_reports(base, new):
+    """Print p50/p95 deltas between two benchmark reports"""
+    base_env, new_env = base.get('environment', {}), new.get('environment', {})
+    print(f"\n[BENCH] {base_env.get('git_commit')} ({base_env.get('device_model') or base_env.get('machine')})"
+          f" -> {new_env.get('git_commit')} ({new_env.get('device_model') or new_env.get('machine')})")
+    print(f"FPS: {base['fps']:.1f} -> {new['fps']:.1f} ({_percent(base['fps'], new['fps'])})")
+    old_rows, new_rows = _flatten(base), _flatten(new)
+    print(f"{'name':<22}{'p50 ms':>18}{'p95 ms':>18}")
+    for name in sorted(set(old_rows) | set(new_rows)):
+        if name not in old_rows or name not in new_rows:
+            print(f"{name:<22}{'(only in ' + ('new' if name in new_rows else 'base') + ')':>18}")
+            continue
+        (p50_a, p95_a), (p50_b, p95_b) = old_rows[name], new_rows[name]
+        print(f"{name:<22}{p50_a:>7.2f} ->{p50_b:>7.2f}{p95_a:>9.2f} ->{p95_b:>7.2f}  "
+              f"{_percent(p50_a, p50_b)}")
+
+
+def _percent(old, new):
+    if not old:
+        return "n/a"
+    return f"{100.0 * (new - old) / old:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the GAGAN NETRA detection hot path")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=0.0,
+                        help="Pace the synthetic camera (0 = as fast as the pipeline runs)")
+    parser.add_argument('--fire-ms', type=float, default=30.0, help="Stub fire detector latency")
+    parser.add_argument('--human-ms', type=float, default=20.0, help="Stub human detector latency")
+    parser.add_argument('--object-ms', type=float, default=20.0, help="Stub object detector latency")
+    parser.add_argument('--jitter', type=float, default=0.1, help="Relative std-dev of detector latency")
+    parser.add_argument('--detect-rate', type=float, default=0.3, help="Fraction of frames with detections")
+    parser.add_argument('--hold', type=int, default=1,
+                        help="Repeat each synthetic frame N times (static scene; exercises scene gating)")
+    parser.add_argument('--fires', type=int, default=2,
+                        help="Persistent fires the stub detector reports (0 = random boxes, rarely tracked)")
+    parser.add_argument('--tile-mode', choices=TILE_MODES, default='off',
+                        help="Fire detector tiling (stub crops add latency but no detections)")
+    parser.add_argument('--no-shared-preprocess', action='store_true',
+                        help="Let every detector preprocess the frame itself")
+    parser.add_argument('--no-record', action='store_true', help="Skip the record stage")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', help="Keep CSV/evidence/video here instead of a temp dir")
+    parser.add_argument('--keep', action='store_true', help="Do not delete the temp output")
+    parser.add_argument('--output', help="Write the JSON report here")
+    parser.add_argument('--compare', metavar='BASE_JSON', help="Print deltas against an earlier report")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Report saved: {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare_reports(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
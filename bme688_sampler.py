@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+bme688_sampler.py - Non-blocking BME688 sampler for GAGAN NETRA
+
+A dedicated thread owns the I2C sensor and polls it at its own cadence
+(each gas measurement keeps the heater on for ~150 ms). Readings are
+published into a SampleBuffer so the detection loop never touches I2C.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from sensor_buffer import SampleBuffer
+
+BMESample = namedtuple('BMESample', [
+    'timestamp',
+    'temperature',     # °C
+    'humidity',        # %RH
+    'pressure',        # hPa
+    'gas_resistance',  # Ohms
+    'heat_stable',     # Gas heater reached target temperature
+])
+
+FIELDS = ('temperature', 'humidity', 'pressure', 'gas_resistance')
+
+
+class BME688Sampler:
+    def __init__(self, sensor, interval=1.0, max_age=5.0, history=300):
+        """
+        sensor: configured bme680.BME680 instance
+        interval: seconds between measurements
+        max_age: readings older than this are reported as stale
+        """
+        self.sensor = sensor
+        self.interval = interval
+        self.max_age = max_age
+        self.buffer = SampleBuffer(history)
+        self.read_errors = 0
+        self._stop = threading.Event()
+        self.sample_thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self.sample_thread.start()
+
+    def _sample_loop(self):
+        """Background thread: measure, publish, wait for the next slot"""
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                if self.sensor.get_sensor_data():
+                    data = self.sensor.data
+                    self.buffer.publish(BMESample(
+                        started, data.temperature, data.humidity,
+                        data.pressure, data.gas_resistance, data.heat_stable,
+                    ))
+            except Exception as e:
+                self.read_errors += 1
+                print(f"[BME688] Read error: {e}")
+            self._stop.wait(max(0.0, self.interval - (time.time() - started)))
+
+    def get_latest(self):
+        """Get the latest BMESample, or None before the first reading"""
+        return self.buffer.get_latest()
+
+    def sample_at(self, timestamp):
+        """Get the newest BMESample captured at or before `timestamp`"""
+        return self.buffer.sample_at(timestamp)
+
+    def get_age(self):
+        """Seconds since the latest reading"""
+        return self.buffer.get_age()
+
+    def is_stale(self):
+        """True if there is no reading newer than max_age"""
+        return self.buffer.get_age() > self.max_age
+
+    def get_reading(self):
+        """Get latest reading as a dict with its timestamp and stale flag"""
+        sample = self.buffer.get_latest()
+        if sample is None:
+            return None
+        reading = sample._asdict()
+        reading['stale'] = self.is_stale()
+        return reading
+
+    def get_stats(self):
+        """Rolling mean/min/max of each field over the buffered history"""
+        history = self.buffer.get_history()
+        stats = {'samples': len(history), 'read_errors': self.read_errors}
+        for field in FIELDS:
+            values = [getattr(s, field) for s in history]
+            if values:
+                stats[field] = {
+                    'mean': sum(values) / len(values),
+                    'min': min(values),
+                    'max': max(values),
+                }
+        return stats
+
+    def close(self):
+        self._stop.set()
+        self.sample_thread.join(timeout=2)
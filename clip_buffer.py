@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+clip_buffer.py - Pre-event ring buffer and incident clips for GAGAN NETRA
+
+Keeps the last few seconds of capture in memory as downscaled JPEGs
+(sampled at `fps`, within a fixed byte budget). When an incident is
+logged, the frames from `pre_roll` seconds before it up to `post_roll`
+seconds after it are written out as a short clip by a background thread,
+and `on_done(path)` is called so the clip can be linked to the incident.
+
+Memory is bounded by the ring budget plus at most `max_pending` clips
+waiting for their post-roll (see get_stats()).
+"""
+
+import os
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class PreRollBuffer:
+    def __init__(self, clip_dir, pre_roll=5.0, post_roll=5.0, fps=5.0, width=640, quality=70,
+                 budget_bytes=32 * 2**20, max_pending=4, fourcc='XVID', extension='avi'):
+        """
+        fps: frames kept per second of capture (the clip frame rate)
+        width: frames wider than this are downscaled before compression
+        budget_bytes: ring size limit; the oldest frames are evicted first
+        max_pending: clips waiting for post-roll or writing; further triggers are refused
+        """
+        self.clip_dir = clip_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.fps = fps
+        self.width = width
+        self.quality = quality
+        self.budget_bytes = budget_bytes
+        self.max_pending = max_pending
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.extension = extension
+
+        self.frames_added = 0
+        self.frames_evicted = 0
+        self.clips_written = 0
+        self.clips_refused = 0
+
+        self._ring = deque()       # (timestamp, jpeg bytes), oldest first
+        self._ring_bytes = 0
+        self._last_added = None
+        self._active = []          # Clips still collecting post-roll frames
+        self._finished = deque()   # Clips ready to be written
+        self._cond = threading.Condition()
+        self.running = True
+
+        os.makedirs(clip_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    # ------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------
+    def add(self, frame, timestamp):
+        """Offer a captured frame; only one per 1/fps seconds is compressed and kept"""
+        if self._last_added is not None and timestamp - self._last_added < 1.0 / self.fps:
+            return
+        self._last_added = timestamp
+        if self.width and frame.shape[1] > self.width:
+            height = round(frame.shape[0] * self.width / frame.shape[1])
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return
+        data = buffer.tobytes()
+
+        with self._cond:
+            self._ring.append((timestamp, data))
+            self._ring_bytes += len(data)
+            self.frames_added += 1
+            while self._ring_bytes > self.budget_bytes and len(self._ring) > 1:
+                _, evicted = self._ring.popleft()
+                self._ring_bytes -= len(evicted)
+                self.frames_evicted += 1
+            for clip in list(self._active):
+                if timestamp > clip['end']:
+                    self._finish(clip)
+                else:
+                    clip['frames'].append((timestamp, data))
+
+    def clip_path(self, name):
+        """Where the clip for evidence `name` will be written"""
+        return os.path.join(self.clip_dir, os.path.splitext(name)[0] + '.' + self.extension)
+
+    def trigger(self, name, timestamp, on_done=None):
+        """
+        Start a clip around an incident at `timestamp` (capture time)
+
+        Returns the clip path, or None if too many clips are pending.
+        on_done(path) is called from the writer thread once the clip exists.
+        """
+        with self._cond:
+            if len(self._active) + len(self._finished) >= self.max_pending:
+                self.clips_refused += 1
+                print(f"[CLIP] ? Too many pending clips, skipping {name}")
+                return None
+            # The ring may already hold post-roll frames (the logger runs behind capture)
+            frames = [(t, data) for t, data in self._ring if t >= timestamp - self.pre_roll]
+            clip = {'path': self.clip_path(name), 'end': timestamp + self.post_roll,
+                    'frames': [f for f in frames if f[0] <= timestamp + self.post_roll],
+                    'on_done': on_done}
+            if frames and frames[-1][0] > clip['end']:
+                self._finish(clip)
+            else:
+                self._active.append(clip)
+            return clip['path']
+
+    def _finish(self, clip):
+        if clip in self._active:
+            self._active.remove(clip)
+        self._finished.append(clip)
+        self._cond.notify_all()
+
+    # ------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._finished or not self.running, timeout=1.0)
+                if not self._finished:
+                    if not self.running:
+                        return
+                    continue
+                clip = self._finished[0]
+            try:
+                written = self._write_clip(clip)
+            except Exception as e:
+                written = False
+                print(f"[CLIP] Writing {clip['path']} failed: {e}")
+            with self._cond:
+                self._finished.popleft()
+            if written:
+                self.clips_written += 1
+                if clip['on_done']:
+                    try:
+                        clip['on_done'](clip['path'])
+                    except Exception as e:
+                        print(f"[CLIP] Callback for {clip['path']} failed: {e}")
+
+    def _write_clip(self, clip):
+        """Decode the buffered JPEGs into a clip, placing frames by timestamp"""
+        frames = clip['frames']
+        if not frames:
+            print(f"[CLIP] ? No buffered frames for {clip['path']}")
+            return False
+        start = frames[0][0]
+        tmp_path = clip['path'] + '.tmp.' + self.extension  # Keep the extension for the muxer
+        writer = previous = None
+        written = 0
+        try:
+            for timestamp, data in frames:
+                image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if writer is None:
+                    size = (image.shape[1], image.shape[0])
+                    writer = cv2.VideoWriter(tmp_path, self.fourcc, self.fps, size)
+                elif (image.shape[1], image.shape[0]) != size:
+                    image = cv2.resize(image, size)
+                # Repeat the previous frame over capture gaps so the clip plays in real time
+                target = int((timestamp - start) * self.fps) + 1
+                while previous is not None and written < target - 1:
+                    writer.write(previous)
+                    written += 1
+                if written < target:
+                    writer.write(image)
+                    written += 1
+                    previous = image
+        finally:
+            if writer is not None:
+                writer.release()
+        os.replace(tmp_path, clip['path'])
+        print(f"[CLIP] Saved {clip['path']} ({len(frames)} frames, {frames[-1][0] - start:.1f}s)")
+        return True
+
+    # ------------------------------------------------------------
+    # Stats / shutdown
+    # ------------------------------------------------------------
+    def get_stats(self):
+        with self._cond:
+            pending = self._active + list(self._finished)
+            return {
+                'ring_frames': len(self._ring),
+                'ring_bytes': self._ring_bytes,
+                'ring_seconds': self._ring[-1][0] - self._ring[0][0] if self._ring else 0.0,
+                'pending_clips': len(pending),
+                # Frames shared with the ring are counted in both
+                'pending_bytes': sum(len(data) for clip in pending for _, data in clip['frames']),
+                'frames_added': self.frames_added,
+                'frames_evicted': self.frames_evicted,
+                'clips_written': self.clips_written,
+                'clips_refused': self.clips_refused,
+            }
+
+    def close(self, timeout=10.0):
+        """Write clips still waiting for post-roll with what they have, then stop"""
+        with self._cond:
+            for clip in list(self._active):
+                self._finish(clip)
+            self.running = False
+            self._cond.notify_all()
+        self.thread.join(timeout)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+evidence_cache.py - Evidence image cache for the GAGAN NETRA dashboard
+
+Two-level LRU cache (memory + disk, each with a byte budget) in front of
+the S3 evidence URLs. Thumbnails are generated once per image and cached
+like any other entry, so list/preview rendering never re-downloads the
+full JPEG. All fetches share one pooled requests.Session with timeouts
+and retries, and page thumbnails are fetched concurrently.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+THUMBNAIL_WIDTH = 160
+PREVIEW_WIDTH = 960
+
+
+class EvidenceCache:
+    def __init__(self, cache_dir='evidence_cache', memory_budget=64 * 2**20, disk_budget=512 * 2**20,
+                 timeout=(3.0, 10.0), workers=8, retry_after=60.0):
+        """
+        memory_budget/disk_budget: bytes kept before least-recently-used entries are evicted
+        timeout: (connect, read) seconds per request
+        retry_after: seconds before a failed URL is fetched again (not on every rerun)
+        """
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+        self._memory = OrderedDict()  # key -> bytes
+        self._memory_bytes = 0
+        self._disk = OrderedDict()    # filename -> size, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}          # One download per key, even with concurrent callers
+        self._failed = {}             # url -> time of the last failed fetch
+
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU from file access times (survives dashboard restarts)"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_atime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    # ------------------------------------------------------------
+    # LRU levels
+    # ------------------------------------------------------------
+    @staticmethod
+    def _filename(key):
+        return hashlib.sha1(key.encode()).hexdigest() + '.jpg'
+
+    def _get_cached(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+            name = self._filename(key)
+            if name not in self._disk:
+                return None
+            self._disk.move_to_end(name)
+        try:
+            with open(os.path.join(self.cache_dir, name), 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(name, 0)
+            return None
+        self._put_memory(key, data)
+        return data
+
+    def _put_memory(self, key, data):
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= len(self._memory.pop(key))
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_budget and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _put_disk(self, key, data):
+        name = self._filename(key)
+        path = os.path.join(self.cache_dir, name)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(name, 0)
+            self._disk[name] = len(data)
+        self._evict_disk()
+
+    def _evict_disk(self):
+        with self._lock:
+            victims = []
+            while self._disk_bytes > self.disk_budget and len(self._disk) > 1:
+                name, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                victims.append(name)
+        for name in victims:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def _get_or_create(self, key, create):
+        data = self._get_cached(key)
+        if data is not None:
+            self.hits += 1
+            return data
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            data = self._get_cached(key)  # Another caller may have just produced it
+            if data is None:
+                self.misses += 1
+                data = create()
+                if data is not None:
+                    self._put_disk(key, data)
+                    self._put_memory(key, data)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return data
+
+    # ------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------
+    def _download(self, url):
+        failed_at = self._failed.get(url)
+        if failed_at is not None and time.time() - failed_at < self.retry_after:
+            return None
+        self.fetches += 1
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            self._failed.pop(url, None)
+            return response.content
+        except requests.RequestException as e:
+            self._failed[url] = time.time()
+            print(f"[EVIDENCE] Fetch failed for {url}: {e}")
+            return None
+
+    def get_original(self, url):
+        """Full evidence JPEG, or None if it cannot be fetched"""
+        if not url:
+            return None
+        return self._get_or_create(url, lambda: self._download(url))
+
+    def get_thumbnail(self, url, width=THUMBNAIL_WIDTH):
+        """JPEG scaled down to `width` pixels, generated once per image and width"""
+        if not url:
+            return None
+
+        def create():
+            original = self.get_original(url)
+            return make_thumbnail(original, width) if original else None
+
+        return self._get_or_create(f"thumb{width}:{url}", create)
+
+    def prefetch_thumbnails(self, urls, width=THUMBNAIL_WIDTH):
+        """Fetch/generate thumbnails concurrently. Returns {url: bytes or None}"""
+        urls = [url for url in dict.fromkeys(urls) if url]
+        return dict(zip(urls, self.pool.map(lambda url: self.get_thumbnail(url, width), urls)))
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'memory_items': len(self._memory),
+                'memory_mb': self._memory_bytes / 2**20,
+                'disk_items': len(self._disk),
+                'disk_mb': self._disk_bytes / 2**20,
+                'hits': self.hits,
+                'misses': self.misses,
+                'fetches': self.fetches,
+            }
+
+
+def make_thumbnail(jpeg_bytes, width):
+    """Downscale a JPEG to `width` pixels wide (never upscales)"""
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(jpeg_bytes)) as image:
+            image.draft('RGB', (width, width))  # Let the JPEG decoder skip detail we discard
+            image = image.convert('RGB')
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))),
+                                     Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, format='JPEG', quality=80, optimize=True)
+            return out.getvalue()
+    except Exception as e:
+        print(f"[EVIDENCE] Thumbnail failed: {e}")
+        return None
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+fire_tracker.py - Fire detection tracker for GAGAN NETRA
+
+Associates fire boxes across frames so each fire keeps a stable track ID.
+Matching is greedy on IoU (computed for all track/box pairs at once with
+numpy), with a centroid-distance fallback for small or fast-moving boxes
+that no longer overlap. A track is confirmed after `confirm_hits`
+detections and dropped after `max_age` seconds without one, which lets
+the logger report each fire once and then update its record, instead of
+throttling everything with a global cooldown.
+"""
+
+import numpy as np
+
+
+def box_iou(a, b):
+    """Pairwise IoU of xyxy boxes: (N, 4) x (M, 4) -> (N, M)"""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def _greedy_pairs(scores, threshold, higher_is_better=True):
+    """(row, col) pairs in best-score order, each row/col used once"""
+    flat = scores.ravel()
+    order = np.argsort(-flat if higher_is_better else flat, kind='stable')
+    cols = scores.shape[1]
+    used_rows, used_cols, pairs = set(), set(), []
+    for index in order:
+        value = flat[index]
+        if (value < threshold) if higher_is_better else (value > threshold):
+            break
+        row, col = divmod(int(index), cols)
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        pairs.append((row, col))
+    return pairs
+
+
+class Track:
+    def __init__(self, track_id, box, conf, pm25, timestamp):
+        self.track_id = track_id
+        self.box = box
+        self.conf = conf              # Latest detection confidence
+        self.hits = 1
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.peak_conf = conf
+        self.peak_pm25 = pm25
+        self.confirmed = False
+        self.ground = None            # (lat, lon, error_m) fused over detections, see georeference.py
+        # Set by the logger when the track is reported as an incident
+        self.reported_at = None
+        self.reported_conf = 0.0
+        self.reported_pm25 = 0
+
+
+class FireTracker:
+    def __init__(self, iou_threshold=0.2, center_threshold=1.0, confirm_hits=3, max_age=3.0):
+        """
+        center_threshold: fallback match distance between box centres, in
+                          units of the track box's diagonal
+        confirm_hits: detections before a track is confirmed
+        max_age: seconds a track survives without a matching detection
+        """
+        self.iou_threshold = iou_threshold
+        self.center_threshold = center_threshold
+        self.confirm_hits = confirm_hits
+        self.max_age = max_age
+        self.tracks = []
+        self.created = 0
+        self._next_id = 1
+        self._seen = []               # Tracks matched by the last fresh detections
+
+    def update(self, boxes, confs, timestamp, pm25=0, reused=False):
+        """
+        Match this frame's fire boxes to tracks
+
+        boxes: (N, 4) xyxy array, confs: (N,) array.
+        reused: the boxes are the previous detections again (inference was
+                skipped), so the tracks they matched only stay alive - no
+                hits or peaks are counted.
+        Returns the tracks detected in this frame.
+        """
+        if reused:
+            for track in self._seen:
+                track.last_seen = timestamp
+            self.tracks = [track for track in self.tracks if timestamp - track.last_seen <= self.max_age]
+            return list(self._seen)
+
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        confs = np.asarray(confs, dtype=np.float32).reshape(-1)
+        matches = []
+        unmatched_tracks = list(range(len(self.tracks)))
+        unmatched_boxes = list(range(len(boxes)))
+
+        if self.tracks and len(boxes):
+            track_boxes = np.stack([track.box for track in self.tracks])
+            matches = _greedy_pairs(box_iou(track_boxes, boxes), self.iou_threshold)
+            unmatched_tracks = [i for i in unmatched_tracks if i not in {r for r, _ in matches}]
+            unmatched_boxes = [j for j in unmatched_boxes if j not in {c for _, c in matches}]
+
+            if unmatched_tracks and unmatched_boxes:
+                # Centroid fallback for boxes that moved off their old position
+                t_boxes = track_boxes[unmatched_tracks]
+                b_boxes = boxes[unmatched_boxes]
+                t_centers = (t_boxes[:, :2] + t_boxes[:, 2:]) / 2
+                b_centers = (b_boxes[:, :2] + b_boxes[:, 2:]) / 2
+                diagonals = np.hypot(t_boxes[:, 2] - t_boxes[:, 0], t_boxes[:, 3] - t_boxes[:, 1])
+                distances = (np.linalg.norm(t_centers[:, None, :] - b_centers[None, :, :], axis=2)
+                             / np.maximum(diagonals[:, None], 1e-9))
+                fallback = _greedy_pairs(distances, self.center_threshold, higher_is_better=False)
+                fallback = [(unmatched_tracks[r], unmatched_boxes[c]) for r, c in fallback]
+                matches += fallback
+                unmatched_boxes = [j for j in unmatched_boxes if j not in {c for _, c in fallback}]
+
+        seen = []
+        for row, col in matches:
+            track = self.tracks[row]
+            track.box = boxes[col]
+            track.conf = float(confs[col])
+            track.hits += 1
+            track.last_seen = timestamp
+            track.peak_conf = max(track.peak_conf, track.conf)
+            track.peak_pm25 = max(track.peak_pm25, pm25)
+            track.confirmed = track.confirmed or track.hits >= self.confirm_hits
+            seen.append(track)
+        for col in unmatched_boxes:
+            track = Track(self._next_id, boxes[col], float(confs[col]), pm25, timestamp)
+            track.confirmed = self.confirm_hits <= 1
+            self._next_id += 1
+            self.created += 1
+            self.tracks.append(track)
+            seen.append(track)
+
+        self.tracks = [track for track in self.tracks if timestamp - track.last_seen <= self.max_age]
+        self._seen = seen
+        return seen
+
+    def get_stats(self):
+        return {
+            'active': len(self.tracks),
+            'confirmed': sum(1 for track in self.tracks if track.confirmed),
+            'created': self.created,
+        }
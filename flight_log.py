@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+flight_log.py - Buffered, versioned flight log for GAGAN NETRA
+
+Replaces the open/append/close per event on gagan_netra_flight_log.csv:
+
+    CSV       rows are buffered and flushed every `flush_interval` seconds
+              or `flush_rows` rows, with an explicit fsync policy. On open,
+              a torn last line (power loss mid-write) is cut off and an
+              older header is migrated to the current schema.
+    Segments  the same rows, written as rotating Parquet files (pyarrow,
+              optional) so analytics over many flights can read only the
+              columns they need. Segment names carry the CSV row range they
+              cover, so rows logged but not yet segmented before a crash
+              are re-segmented from the CSV on the next start.
+
+The schema version is kept next to the CSV (<csv>.schema.json) and in the
+metadata of every segment.
+
+Usage (read columns back from the segments):
+    python3 flight_log.py flight_segments --columns timestamp pm25 severity
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import threading
+import time
+
+SCHEMA_VERSION = 5
+
+# (column, arrow type) in file order; v2 added evidence_url, v3 clip_url,
+# v4 the ground-projected fire position (latitude/longitude are the UAV's),
+# v5 human_detected (an input of the fusion rules)
+COLUMNS = (
+    ('timestamp', 'string'),
+    ('latitude', 'float64'),
+    ('longitude', 'float64'),
+    ('altitude', 'float64'),
+    ('pm25', 'float64'),
+    ('gas_resistance', 'float64'),
+    ('temperature', 'float64'),
+    ('fire_confidence', 'float64'),
+    ('fire_source', 'string'),
+    ('severity', 'string'),
+    ('gps_satellites', 'int64'),
+    ('gps_fix_type', 'int64'),
+    ('evidence_url', 'string'),
+    ('clip_url', 'string'),
+    ('fire_latitude', 'float64'),
+    ('fire_longitude', 'float64'),
+    ('fire_position_error_m', 'float64'),
+    ('human_detected', 'bool_'),
+)
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+# Header names used by older logs (see update_csv_header.py)
+RENAMED_COLUMNS = {
+    'fire_classification': 'fire_source',
+    'gps_lat': 'latitude',
+    'gps_lon': 'longitude',
+    'gps_alt': 'altitude',
+}
+
+# Sources only fusion_rules.classify_fire_source's human branch gives; rows
+# logged before v5 with one of these had a human detected
+HUMAN_SOURCES = ('Human-caused Smoke', 'Human Activity Fire', 'Cooking Fire')
+
+FSYNC_POLICIES = ('flush', 'close', 'never')
+SEGMENT_PATTERN = re.compile(r'^flight_log_(\d{8})-(\d{8})\.parquet$')
+
+
+# ============================================================
+# CSV SCHEMA
+# ============================================================
+def recover_tail(path):
+    """Cut off a partially written last row. Returns the number of bytes removed"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    with open(path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b'\n':
+            return 0
+        # Walk back to the last complete line
+        block = 4096
+        end = size
+        while end > 0:
+            start = max(0, end - block)
+            f.seek(start)
+            chunk = f.read(end - start)
+            newline = chunk.rfind(b'\n')
+            if newline >= 0:
+                keep = start + newline + 1
+                break
+            end = start
+        else:
+            keep = 0
+        f.truncate(keep)
+    return size - keep
+
+
+def legacy_human_detected(fire_source):
+    """human_detected for a row logged without it, from its "TYPE: source" label"""
+    return fire_source.split(': ', 1)[-1] in HUMAN_SOURCES
+
+
+def migrate_csv(path, renames=RENAMED_COLUMNS):
+    """
+    Rewrite a CSV with an older header to the current columns (streamed, atomic)
+
+    Renamed columns are mapped, missing ones are left empty (human_detected
+    is derived from the fire_source label). Returns True if
+    the file was rewritten. Raises ValueError (file untouched) if rows hold
+    more values than the header names and it cannot be extended.
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        widest = max((len(row) for row in reader), default=0)
+    if header is None or header == COLUMN_NAMES:
+        return False
+    header = [renames.get(name, name) for name in header]
+    if widest > len(header):
+        # Older logs lack trailing columns in the header but not in the rows
+        # (baseline main.py wrote evidence_url under a 12-column header)
+        if header != COLUMN_NAMES[:len(header)] or widest > len(COLUMN_NAMES):
+            raise ValueError(f"{path}: rows have up to {widest} values for {len(header)} header columns")
+        header = COLUMN_NAMES[:widest]
+    dropped = [name for name in header if name not in COLUMN_NAMES]
+    if dropped:
+        print(f"[FLIGHTLOG] ? Dropping unknown columns while migrating {path}: {dropped}")
+
+    tmp_path = path + '.tmp'
+    with open(path, newline='') as src, open(tmp_path, 'w', newline='') as dst:
+        reader = csv.reader(src)
+        next(reader)
+        writer = csv.writer(dst)
+        writer.writerow(COLUMN_NAMES)
+        for row in reader:
+            values = dict(zip(header, row))
+            if 'human_detected' not in header:
+                values['human_detected'] = legacy_human_detected(values.get('fire_source', ''))
+            writer.writerow([values.get(name, '') for name in COLUMN_NAMES])
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, path)
+    print(f"[FLIGHTLOG] Migrated {path} to schema v{SCHEMA_VERSION}")
+    return True
+
+
+def _schema_path(csv_path):
+    return csv_path + '.schema.json'
+
+
+def write_schema(csv_path):
+    with open(_schema_path(csv_path), 'w') as f:
+        json.dump({'schema_version': SCHEMA_VERSION, 'columns': dict(COLUMNS)}, f, indent=2)
+
+
+# ============================================================
+# COLUMNAR SEGMENTS
+# ============================================================
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in COLUMNS],
+                     metadata={'schema_version': str(SCHEMA_VERSION)})
+
+
+def _convert(value, type_name):
+    if value is None or value == '':
+        return None
+    try:
+        if type_name == 'float64':
+            return float(value)
+        if type_name == 'int64':
+            return int(float(value))
+        if type_name == 'bool_':
+            return str(value).lower() in ('true', '1')
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+
+def list_segments(segment_dir):
+    """[(first_row, last_row, path)] sorted by row range"""
+    segments = []
+    if not os.path.isdir(segment_dir):
+        return segments
+    for name in os.listdir(segment_dir):
+        match = SEGMENT_PATTERN.match(name)
+        if match:
+            segments.append((int(match.group(1)), int(match.group(2)), os.path.join(segment_dir, name)))
+    return sorted(segments)
+
+
+def read_segments(segment_dir, columns=None):
+    """All segments as one pyarrow Table, reading only `columns` (all if None)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    if columns:
+        schema = pa.schema([schema.field(name) for name in columns], metadata=schema.metadata)
+    tables = []
+    for _, _, path in list_segments(segment_dir):
+        # Segments from older schema versions lack newer columns; fill them with nulls
+        present = [name for name in schema.names if name in pq.read_schema(path).names]
+        table = pq.read_table(path, columns=present)
+        tables.append(pa.table([table.column(name) if name in present
+                                else pa.nulls(table.num_rows, schema.field(name).type)
+                                for name in schema.names], schema=schema))
+    return pa.concat_tables(tables) if tables else schema.empty_table()
+
+
+# ============================================================
+# WRITER
+# ============================================================
+class FlightLog:
+    def __init__(self, csv_path, segment_dir=None, flush_interval=2.0, flush_rows=50,
+                 fsync='flush', segment_rows=1000, segment_interval=600.0):
+        """
+        segment_dir: where Parquet segments go (None = CSV only)
+        flush_interval/flush_rows: buffered rows are written when either is reached
+        fsync: 'flush' (every flush), 'close' (rotation/close only) or 'never'
+        segment_rows/segment_interval: rotate to a new segment after this many rows/seconds
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
+        self.csv_path = csv_path
+        self.segment_dir = segment_dir
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+        self.segment_rows = segment_rows
+        self.segment_interval = segment_interval
+
+        self.rows_written = 0     # Data rows in the CSV
+        self.flushes = 0
+        self.segments_written = 0
+        self._buffer = []         # Rows not yet in the CSV
+        self._segment = []        # Rows in the CSV but not yet in a segment
+        self._segment_first = 0   # CSV row index of _segment[0]
+        self._segment_started = time.time()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        directory = os.path.dirname(csv_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open_csv()
+        if segment_dir:
+            self._open_segments()
+
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    # ------------------------------------------------------------
+    # Startup / recovery
+    # ------------------------------------------------------------
+    def _open_csv(self):
+        if os.path.exists(self.csv_path) and os.path.getsize(self.csv_path) > 0:
+            removed = recover_tail(self.csv_path)
+            if removed:
+                print(f"[FLIGHTLOG] Recovered {self.csv_path}: dropped {removed} byte(s) of a torn last row")
+            try:
+                migrate_csv(self.csv_path)
+            except ValueError as e:
+                print(f"[FLIGHTLOG] ? Not migrated, appending as is: {e}")
+            with open(self.csv_path, newline='') as f:
+                self.rows_written = max(0, sum(1 for _ in csv.reader(f)) - 1)
+            self._file = open(self.csv_path, 'a', newline='')
+        else:
+            self._file = open(self.csv_path, 'w', newline='')
+            csv.writer(self._file).writerow(COLUMN_NAMES)
+            self._sync()
+        self._writer = csv.writer(self._file)
+        write_schema(self.csv_path)
+
+    def _open_segments(self):
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            print("[FLIGHTLOG] ? pyarrow not installed, writing CSV only")
+            self.segment_dir = None
+            return
+        os.makedirs(self.segment_dir, exist_ok=True)
+        for name in os.listdir(self.segment_dir):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.segment_dir, name))
+        segments = list_segments(self.segment_dir)
+        covered = segments[-1][1] + 1 if segments else 0
+        self._segment_first = covered
+        if covered < self.rows_written:
+            # Logged to the CSV but never segmented (crash before rotation)
+            with open(self.csv_path, newline='') as f:
+                reader = csv.reader(f)
+                next(reader)
+                for index, row in enumerate(reader):
+                    if index >= covered:
+                        self._segment.append(row)
+            print(f"[FLIGHTLOG] {len(self._segment)} row(s) pending segmentation")
+
+    # ------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------
+    def append(self, row):
+        """Queue one event: a dict keyed by column name or a sequence in COLUMN_NAMES order"""
+        if isinstance(row, dict):
+            row = [row.get(name, '') for name in COLUMN_NAMES]
+        elif len(row) != len(COLUMN_NAMES):
+            raise ValueError(f"Expected {len(COLUMN_NAMES)} values, got {len(row)}")
+        with self._lock:
+            self._buffer.append(list(row))
+            if len(self._buffer) >= self.flush_rows:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer:
+            self._writer.writerows(self._buffer)
+            self._file.flush()
+            if self.fsync == 'flush':
+                self._sync()
+            self.rows_written += len(self._buffer)
+            self._segment.extend(self._buffer)
+            self._buffer = []
+            self.flushes += 1
+        if self.segment_dir and self._segment:
+            if (len(self._segment) >= self.segment_rows
+                    or time.time() - self._segment_started >= self.segment_interval):
+                self._rotate_locked()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _rotate_locked(self):
+        """Write the pending rows as one Parquet segment (tmp + rename)"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.fsync == 'close':
+            self._sync()  # Segment names claim these rows are in the CSV
+        rows = self._segment
+        columns = {name: [_convert(row[i], type_name) for row in rows]
+                   for i, (name, type_name) in enumerate(COLUMNS)}
+        table = pa.Table.from_pydict(columns, schema=_arrow_schema())
+        first, last = self._segment_first, self._segment_first + len(rows) - 1
+        path = os.path.join(self.segment_dir, f"flight_log_{first:08d}-{last:08d}.parquet")
+        try:
+            pq.write_table(table, path + '.tmp', compression='zstd')
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            print(f"[FLIGHTLOG] Segment write failed (kept for retry): {e}")
+            return
+        self._segment = []
+        self._segment_first = last + 1
+        self._segment_started = time.time()
+        self.segments_written += 1
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[FLIGHTLOG] Flush failed: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'rows_written': self.rows_written,
+                'buffered': len(self._buffer),
+                'unsegmented': len(self._segment),
+                'flushes': self.flushes,
+                'segments_written': self.segments_written,
+            }
+
+    def close(self):
+        """Flush everything, cut the last (partial) segment, fsync and close"""
+        self._stop.set()
+        self.thread.join(timeout=2)
+        with self._lock:
+            self._flush_locked()
+            if self.segment_dir and self._segment:
+                self._rotate_locked()
+            if self.fsync != 'never':
+                self._sync()
+            self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read GAGAN NETRA flight log segments")
+    parser.add_argument('segment_dir')
+    parser.add_argument('--columns', nargs='+', help="Only read these columns")
+    args = parser.parse_args()
+
+    table = read_segments(args.segment_dir, args.columns)
+    print(f"[FLIGHTLOG] {table.num_rows} rows, columns: {', '.join(table.column_names)}")
+    print(table.slice(max(0, table.num_rows - 10)).to_pandas().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+fusion_batch.py - Vectorized sensor fusion rules for flight log replay
+
+NumPy equivalent of detect_fire_or_smoke / classify_fire_source /
+get_severity in fusion_rules.py. Takes column arrays and returns
+categorical codes plus their label tables, so whole flight-log archives
+can be re-scored after a threshold change.
+
+Usage:
+    python3 fusion_batch.py gagan_netra_flight_log.csv [more.csv ...] \
+        [--baseline-temp 25.0] [--pm25-threshold 35] [--output-dir rescored] [--verify 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from flight_log import COLUMN_NAMES, HUMAN_SOURCES
+from fusion_rules import (BASELINE_TEMPERATURE, detect_fire_or_smoke,
+                          classify_fire_source, get_severity)
+
+FIRE_TYPES = np.array(['ACTIVE_FIRE', 'HEAVY_SMOKE', 'SMOKE_ONLY'], dtype=object)
+ACTIVE_FIRE, HEAVY_SMOKE, SMOKE_ONLY = 0, 1, 2
+
+SEVERITIES = np.array(['LOW', 'MEDIUM', 'HIGH', 'CRITICAL'], dtype=object)
+LOW, MEDIUM, HIGH, CRITICAL = 0, 1, 2, 3
+
+# (label if ACTIVE_FIRE, label otherwise), in the same order as classify_fire_source
+_SOURCE_BRANCHES = [
+    ("Electrical/Plastic Fire (TOXIC)", "Electrical/Plastic Smoke (TOXIC)"),
+    ("Chemical/Industrial Fire", "Industrial Smoke"),
+    ("Wood/Biomass Fire", "Biomass Smoke"),
+    ("Vehicle/Rubber Fire", "Rubber Smoke"),
+    ("Trash/Waste Fire", "Waste Burning Smoke"),
+    ("Human Activity Fire", "Human-caused Smoke"),
+    ("Grass/Agricultural Fire", "Agricultural Smoke"),
+    ("Small Fire (Early Stage)", "Light Smoke Source"),
+    ("Dense Smoke (Fire Nearby)", "Dense Smoke (Fire Nearby)"),
+    ("Unknown Fire Source", "Unknown Smoke Source"),
+]
+SOURCES = np.array(sorted({label for pair in _SOURCE_BRANCHES for label in pair} | {"Cooking Fire"}),
+                   dtype=object)
+_SOURCE_CODE = {label: code for code, label in enumerate(SOURCES)}
+_HUMAN_BRANCH = 5
+
+# Column order written by main.py (the flight log's current schema)
+LOG_COLUMNS = COLUMN_NAMES
+
+
+def detect_fire_or_smoke_batch(fire_conf, pm25, temp, gas_res, baseline_temp=BASELINE_TEMPERATURE):
+    """Vectorized detect_fire_or_smoke. Returns int8 codes into FIRE_TYPES"""
+    temp_rise = temp - baseline_temp
+    conditions = [
+        (fire_conf > 0.6) & (temp_rise > 5.0) & (gas_res < 80000),
+        (fire_conf > 0.5) & (temp_rise > 3.0),
+        (fire_conf > 0.3) & (pm25 > 50) & (temp_rise < 3.0),
+        (pm25 > 100) & (gas_res < 50000),
+    ]
+    choices = [ACTIVE_FIRE, ACTIVE_FIRE, SMOKE_ONLY, HEAVY_SMOKE]
+    return np.select(conditions, choices, default=SMOKE_ONLY).astype(np.int8)
+
+
+def classify_fire_source_batch(pm25, gas_res, temp, human_detected, fire_type):
+    """Vectorized classify_fire_source. fire_type is FIRE_TYPES codes; returns codes into SOURCES"""
+    active = fire_type == ACTIVE_FIRE
+    conditions = [
+        (gas_res < 20000) & (pm25 > 50),
+        (gas_res < 30000) & (pm25 > 150),
+        (pm25 > 100) & (gas_res >= 80000) & (gas_res < 200000) & (temp > 28),
+        (gas_res < 40000) & (pm25 > 80) & (pm25 < 200),
+        (pm25 > 120) & (gas_res < 100000) & (temp > 27),
+        human_detected & (pm25 > 50),
+        (pm25 > 80) & (pm25 < 150) & (gas_res > 100000),
+        (pm25 > 35) & (pm25 < 80),
+        pm25 > 250,
+    ]
+    choices = []
+    for fire_label, smoke_label in _SOURCE_BRANCHES[:-1]:
+        choices.append(np.where(active, _SOURCE_CODE[fire_label], _SOURCE_CODE[smoke_label]))
+
+    # Human-caused active fires split further into cooking vs other activity
+    cooking = (pm25 < 100) & (gas_res > 100000)
+    choices[_HUMAN_BRANCH] = np.where(
+        active,
+        np.where(cooking, _SOURCE_CODE["Cooking Fire"], _SOURCE_CODE["Human Activity Fire"]),
+        _SOURCE_CODE["Human-caused Smoke"])
+
+    fire_label, smoke_label = _SOURCE_BRANCHES[-1]
+    default = np.where(active, _SOURCE_CODE[fire_label], _SOURCE_CODE[smoke_label])
+    return np.select(conditions, choices, default=default).astype(np.int8)
+
+
+def get_severity_batch(fire_conf, pm25, gas_res, fire_type):
+    """Vectorized get_severity. Returns int8 codes into SEVERITIES"""
+    active = fire_type == ACTIVE_FIRE
+    conditions = [
+        (gas_res < 20000) | (pm25 > 250),
+        active & (fire_conf > 0.75) & (pm25 > 150),
+        active & (fire_conf > 0.6) & (pm25 > 100),
+        (fire_type == HEAVY_SMOKE) & (pm25 > 150),
+        active & (fire_conf > 0.4),
+        pm25 > 100,
+    ]
+    choices = [CRITICAL, CRITICAL, HIGH, HIGH, MEDIUM, MEDIUM]
+    return np.select(conditions, choices, default=LOW).astype(np.int8)
+
+
+def classify_batch(fire_conf, pm25, temp, gas_res, human_detected=None,
+                   baseline_temp=BASELINE_TEMPERATURE):
+    """
+    Run the full rule chain on column arrays
+
+    Returns: (fire_type, fire_source, severity) code arrays into
+    FIRE_TYPES, SOURCES and SEVERITIES
+    """
+    fire_conf = np.asarray(fire_conf, dtype=np.float64)
+    pm25 = np.asarray(pm25, dtype=np.float64)
+    temp = np.asarray(temp, dtype=np.float64)
+    gas_res = np.asarray(gas_res, dtype=np.float64)
+    if human_detected is None:
+        human_detected = np.zeros(len(pm25), dtype=bool)
+    else:
+        human_detected = np.asarray(human_detected, dtype=bool)
+
+    fire_type = detect_fire_or_smoke_batch(fire_conf, pm25, temp, gas_res, baseline_temp)
+    fire_source = classify_fire_source_batch(pm25, gas_res, temp, human_detected, fire_type)
+    severity = get_severity_batch(fire_conf, pm25, gas_res, fire_type)
+    return fire_type, fire_source, severity
+
+
+def verify_against_scalar(fire_conf, pm25, temp, gas_res, human_detected,
+                          baseline_temp=BASELINE_TEMPERATURE):
+    """
+    Compare classify_batch with the scalar rules row by row
+
+    Returns: list of mismatching row indices (empty when identical)
+    """
+    fire_type, fire_source, severity = classify_batch(
+        fire_conf, pm25, temp, gas_res, human_detected, baseline_temp)
+    mismatches = []
+    for i in range(len(pm25)):
+        f, p, t, g, h = (float(fire_conf[i]), float(pm25[i]), float(temp[i]),
+                         float(gas_res[i]), bool(human_detected[i]))
+        expected_type = detect_fire_or_smoke(f, p, t, g, baseline_temp)
+        expected = (expected_type,
+                    classify_fire_source(p, g, t, h, expected_type),
+                    get_severity(f, p, g, expected_type))
+        got = (FIRE_TYPES[fire_type[i]], SOURCES[fire_source[i]], SEVERITIES[severity[i]])
+        if got != expected:
+            mismatches.append(i)
+    return mismatches
+
+
+def random_inputs(n, seed=0):
+    """Synthetic inputs covering every threshold band, for verification"""
+    rng = np.random.default_rng(seed)
+    return (
+        np.round(rng.uniform(0.0, 1.0, n), 3),
+        rng.integers(0, 400, n).astype(np.float64),
+        np.round(rng.uniform(15.0, 45.0, n), 2),
+        rng.integers(5000, 250000, n).astype(np.float64),
+        rng.random(n) < 0.3,
+    )
+
+
+# ============================================================
+# CLI
+# ============================================================
+def rescore_file(path, output_dir, baseline_temp, pm25_threshold):
+    import pandas as pd
+
+    t0 = time.perf_counter()
+    with open(path) as f:
+        header = f.readline().strip().split(',')
+    if header == LOG_COLUMNS[:len(header)]:
+        # Older logs lack trailing columns in the header but not in the rows
+        df = pd.read_csv(path, names=LOG_COLUMNS, skiprows=1)
+    else:
+        df = pd.read_csv(path)
+    t_read = time.perf_counter() - t0
+
+    # Rows logged before human_detected (schema v5): only the human branch gives these labels
+    human = df['fire_source'].fillna('').astype(str).str.split(': ', n=1).str[-1].isin(HUMAN_SOURCES)
+    logged = (df['human_detected'] if 'human_detected' in df else pd.Series(index=df.index, dtype=object))
+    logged = logged.astype(str).str.lower().map({'true': True, 'false': False, '1': True, '0': False})
+    derived = int(logged.isna().sum())
+    human = logged.fillna(human).to_numpy(dtype=bool)
+    t0 = time.perf_counter()
+    fire_type, fire_source, severity = classify_batch(
+        df['fire_confidence'].to_numpy(), df['pm25'].to_numpy(),
+        df['temperature'].to_numpy(), df['gas_resistance'].to_numpy(),
+        human, baseline_temp)
+    t_classify = time.perf_counter() - t0
+
+    types = pd.Categorical.from_codes(fire_type, FIRE_TYPES)
+    sources = pd.Categorical.from_codes(fire_source, SOURCES)
+    # Next to the logged fire_source/severity, not over them
+    df['fire_type'] = types
+    df['rescored_source'] = types.astype(str) + ': ' + sources.astype(str)
+    df['rescored_severity'] = pd.Categorical.from_codes(severity, SEVERITIES)
+    # Same gate main.py uses before logging an event
+    df['would_log'] = (df['fire_confidence'] > 0.5) & (df['pm25'] > pm25_threshold)
+
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, os.path.basename(path))
+    df.to_csv(out_path, index=False)
+
+    rows = len(df)
+    rate = rows / t_classify if t_classify > 0 else float('inf')
+    print(f"[FUSION] {path}: {rows} rows | read {t_read:.2f}s | "
+          f"classify {t_classify * 1000:.1f}ms ({rate / 1e6:.1f}M rows/s) -> {out_path}")
+    if derived:
+        print(f"[FUSION]   {derived} row(s) without human_detected, derived from their fire_source label")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score GAGAN NETRA flight logs with the fusion rules")
+    parser.add_argument('paths', nargs='*', help="Flight log CSV files")
+    parser.add_argument('--baseline-temp', type=float, default=BASELINE_TEMPERATURE)
+    parser.add_argument('--pm25-threshold', type=float, default=35,
+                        help="PM2.5 gate for the would_log column (FIRE_PM25_THRESHOLD)")
+    parser.add_argument('--output-dir', default='rescored')
+    parser.add_argument('--verify', type=int, default=0, metavar='N',
+                        help="Check N random rows against the scalar rules first")
+    args = parser.parse_args()
+
+    if args.verify:
+        inputs = random_inputs(args.verify)
+        mismatches = verify_against_scalar(*inputs, baseline_temp=args.baseline_temp)
+        if mismatches:
+            print(f"[FUSION] ? {len(mismatches)} mismatches vs scalar rules (first rows: {mismatches[:10]})")
+            sys.exit(1)
+        print(f"[FUSION] ? Vectorized rules match scalar rules on {args.verify} rows")
+
+    for path in args.paths:
+        rescore_file(path, args.output_dir, args.baseline_temp, args.pm25_threshold)
+
+
+if __name__ == "__main__":
+    main()
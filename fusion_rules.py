@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+fusion_rules.py - Sensor fusion rules for GAGAN NETRA
+
+Scalar fire/smoke type, fire source and severity classification from the
+fire detector confidence, PMS7003 PM2.5 and BME688 temperature/gas
+resistance. fusion_batch.py holds the vectorized equivalent for log replay.
+"""
+
+BASELINE_TEMPERATURE = 25.0  # Baseline for temperature rise calculation
+
+def detect_fire_or_smoke(fire_conf, pm25, temp, gas_res, baseline_temp=BASELINE_TEMPERATURE):
+    """
+    Determine if it's active fire or smoke based on sensor fusion
+    
+    Returns: 'ACTIVE_FIRE', 'HEAVY_SMOKE', or 'SMOKE_ONLY'
+    """
+    temp_rise = temp - baseline_temp
+    
+    # Active Fire Detection Criteria
+    if fire_conf > 0.6 and temp_rise > 5.0 and gas_res < 80000:
+        return "ACTIVE_FIRE"
+    elif fire_conf > 0.5 and temp_rise > 3.0:
+        return "ACTIVE_FIRE"
+    # Smoke without visible flames
+    elif fire_conf > 0.3 and pm25 > 50 and temp_rise < 3.0:
+        return "SMOKE_ONLY"
+    # Heavy smoke (might have fire nearby)
+    elif pm25 > 100 and gas_res < 50000:
+        return "HEAVY_SMOKE"
+    else:
+        return "SMOKE_ONLY"
+
+def classify_fire_source(pm25, gas_res, temp, human_detected, fire_type):
+    """
+    Classify fire/smoke source based on sensor patterns using BME688 + PMS7003
+    
+    BME688 Gas Resistance Patterns:
+    - Very Low (< 20,000 O): Electrical/Plastic/Chemical fire (toxic gases)
+    - Low (20,000 - 80,000 O): Active combustion with smoke
+    - Medium (80,000 - 150,000 O): Wood/Biomass burning
+    - High (> 150,000 O): Clean air or cooking smoke
+    
+    PMS7003 PM2.5 Patterns:
+    - Low (< 35 µg/m³): Normal air quality
+    - Medium (35-100 µg/m³): Smoke present
+    - High (100-250 µg/m³): Heavy smoke
+    - Very High (> 250 µg/m³): Dense smoke/industrial
+    """
+    
+    # Electrical/Plastic Fire (most dangerous - toxic gases)
+    if gas_res < 20000 and pm25 > 50:
+        if fire_type == "ACTIVE_FIRE":
+            return "Electrical/Plastic Fire (TOXIC)"
+        else:
+            return "Electrical/Plastic Smoke (TOXIC)"
+    
+    # Chemical/Industrial Fire
+    elif gas_res < 30000 and pm25 > 150:
+        if fire_type == "ACTIVE_FIRE":
+            return "Chemical/Industrial Fire"
+        else:
+            return "Industrial Smoke"
+    
+    # Active Wood/Biomass Fire
+    elif pm25 > 100 and gas_res >= 80000 and gas_res < 200000 and temp > 28:
+        if fire_type == "ACTIVE_FIRE":
+            return "Wood/Biomass Fire"
+        else:
+            return "Biomass Smoke"
+    
+    # Vehicle/Tire Fire (rubber burning)
+    elif gas_res < 40000 and pm25 > 80 and pm25 < 200:
+        if fire_type == "ACTIVE_FIRE":
+            return "Vehicle/Rubber Fire"
+        else:
+            return "Rubber Smoke"
+    
+    # Trash/Waste Fire
+    elif pm25 > 120 and gas_res < 100000 and temp > 27:
+        if fire_type == "ACTIVE_FIRE":
+            return "Trash/Waste Fire"
+        else:
+            return "Waste Burning Smoke"
+    
+    # Human-caused fire (cooking, campfire, arson)
+    elif human_detected and pm25 > 50:
+        if fire_type == "ACTIVE_FIRE":
+            if pm25 < 100 and gas_res > 100000:
+                return "Cooking Fire"
+            else:
+                return "Human Activity Fire"
+        else:
+            return "Human-caused Smoke"
+    
+    # Grass/Agricultural Fire
+    elif pm25 > 80 and pm25 < 150 and gas_res > 100000:
+        if fire_type == "ACTIVE_FIRE":
+            return "Grass/Agricultural Fire"
+        else:
+            return "Agricultural Smoke"
+    
+    # Light smoke (possible early stage fire)
+    elif pm25 > 35 and pm25 < 80:
+        if fire_type == "ACTIVE_FIRE":
+            return "Small Fire (Early Stage)"
+        else:
+            return "Light Smoke Source"
+    
+    # Heavy smoke with low visibility
+    elif pm25 > 250:
+        return "Dense Smoke (Fire Nearby)"
+    
+    # Default classification
+    else:
+        if fire_type == "ACTIVE_FIRE":
+            return "Unknown Fire Source"
+        else:
+            return "Unknown Smoke Source"
+
+def get_severity(fire_conf, pm25, gas_res, fire_type):
+    """Calculate severity level based on fire type and sensor data"""
+    
+    # CRITICAL: Toxic fires or very high danger
+    if gas_res < 20000 or pm25 > 250:
+        return "CRITICAL"
+    
+    # CRITICAL: Active fire with high confidence and dangerous levels
+    if fire_type == "ACTIVE_FIRE" and fire_conf > 0.75 and pm25 > 150:
+        return "CRITICAL"
+    
+    # HIGH: Active fire with elevated readings
+    if fire_type == "ACTIVE_FIRE" and fire_conf > 0.6 and pm25 > 100:
+        return "HIGH"
+    
+    # HIGH: Heavy smoke that could indicate nearby fire
+    if fire_type == "HEAVY_SMOKE" and pm25 > 150:
+        return "HIGH"
+    
+    # MEDIUM: Moderate fire or significant smoke
+    if fire_type == "ACTIVE_FIRE" and fire_conf > 0.4:
+        return "MEDIUM"
+    
+    # MEDIUM: Significant smoke levels
+    if pm25 > 100:
+        return "MEDIUM"
+    
+    # LOW: Light smoke or small fire
+    return "LOW"
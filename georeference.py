@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+georeference.py - Ground position of detected fires for GAGAN NETRA
+
+The flight log used to record where the UAV was, which from 100 m up with
+an oblique GoPro view can be a few hundred metres from the fire. Here the
+pixel at the centre of each fire box is turned into a ray through a
+pinhole camera model, rotated by the camera mount and the aircraft
+attitude (roll/pitch/yaw from Cube Orange) into north-east-down, and
+intersected with flat ground `altitude` metres below (relative altitude,
+i.e. terrain at home height). All boxes of a frame are projected with one
+matrix product.
+
+Each estimate comes with a 1-sigma horizontal error in metres from GPS,
+altitude and angle (attitude + box size) errors. Rays close to the horizon
+are rejected (NaN): a small angle error there moves the point by hundreds
+of metres. fuse() combines the estimates of one fire over many frames,
+weighted by inverse variance.
+
+Position estimates are (lat, lon, error_m) tuples throughout.
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def _rotation(roll, pitch, yaw):
+    """Body (forward-right-down) to north-east-down, aerospace ZYX order (radians)"""
+    cr, sr = math.cos(roll), math.sin(roll)
+    cp, sp = math.cos(pitch), math.sin(pitch)
+    cy, sy = math.cos(yaw), math.sin(yaw)
+    return np.array([
+        [cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+        [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+        [-sp, cp * sr, cp * cr],
+    ])
+
+
+# Camera axes (x right, y down, z along the optical axis) in body axes, camera looking forward
+_CAMERA_TO_BODY = np.array([[0.0, 0.0, 1.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+
+class CameraModel:
+    def __init__(self, width=1920, height=1080, hfov=118.0, fx=None, fy=None, cx=None, cy=None,
+                 tilt=45.0, pan=0.0, roll=0.0):
+        """
+        Intrinsics at a calibration resolution of width x height: either
+        fx/fy/cx/cy in pixels, or a horizontal field of view in degrees
+        (square pixels, centred principal point). They are rescaled to the
+        size of each frame.
+
+        tilt: degrees the camera points below the aircraft's nose (90 = straight down)
+        pan/roll: mount yaw (degrees right of the nose) and rotation about the optical axis
+        """
+        self.width = width
+        self.height = height
+        self.fx = fx if fx is not None else (width / 2) / math.tan(math.radians(hfov) / 2)
+        self.fy = fy if fy is not None else self.fx
+        self.cx = cx if cx is not None else width / 2
+        self.cy = cy if cy is not None else height / 2
+        self.mount = _rotation(math.radians(roll), math.radians(-tilt), math.radians(pan)) @ _CAMERA_TO_BODY
+
+    def rays(self, u, v, frame_width, frame_height):
+        """Unit-depth rays in camera axes for pixel coordinates u, v of a frame_width x frame_height frame"""
+        sx, sy = frame_width / self.width, frame_height / self.height
+        x = (np.asarray(u, dtype=np.float64) - self.cx * sx) / (self.fx * sx)
+        y = (np.asarray(v, dtype=np.float64) - self.cy * sy) / (self.fy * sy)
+        return np.stack([x, y, np.ones_like(x)], axis=-1)
+
+    def pixel_angle(self, frame_width):
+        """Radians per pixel at the image centre"""
+        return 1.0 / (self.fx * frame_width / self.width)
+
+
+class GroundProjector:
+    def __init__(self, camera, gps_error=2.5, altitude_error=3.0, attitude_error=1.0, max_off_nadir=80.0,
+                 min_altitude=5.0):
+        """
+        gps_error: 1-sigma horizontal GPS error (metres)
+        altitude_error: 1-sigma error of the height above the ground (metres)
+        attitude_error: 1-sigma attitude + mount alignment error (degrees)
+        max_off_nadir: rays further than this from straight down get no estimate (degrees)
+        min_altitude: below this (metres above home) nothing is projected
+        """
+        self.camera = camera
+        self.gps_error = gps_error
+        self.altitude_error = altitude_error
+        self.attitude_error = math.radians(attitude_error)
+        self.min_cos = math.cos(math.radians(max_off_nadir))
+        self.min_altitude = min_altitude
+        self.projected = 0
+        self.rejected = 0
+
+    def project(self, boxes, frame_size, pose):
+        """
+        Ground positions of the centres of xyxy `boxes` (N, 4)
+
+        frame_size: (width, height) of the frame the boxes are in
+        pose: dict with lat, lon, alt_relative (metres) and roll, pitch, yaw (radians)
+        Returns (lat, lon, error_m) arrays of length N; NaN where the ray
+        does not reach the ground at a usable angle.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        count = len(boxes)
+        nan = np.full(count, np.nan)
+        altitude = pose.get('alt_relative')
+        if not count or altitude is None or altitude < self.min_altitude:
+            self.rejected += count
+            return nan, nan, nan.copy()
+
+        width, height = frame_size
+        u = (boxes[:, 0] + boxes[:, 2]) / 2
+        v = (boxes[:, 1] + boxes[:, 3]) / 2
+        rotation = _rotation(pose['roll'], pose['pitch'], pose['yaw']) @ self.camera.mount
+        rays = self.camera.rays(u, v, width, height) @ rotation.T  # North, east, down
+        lengths = np.linalg.norm(rays, axis=1)
+        usable = rays[:, 2] > self.min_cos * lengths  # Steeper than max_off_nadir
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = np.where(usable, altitude / rays[:, 2], np.nan)
+        north, east = rays[:, 0] * scale, rays[:, 1] * scale
+        ground_range = np.hypot(north, east)
+        slant = lengths * scale
+
+        # Angle error: attitude plus half the box (where in the box the fire is)
+        box_angle = np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]) / 2 \
+            * self.camera.pixel_angle(width)
+        angle_error = np.hypot(self.attitude_error, box_angle)
+        # Along the ground the angle error stretches by slant / cos(off-nadir) = slant^2 / altitude
+        error = np.sqrt(self.gps_error ** 2
+                        + (ground_range * self.altitude_error / altitude) ** 2
+                        + (slant ** 2 / altitude * angle_error) ** 2)
+
+        lat0 = math.radians(pose['lat'])
+        lat = pose['lat'] + np.degrees(north / EARTH_RADIUS_M)
+        lon = pose['lon'] + np.degrees(east / (EARTH_RADIUS_M * math.cos(lat0)))
+        valid = int(usable.sum())
+        self.projected += valid
+        self.rejected += count - valid
+        return lat, lon, error
+
+    def get_stats(self):
+        return {'projected': self.projected, 'rejected': self.rejected}
+
+
+def fuse(previous, lat, lon, error, floor=0.0):
+    """
+    Inverse-variance weighted mean of two position estimates
+
+    previous: (lat, lon, error_m) or None. Returns the combined
+    (lat, lon, error_m), or `previous` if the new estimate is NaN.
+    floor: lower bound of the combined error; biases (mount alignment,
+    terrain height) do not average out over frames
+    """
+    if lat is None or math.isnan(lat):
+        return previous
+    if previous is None:
+        return (float(lat), float(lon), float(error))
+    weight_old, weight_new = 1.0 / previous[2] ** 2, 1.0 / error ** 2
+    total = weight_old + weight_new
+    return ((previous[0] * weight_old + lat * weight_new) / total,
+            (previous[1] * weight_old + lon * weight_new) / total,
+            max(floor, math.sqrt(1.0 / total)))
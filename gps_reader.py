@@ -1,21 +1,125 @@
 #!/usr/bin/env python3
 """
 gps_reader.py - GPS reader for GAGAN NETRA using DroneKit
+
+Position, GPS status and attitude are updated from MAVLink message
+listeners (GLOBAL_POSITION_INT, GPS_RAW_INT, ATTITUDE) as soon as they
+arrive, and every update is stored in a time-indexed ring buffer so the
+position can be interpolated to the exact capture time of a frame.
 """
 
 import logging
-from dronekit import connect
+import math
 import threading
 import time
+from array import array
 
 # Suppress DroneKit MAVLink errors
 logging.getLogger('dronekit.mavlink').setLevel(logging.CRITICAL)
 logging.getLogger('autopilot').setLevel(logging.WARNING)
 
+
+class TimeSeriesRing:
+    """
+    Fixed-size, array-backed ring buffer of timestamped samples.
+    Samples must arrive in time order; older ones are ignored.
+    """
+
+    def __init__(self, columns, size=600, angle_columns=(), angle_period=360.0):
+        self.columns = tuple(columns)
+        self.size = size
+        self.angle_columns = set(angle_columns)
+        self.angle_period = angle_period
+        self._t = array('d', [0.0] * size)
+        self._data = {name: array('d', [0.0] * size) for name in self.columns}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.size)
+
+    def _index(self, i):
+        """Physical index of the i-th oldest sample"""
+        start = self._count - self.size if self._count > self.size else 0
+        return (start + i) % self.size
+
+    def append(self, timestamp, **values):
+        with self._lock:
+            if self._count and timestamp < self._t[(self._count - 1) % self.size]:
+                return False
+            idx = self._count % self.size
+            self._t[idx] = timestamp
+            for name in self.columns:
+                self._data[name][idx] = values[name]
+            self._count += 1
+            return True
+
+    def get_time_range(self):
+        """(oldest, newest) buffered timestamps, or None when empty"""
+        with self._lock:
+            n = len(self)
+            if n == 0:
+                return None
+            return self._t[self._index(0)], self._t[self._index(n - 1)]
+
+    def _row(self, idx):
+        return {name: self._data[name][idx] for name in self.columns}
+
+    def _lerp(self, name, a, b, frac):
+        va, vb = self._data[name][a], self._data[name][b]
+        if name in self.angle_columns:
+            # Interpolate along the shortest arc (e.g. 350° -> 10°)
+            period = self.angle_period
+            delta = (vb - va + period / 2) % period - period / 2
+            value = va + delta * frac
+            if period == 360.0:
+                return value % period
+            return (value + period / 2) % period - period / 2
+        return va + (vb - va) * frac
+
+    def sample_at(self, timestamp):
+        """
+        Interpolate all columns at `timestamp` (clamped to the buffered range)
+
+        Returns: (values dict, seconds to the nearest stored sample) or (None, inf)
+        """
+        with self._lock:
+            n = len(self)
+            if n == 0:
+                return None, float('inf')
+
+            # Binary search for the first sample newer than timestamp
+            lo, hi = 0, n
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._t[self._index(mid)] <= timestamp:
+                    lo = mid + 1
+                else:
+                    hi = mid
+
+            if lo == 0:
+                idx = self._index(0)
+                return self._row(idx), self._t[idx] - timestamp
+            if lo == n:
+                idx = self._index(n - 1)
+                return self._row(idx), timestamp - self._t[idx]
+
+            a, b = self._index(lo - 1), self._index(lo)
+            span = self._t[b] - self._t[a]
+            frac = (timestamp - self._t[a]) / span if span > 0 else 0.0
+            values = {name: self._lerp(name, a, b, frac) for name in self.columns}
+            return values, min(timestamp - self._t[a], self._t[b] - timestamp)
+
+
 class CubeOrangeGPS:
-    def __init__(self, port='/dev/ttyACM0', baud=115200):
+    def __init__(self, port='/dev/ttyACM0', baud=115200, history=600, connect_vehicle=True):
+        """
+        history: samples kept per ring buffer (~1 min at 10 Hz)
+        connect_vehicle: False to build an offline instance fed by handle_message()
+        """
         self.vehicle = None
         self.connected = False
+        self.running = False
         self.latitude = 0.0
         self.longitude = 0.0
         self.altitude = 0.0
@@ -24,46 +128,93 @@ class CubeOrangeGPS:
         self.fix_type = 0
         self.heading = 0
         self.ground_speed = 0.0
-        
+        self.roll = 0.0
+        self.pitch = 0.0
+        self.yaw = 0.0
+        self.last_update = 0.0
+
+        self.positions = TimeSeriesRing(
+            ('lat', 'lon', 'alt', 'alt_relative', 'heading'), history,
+            angle_columns=('heading',), angle_period=360.0)
+        self.attitudes = TimeSeriesRing(
+            ('roll', 'pitch', 'yaw'), history,
+            angle_columns=('roll', 'pitch', 'yaw'), angle_period=2 * math.pi)
+
+        if not connect_vehicle:
+            return
+
         try:
+            from dronekit import connect
             print(f"[GPS] Connecting to {port}...")
             self.vehicle = connect(port, baud=baud, wait_ready=False, timeout=15)
             self.connected = True
-            print(f"[GPS] ? Connected - Firmware: {self.vehicle.version}")
-            
-            # Start background update thread
             self.running = True
-            self.update_thread = threading.Thread(target=self._update_loop, daemon=True)
-            self.update_thread.start()
-            
+            print(f"[GPS] ? Connected - Firmware: {self.vehicle.version}")
+
+            # Event-driven updates straight from the MAVLink stream
+            for msg_type in ('GLOBAL_POSITION_INT', 'GPS_RAW_INT', 'ATTITUDE'):
+                self.vehicle.add_message_listener(msg_type, self._on_message)
+
         except Exception as e:
             print(f"[GPS] ? Connection failed: {e}")
             self.connected = False
-    
-    def _update_loop(self):
-        """Background thread to update GPS data"""
-        while self.running and self.connected:
-            try:
-                if self.vehicle:
-                    loc = self.vehicle.location.global_frame
-                    loc_rel = self.vehicle.location.global_relative_frame
-                    gps = self.vehicle.gps_0
-                    
-                    self.latitude = loc.lat if loc.lat else 0.0
-                    self.longitude = loc.lon if loc.lon else 0.0
-                    self.altitude = loc.alt if loc.alt else 0.0
-                    self.altitude_relative = loc_rel.alt if loc_rel.alt else 0.0
-                    self.satellites = gps.satellites_visible
-                    self.fix_type = gps.fix_type
-                    self.heading = self.vehicle.heading if self.vehicle.heading else 0
-                    self.ground_speed = self.vehicle.groundspeed if self.vehicle.groundspeed else 0.0
-                    
-                time.sleep(0.5)  # Update 2x per second
-                
-            except Exception as e:
-                print(f"[GPS] Update error: {e}")
-                time.sleep(1)
-    
+
+    @classmethod
+    def from_tlog(cls, path, history=100000):
+        """Build an offline instance by replaying a recorded MAVLink telemetry log"""
+        gps = cls(history=history, connect_vehicle=False)
+        gps.load_tlog(path)
+        return gps
+
+    def load_tlog(self, path):
+        """Feed every position/status/attitude message of a MAVLink telemetry log to handle_message()"""
+        from pymavlink import mavutil
+
+        mlog = mavutil.mavlink_connection(path)
+        while True:
+            msg = mlog.recv_match(type=['GLOBAL_POSITION_INT', 'GPS_RAW_INT', 'ATTITUDE'])
+            if msg is None:
+                break
+            self.handle_message(msg)
+
+    def _on_message(self, vehicle, name, msg):
+        """DroneKit listener callback"""
+        try:
+            if self.running:
+                self.handle_message(msg)
+        except Exception as e:
+            print(f"[GPS] Update error: {e}")
+
+    def handle_message(self, msg, timestamp=None):
+        """Apply one MAVLink message; timestamp defaults to its receive time"""
+        if timestamp is None:
+            timestamp = getattr(msg, '_timestamp', None) or time.time()
+        msg_type = msg.get_type()
+
+        if msg_type == 'GLOBAL_POSITION_INT':
+            self.latitude = msg.lat / 1e7
+            self.longitude = msg.lon / 1e7
+            self.altitude = msg.alt / 1000.0
+            self.altitude_relative = msg.relative_alt / 1000.0
+            if msg.hdg != 65535:  # UINT16_MAX = unknown
+                self.heading = msg.hdg / 100.0
+            self.ground_speed = math.hypot(msg.vx, msg.vy) / 100.0
+            self.last_update = timestamp
+            self.positions.append(timestamp, lat=self.latitude, lon=self.longitude,
+                                  alt=self.altitude, alt_relative=self.altitude_relative,
+                                  heading=self.heading)
+
+        elif msg_type == 'GPS_RAW_INT':
+            self.fix_type = msg.fix_type
+            if msg.satellites_visible != 255:  # 255 = unknown
+                self.satellites = msg.satellites_visible
+
+        elif msg_type == 'ATTITUDE':
+            self.roll = msg.roll
+            self.pitch = msg.pitch
+            self.yaw = msg.yaw
+            self.attitudes.append(timestamp, roll=msg.roll, pitch=msg.pitch, yaw=msg.yaw)
+
     def get_coordinates(self):
         """Get current GPS coordinates and status"""
         return {
@@ -76,21 +227,47 @@ class CubeOrangeGPS:
             'heading': self.heading,
             'speed': self.ground_speed
         }
-    
+
+    def position_at(self, timestamp):
+        """
+        Get position, altitude, heading and attitude interpolated to `timestamp`
+
+        Returns the get_coordinates() keys plus roll/pitch/yaw (radians) and
+        'position_dt', the distance in seconds to the nearest position sample.
+        Falls back to the latest values when no history is buffered yet.
+        """
+        coords = self.get_coordinates()
+        coords.update(roll=self.roll, pitch=self.pitch, yaw=self.yaw)
+
+        position, position_dt = self.positions.sample_at(timestamp)
+        if position:
+            coords.update(lat=position['lat'], lon=position['lon'], alt=position['alt'],
+                          alt_relative=position['alt_relative'], heading=position['heading'])
+        attitude, _ = self.attitudes.sample_at(timestamp)
+        if attitude:
+            coords.update(attitude)
+        coords['position_dt'] = position_dt
+        return coords
+
     def has_fix(self):
         """Check if GPS has a valid fix"""
         return self.fix_type >= 2  # 2=2D, 3=3D
-    
+
     def get_location_string(self):
         """Get formatted location string"""
         if self.has_fix():
             return f"{self.latitude:.7f}, {self.longitude:.7f}"
         else:
             return "No GPS Fix"
-    
+
     def close(self):
         """Close connection"""
         self.running = False
         if self.vehicle:
+            for msg_type in ('GLOBAL_POSITION_INT', 'GPS_RAW_INT', 'ATTITUDE'):
+                try:
+                    self.vehicle.remove_message_listener(msg_type, self._on_message)
+                except Exception:
+                    pass
             self.vehicle.close()
         print("[GPS] Connection closed")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+hotspot_index.py - Spatial incident index and hotspot clustering for GAGAN NETRA
+
+A drone circling one fire reports it many times, so incidents are merged
+into hotspots: an incident joins the nearest hotspot within `radius_m`
+whose detections are within `window` seconds of it, otherwise it starts a
+new one. Each hotspot keeps a count, its centroid and the peak severity,
+confidence and PM2.5 of its incidents.
+
+Hotspots are indexed in a latitude/longitude grid whose cells are
+`radius_m` wide (per row of latitude, like a geohash), so a proximity
+query only looks at the 3x3 cells around a point: constant time however
+many hotspots there are. Distances are exact haversine.
+
+Incidents without a position - (0, 0), NaN, or a fallback coordinate such
+as the dashboard's C-DAC Pune default - are counted but never clustered.
+Used by the onboard logger (main.py) and the dashboard.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6371008.8
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180.0
+SEVERITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2, 'CRITICAL': 3}
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres (numpy-broadcasting)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    """haversine_m for one pair of points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _rank(severity):
+    return SEVERITY_RANK.get(str(severity).upper(), -1)
+
+
+class Hotspot:
+    def __init__(self, hotspot_id, latitude, longitude, timestamp):
+        self.hotspot_id = hotspot_id
+        self.latitude = latitude      # Mean position of its incidents
+        self.longitude = longitude
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.count = 0
+        self.peak_severity = None
+        self.peak_conf = 0.0
+        self.peak_pm25 = 0
+        self.incident_id = None       # First incident, which the others are merged into
+        self.incident_ids = set()
+        self.cell = None
+
+    def absorb(self, severity, conf, pm25):
+        """Fold one incident's readings into the peaks"""
+        if severity is not None and _rank(severity) > _rank(self.peak_severity):
+            self.peak_severity = str(severity)
+        self.peak_conf = max(self.peak_conf, float(conf or 0.0))
+        self.peak_pm25 = max(self.peak_pm25, pm25 or 0)
+
+
+class HotspotIndex:
+    def __init__(self, radius_m=75.0, window=1800.0, exclude=()):
+        """
+        radius_m: incidents closer than this to a hotspot's centre join it
+        window: seconds between an incident and a hotspot's detections for it to join
+        exclude: (lat, lon) fallback coordinates that mean "no GPS"
+        """
+        self.radius_m = radius_m
+        self.window = window
+        self.exclude = {(round(lat, 6), round(lon, 6)) for lat, lon in exclude}
+        self.version = 0    # Bumped whenever a hotspot changes
+        self.unlocated = 0  # Incidents without a usable position
+        self._cells = {}    # (row, col) -> [Hotspot]
+        self._widths = {}   # row -> cell width in degrees of longitude
+        self._by_incident = {}
+        self._hotspots = []
+        self._unlocated_ids = set()
+
+    def __len__(self):
+        return len(self._hotspots)
+
+    # ------------------------------------------------------------
+    # Grid
+    # ------------------------------------------------------------
+    def _row(self, latitude):
+        return math.floor(latitude * METRES_PER_DEGREE / self.radius_m)
+
+    def _col(self, row, longitude):
+        width = self._widths.get(row)
+        if width is None:
+            # Cells are radius_m wide at the middle of their latitude row
+            row_latitude = (row + 0.5) * self.radius_m / METRES_PER_DEGREE
+            width = self.radius_m / (METRES_PER_DEGREE * max(math.cos(math.radians(row_latitude)), 1e-6))
+            self._widths[row] = width
+        return math.floor(longitude / width)
+
+    def _cell_of(self, latitude, longitude):
+        row = self._row(latitude)
+        return row, self._col(row, longitude)
+
+    def _place(self, hotspot):
+        cell = self._cell_of(hotspot.latitude, hotspot.longitude)
+        if cell == hotspot.cell:
+            return
+        if hotspot.cell is not None:
+            self._cells[hotspot.cell].remove(hotspot)
+            if not self._cells[hotspot.cell]:
+                del self._cells[hotspot.cell]
+        self._cells.setdefault(cell, []).append(hotspot)
+        hotspot.cell = cell
+
+    def is_located(self, latitude, longitude):
+        """False for missing GPS: NaN, a zero coordinate, or an excluded fallback"""
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return False
+        if math.isnan(latitude) or math.isnan(longitude) or latitude == 0 or longitude == 0:
+            return False
+        return (round(latitude, 6), round(longitude, 6)) not in self.exclude
+
+    # ------------------------------------------------------------
+    # Queries / updates
+    # ------------------------------------------------------------
+    def nearest(self, latitude, longitude, timestamp=None):
+        """Closest hotspot within radius_m (and window of `timestamp`, if given), or None"""
+        row = self._row(latitude)
+        candidates = []
+        for r in (row - 1, row, row + 1):
+            col = self._col(r, longitude)
+            for c in (col - 1, col, col + 1):
+                candidates.extend(self._cells.get((r, c), ()))
+        if timestamp is not None:
+            candidates = [h for h in candidates
+                          if h.first_seen - self.window <= timestamp <= h.last_seen + self.window]
+        best, best_distance = None, self.radius_m
+        for hotspot in candidates:  # A handful at most: plain math beats numpy here
+            distance = _distance_m(latitude, longitude, hotspot.latitude, hotspot.longitude)
+            if distance <= best_distance:
+                best, best_distance = hotspot, distance
+        return best
+
+    def add(self, incident_id, latitude, longitude, timestamp, severity=None, conf=0.0, pm25=0):
+        """
+        Merge one incident (timestamp in epoch seconds) into its hotspot
+
+        An incident seen before only updates its hotspot's peaks.
+        Returns the hotspot, or None if the incident has no usable position.
+        """
+        hotspot = self._by_incident.get(incident_id)
+        if hotspot is None:
+            if not self.is_located(latitude, longitude):
+                if incident_id not in self._unlocated_ids:
+                    self._unlocated_ids.add(incident_id)
+                    self.unlocated += 1
+                return None
+            latitude, longitude = float(latitude), float(longitude)
+            hotspot = self.nearest(latitude, longitude, timestamp)
+            if hotspot is None:
+                hotspot = Hotspot(len(self._hotspots) + 1, latitude, longitude, timestamp)
+                hotspot.incident_id = incident_id
+                self._hotspots.append(hotspot)
+            hotspot.count += 1
+            hotspot.latitude += (latitude - hotspot.latitude) / hotspot.count
+            hotspot.longitude += (longitude - hotspot.longitude) / hotspot.count
+            hotspot.first_seen = min(hotspot.first_seen, timestamp)
+            hotspot.last_seen = max(hotspot.last_seen, timestamp)
+            hotspot.incident_ids.add(incident_id)
+            self._by_incident[incident_id] = hotspot
+            self._place(hotspot)
+        hotspot.absorb(severity, conf, pm25)
+        self.version += 1
+        return hotspot
+
+    def update(self, frame, latitude='latitude', longitude='longitude'):
+        """
+        Add a DataFrame of incidents (incident_id, latitude, longitude,
+        timestamp as datetime64, and optionally severity, fire_confidence, pm25)
+
+        latitude/longitude: names of the position columns to cluster on
+        """
+        if frame is None or frame.empty:
+            return
+        # Python scalars: per-row arithmetic on numpy scalars is several times slower.
+        # as_unit: pandas may parse datetimes to us/ms resolution, not ns
+        timestamps = (frame['timestamp'].dt.as_unit('ns').astype('int64').to_numpy() / 1e9).tolist()
+        severities = frame['severity'].tolist() if 'severity' in frame else [None] * len(frame)
+        confs, pm25s = [pd.to_numeric(frame[name], errors='coerce').fillna(0).to_numpy(dtype=np.float64).tolist()
+                        if name in frame else [0.0] * len(frame) for name in ('fire_confidence', 'pm25')]
+        for incident_id, latitude, longitude, timestamp, severity, conf, pm25 in zip(
+                frame['incident_id'].tolist(), frame[latitude].tolist(), frame[longitude].tolist(),
+                timestamps, severities, confs, pm25s):
+            self.add(incident_id, latitude, longitude, timestamp, severity, conf, int(pm25))
+
+    def get(self, incident_id):
+        return self._by_incident.get(incident_id)
+
+    def frame(self):
+        """One row per hotspot, most incidents first"""
+        rows = [(h.hotspot_id, h.latitude, h.longitude, h.count, h.peak_severity, h.peak_conf,
+                 h.peak_pm25, pd.Timestamp(h.first_seen, unit='s'), pd.Timestamp(h.last_seen, unit='s'))
+                for h in self._hotspots]
+        frame = pd.DataFrame(rows, columns=['hotspot_id', 'latitude', 'longitude', 'incidents',
+                                            'peak_severity', 'peak_confidence', 'peak_pm25',
+                                            'first_seen', 'last_seen'])
+        return frame.sort_values('incidents', ascending=False, kind='stable').reset_index(drop=True)
+
+    def get_stats(self):
+        return {
+            'hotspots': len(self._hotspots),
+            'incidents': len(self._by_incident),
+            'unlocated': self.unlocated,
+        }
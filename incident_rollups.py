@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+incident_rollups.py - Incremental aggregates for the GAGAN NETRA dashboard
+
+Keeps compact rollups of the incident history, updated only with newly
+arrived incidents:
+
+    totals          count, running PM2.5 sum, latest incident
+    severity/source incident counts
+    hourly          (hour, device_id, severity, fire_source) -> count, PM2.5 sum
+    trend           per-minute PM2.5 sum/count, downsampled on demand
+
+Charts and header metrics render from these instead of the full
+DataFrame, so their cost depends on the number of buckets, not incidents.
+An incident delivered again (e.g. after an update) replaces its earlier
+contribution.
+"""
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+
+class IncidentRollups:
+    def __init__(self, trend_resolution='1min'):
+        self.trend_resolution = trend_resolution
+        self.version = 0  # Bumped on every update that changed something
+
+        self.count = 0
+        self.pm25_sum = 0.0
+        self.latest = None  # (timestamp, pm25) of the newest incident
+        self.severity_counts = Counter()
+        self.source_counts = Counter()
+        self.hourly = {}    # (hour, device_id, severity, fire_source) -> [count, pm25_sum]
+        self.trend = {}     # minute -> [count, pm25_sum]
+        # What each incident added, so a re-delivered one can replace its old
+        # contribution: incident_id -> (hourly key, minute, pm25). Keys are
+        # shared between the incidents of a bucket
+        self._contributions = {}
+        self._keys = {}
+
+    # ------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------
+    @staticmethod
+    def _fold_bucket(table, key, count, pm25_sum):
+        bucket = table.setdefault(key, [0, 0.0])
+        bucket[0] += count
+        bucket[1] += pm25_sum
+        if bucket[0] <= 0:
+            del table[key]
+
+    def _fold(self, batch, sign):
+        """Add (sign=+1) or remove (sign=-1) a batch of incidents, per group rather than per row"""
+        self.count += sign * len(batch)
+        self.pm25_sum += sign * float(batch['pm25'].sum())
+        self.severity_counts.update((batch['severity'].value_counts() * sign).to_dict())
+        self.source_counts.update((batch['fire_source'].value_counts() * sign).to_dict())
+        hourly = batch.groupby(['hour', 'device_id', 'severity', 'fire_source'])['pm25'].agg(['size', 'sum'])
+        for key, count, pm25_sum in zip(hourly.index, hourly['size'], hourly['sum']):
+            self._fold_bucket(self.hourly, key, sign * int(count), sign * float(pm25_sum))
+        trend = batch.groupby('minute')['pm25'].agg(['size', 'sum'])
+        for key, count, pm25_sum in zip(trend.index, trend['size'], trend['sum']):
+            self._fold_bucket(self.trend, key, sign * int(count), sign * float(pm25_sum))
+
+    def update(self, frame):
+        """
+        Fold newly arrived incidents into the rollups
+
+        frame: DataFrame with incident_id, timestamp (datetime64), pm25,
+        severity, fire_source and optionally device_id
+        """
+        if frame is None or frame.empty:
+            return
+        frame = frame.drop_duplicates('incident_id', keep='last')
+        timestamps = frame['timestamp']
+        batch = pd.DataFrame({
+            'timestamp': timestamps,
+            'hour': timestamps.dt.floor('h'),
+            'minute': timestamps.dt.floor(self.trend_resolution),
+            'device_id': frame['device_id'].fillna('UNKNOWN').astype(str) if 'device_id' in frame else 'UNKNOWN',
+            'severity': frame['severity'].astype(str),
+            'fire_source': frame['fire_source'].astype(str),
+            'pm25': pd.to_numeric(frame['pm25'], errors='coerce').fillna(0.0).astype(float),
+        })
+        batch.index = pd.Index(frame['incident_id'].to_numpy(dtype=object), name='incident_id')
+
+        # Incidents seen before: take out their old contribution first
+        replaced = self._contributions.keys() & set(batch.index)
+        if replaced:
+            old = [(*key, minute, pm25) for key, minute, pm25 in map(self._contributions.get, replaced)]
+            self._fold(pd.DataFrame(old, columns=['hour', 'device_id', 'severity', 'fire_source',
+                                                  'minute', 'pm25']), -1)
+
+        self._fold(batch, +1)
+        shared = self._keys.setdefault
+        for incident_id, hour, device_id, severity, fire_source, minute, pm25 in zip(
+                batch.index, batch['hour'].tolist(), batch['device_id'].tolist(), batch['severity'].tolist(),
+                batch['fire_source'].tolist(), batch['minute'].tolist(), batch['pm25'].tolist()):
+            key = (hour, device_id, severity, fire_source)
+            self._contributions[incident_id] = (shared(key, key), shared(minute, minute), pm25)
+
+        newest = batch['timestamp'].idxmax()
+        if self.latest is None or batch['timestamp'][newest] >= self.latest[0]:
+            self.latest = (batch['timestamp'][newest], float(batch['pm25'][newest]))
+        self.version += 1
+
+    # ------------------------------------------------------------
+    # Views for the dashboard
+    # ------------------------------------------------------------
+    def get_summary(self):
+        """Header metrics: totals, average PM2.5 and its change due to the latest incident"""
+        average = self.pm25_sum / self.count if self.count else 0.0
+        if self.count > 1 and self.latest is not None:
+            previous_average = (self.pm25_sum - self.latest[1]) / (self.count - 1)
+            delta = average - previous_average
+        else:
+            delta = 0.0
+        return {
+            'total': self.count,
+            'critical': self.severity_counts.get('CRITICAL', 0),
+            'avg_pm25': average,
+            'avg_pm25_delta': delta,
+            'latest_pm25': self.latest[1] if self.latest else None,
+            'last_detection': self.latest[0] if self.latest else None,
+        }
+
+    def severity_frame(self):
+        return pd.DataFrame([(name, count) for name, count in self.severity_counts.items() if count > 0],
+                            columns=['severity', 'Count'])
+
+    def source_frame(self):
+        counts = [(name, count) for name, count in self.source_counts.most_common() if count > 0]
+        return pd.DataFrame(counts, columns=['Event Type', 'Count'])
+
+    def hourly_frame(self):
+        """Per-hour, per-device counts by severity and source, with mean PM2.5"""
+        rows = [(hour, device, severity, source, count, pm25_sum / count)
+                for (hour, device, severity, source), (count, pm25_sum) in self.hourly.items()]
+        frame = pd.DataFrame(rows, columns=['hour', 'device_id', 'severity', 'fire_source',
+                                            'incidents', 'pm25_mean'])
+        return frame.sort_values('hour').reset_index(drop=True)
+
+    def trend_frame(self, max_points=500):
+        """Mean PM2.5 over time, merged into at most `max_points` equal-width bins"""
+        if not self.trend:
+            return pd.DataFrame(columns=['timestamp', 'pm25', 'incidents'])
+        keys = sorted(self.trend)
+        times = pd.DatetimeIndex(keys)
+        counts = np.array([self.trend[t][0] for t in keys], dtype=np.float64)
+        sums = np.array([self.trend[t][1] for t in keys], dtype=np.float64)
+
+        if len(times) > max_points:
+            offsets = times.asi8 - times.asi8[0]
+            width = offsets[-1] // max_points + 1
+            bins = offsets // width
+            counts = np.bincount(bins, weights=counts)
+            sums = np.bincount(bins, weights=sums)
+            keep = counts > 0
+            times = times[0] + pd.to_timedelta(np.flatnonzero(keep) * width, unit='ns')
+            counts, sums = counts[keep], sums[keep]
+
+        return pd.DataFrame({'timestamp': times, 'pm25': sums / counts, 'incidents': counts.astype(int)})
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+incident_store.py - Incremental DynamoDB access for the GAGAN NETRA dashboard
+
+The dashboard used to scan the whole GaganNetraIncidents table every 5 s
+(and silently stopped at the first 1 MB page). Here the first load is a
+paginated parallel scan; after that, each refresh only queries the
+'device_id-uploaded_at-index' GSI for items uploaded since the last one
+seen from each drone, so refresh cost scales with new incidents.
+
+uploaded_at (set by UploadSpool when the item is written) is used instead
+of the event timestamp: incidents spooled while offline are uploaded
+later with old event timestamps and would be missed by an event-time
+watermark.
+
+Usage (benchmark against DynamoDB Local, or in-process moto):
+    python3 incident_store.py --create-index --endpoint-url http://localhost:8000
+    python3 incident_store.py --bench --items 1000000 --endpoint-url http://localhost:8000
+    python3 incident_store.py --bench --items 50000 --moto
+"""
+
+import argparse
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from upload_spool import UPLOADED_AT_FORMAT
+
+TABLE_NAME = 'GaganNetraIncidents'
+TIME_INDEX = 'device_id-uploaded_at-index'
+
+
+def create_time_index(client, table_name=TABLE_NAME, index_name=TIME_INDEX):
+    """Add the device_id + uploaded_at GSI if the table does not have it yet. Returns True if created"""
+    description = client.describe_table(TableName=table_name)['Table']
+    if any(gsi['IndexName'] == index_name for gsi in description.get('GlobalSecondaryIndexes', [])):
+        return False
+    update = {
+        'Create': {
+            'IndexName': index_name,
+            'KeySchema': [{'AttributeName': 'device_id', 'KeyType': 'HASH'},
+                          {'AttributeName': 'uploaded_at', 'KeyType': 'RANGE'}],
+            'Projection': {'ProjectionType': 'ALL'},
+        }
+    }
+    if description.get('BillingModeSummary', {}).get('BillingMode') != 'PAY_PER_REQUEST':
+        update['Create']['ProvisionedThroughput'] = {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+    client.update_table(
+        TableName=table_name,
+        AttributeDefinitions=[{'AttributeName': 'device_id', 'AttributeType': 'S'},
+                              {'AttributeName': 'uploaded_at', 'AttributeType': 'S'}],
+        GlobalSecondaryIndexUpdates=[update],
+    )
+    return True
+
+
+class IncidentStore:
+    def __init__(self, table, index_name=TIME_INDEX, scan_segments=8, lookback=60.0):
+        """
+        table: boto3 DynamoDB Table resource
+        scan_segments: parallel segments for the initial full scan
+        lookback: seconds re-queried before each watermark; the GSI is eventually
+                  consistent, so an item can become visible after a newer one
+        """
+        self.table = table
+        self.index_name = index_name
+        self.scan_segments = scan_segments
+        self.lookback = lookback
+        self.watermarks = {}  # device_id -> newest uploaded_at seen
+        self.seen = {}        # incident_id -> uploaded_at, for de-duplication
+        self.loaded = False
+        self.read_units = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------
+    def _scan_segment(self, segment):
+        items = []
+        kwargs = {'Segment': segment, 'TotalSegments': self.scan_segments,
+                  'ReturnConsumedCapacity': 'TOTAL'}
+        while True:
+            response = self.table.scan(**kwargs)
+            items.extend(response.get('Items', []))
+            self._count_capacity(response)
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def scan_all(self):
+        """Every item in the table, following LastEvaluatedKey in all segments"""
+        with ThreadPoolExecutor(max_workers=self.scan_segments) as pool:
+            pages = list(pool.map(self._scan_segment, range(self.scan_segments)))
+        return [item for page in pages for item in page]
+
+    def query_since(self, device_id, since):
+        """Items from `device_id` uploaded after `since` (uploaded_at string), all pages"""
+        items = []
+        kwargs = {
+            'IndexName': self.index_name,
+            'KeyConditionExpression': Key('device_id').eq(device_id) & Key('uploaded_at').gt(since),
+            'ReturnConsumedCapacity': 'TOTAL',
+        }
+        while True:
+            response = self.table.query(**kwargs)
+            items.extend(response.get('Items', []))
+            self._count_capacity(response)
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _count_capacity(self, response):
+        capacity = response.get('ConsumedCapacity')
+        if capacity:
+            with self._lock:
+                self.read_units += float(capacity.get('CapacityUnits', 0))
+
+    # ------------------------------------------------------------
+    # Incremental refresh
+    # ------------------------------------------------------------
+    def _since(self, watermark):
+        try:
+            t = datetime.strptime(watermark, UPLOADED_AT_FORMAT) - timedelta(seconds=self.lookback)
+            return t.strftime(UPLOADED_AT_FORMAT)
+        except ValueError:
+            return watermark or '0'  # Key conditions cannot compare with ''
+
+
+    def _accept(self, items):
+        """Drop items already seen (unchanged), advance the watermarks"""
+        fresh = []
+        for item in items:
+            incident_id = item.get('incident_id')
+            uploaded_at = item.get('uploaded_at', '')
+            if incident_id in self.seen and self.seen[incident_id] == uploaded_at:
+                continue
+            self.seen[incident_id] = uploaded_at
+            fresh.append(item)
+            device_id = item.get('device_id')
+            if device_id and uploaded_at > self.watermarks.get(device_id, ''):
+                self.watermarks[device_id] = uploaded_at
+        return fresh
+
+    def refresh(self, device_ids=()):
+        """
+        Get incidents not returned by a previous refresh
+
+        The first call scans the table; later calls query the time index per
+        device. `device_ids` adds drones to poll that have not reported yet.
+        Without the index (see --create-index) every call scans.
+        """
+        if not self.loaded or self.index_name is None:
+            items = self.scan_all()
+            self.loaded = True
+            fresh = self._accept(items)
+            for device_id in device_ids:
+                self.watermarks.setdefault(device_id, '')
+            return fresh
+
+        for device_id in device_ids:
+            self.watermarks.setdefault(device_id, '')
+        devices = list(self.watermarks.items())
+        try:
+            with ThreadPoolExecutor(max_workers=min(8, max(1, len(devices)))) as pool:
+                pages = list(pool.map(lambda d: self.query_since(d[0], self._since(d[1])), devices))
+        except ClientError as e:
+            # Missing index: ValidationException on AWS, ResourceNotFoundException on moto
+            if e.response['Error']['Code'] not in ('ValidationException', 'ResourceNotFoundException'):
+                raise
+            print(f"[STORE] {self.index_name} unavailable, falling back to scans: {e}")
+            self.index_name = None
+            return self._accept(self.scan_all())
+        return self._accept([item for page in pages for item in page])
+
+
+# ============================================================
+# SYNTHETIC BENCHMARK (DynamoDB Local / moto)
+# ============================================================
+def create_table(dynamodb, table_name=TABLE_NAME):
+    """Create the incidents table with the time index (PAY_PER_REQUEST)"""
+    return dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[{'AttributeName': 'incident_id', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'incident_id', 'AttributeType': 'S'},
+                              {'AttributeName': 'device_id', 'AttributeType': 'S'},
+                              {'AttributeName': 'uploaded_at', 'AttributeType': 'S'}],
+        GlobalSecondaryIndexes=[{
+            'IndexName': TIME_INDEX,
+            'KeySchema': [{'AttributeName': 'device_id', 'KeyType': 'HASH'},
+                          {'AttributeName': 'uploaded_at', 'KeyType': 'RANGE'}],
+            'Projection': {'ProjectionType': 'ALL'},
+        }],
+        BillingMode='PAY_PER_REQUEST',
+    )
+
+
+def synthetic_items(count, devices=4, start=None):
+    """Incidents shaped like main.py's upload_to_aws items, one per second per device"""
+    start = start or datetime.now(timezone.utc) - timedelta(seconds=count)
+    for i in range(count):
+        t = start + timedelta(seconds=i)
+        yield {
+            'incident_id': str(uuid.uuid4()),
+            'timestamp': t.isoformat(),
+            'uploaded_at': t.strftime(UPLOADED_AT_FORMAT),
+            'device_id': f"GAGAN_NETRA_{i % devices + 1:02d}",
+            'latitude': '18.53516', 'longitude': '73.81134', 'altitude': '550.0',
+            'pm25': 40 + i % 200, 'gas_resistance': 50000, 'temperature': 30,
+            'fire_confidence': 1, 'fire_source': 'ACTIVE_FIRE: Wood/Biomass Fire',
+            'severity': 'MEDIUM', 'gps_satellites': 12, 'gps_fix_type': 3,
+            'evidence_url': '', 'status': 'NEW',
+        }
+
+
+def load_items(table, items):
+    loaded = 0
+    with table.batch_writer() as writer:
+        for item in items:
+            writer.put_item(Item=item)
+            loaded += 1
+            if loaded % 100000 == 0:
+                print(f"[STORE] Loaded {loaded} items")
+    return loaded
+
+
+def run_bench(table, items, new_items, devices):
+    print(f"[STORE] Loading {items} synthetic incidents...")
+    t0 = time.perf_counter()
+    load_items(table, synthetic_items(items, devices, start=datetime.now(timezone.utc) - timedelta(seconds=items)))
+    print(f"[STORE] Loaded in {time.perf_counter() - t0:.1f}s")
+
+    store = IncidentStore(table)
+    t0 = time.perf_counter()
+    first = store.refresh()
+    print(f"[STORE] Initial parallel scan: {len(first)} items in {time.perf_counter() - t0:.2f}s "
+          f"({store.read_units:.0f} RCU)")
+
+    store.read_units = 0.0
+    t0 = time.perf_counter()
+    empty = store.refresh()
+    print(f"[STORE] Refresh, nothing new: {len(empty)} items in {1000 * (time.perf_counter() - t0):.0f}ms "
+          f"({store.read_units:.1f} RCU)")
+
+    load_items(table, synthetic_items(new_items, devices, start=datetime.now(timezone.utc) + timedelta(seconds=1)))
+    store.read_units = 0.0
+    t0 = time.perf_counter()
+    fresh = store.refresh()
+    print(f"[STORE] Refresh, {new_items} new: {len(fresh)} items in {1000 * (time.perf_counter() - t0):.0f}ms "
+          f"({store.read_units:.1f} RCU)")
+    if len(first) != items or len(fresh) != new_items:
+        print("[STORE] ? Item counts do not match what was loaded")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GAGAN NETRA incident table tools")
+    parser.add_argument('--table', default=TABLE_NAME)
+    parser.add_argument('--region', default='ap-south-1')
+    parser.add_argument('--endpoint-url', help="e.g. http://localhost:8000 for DynamoDB Local")
+    parser.add_argument('--create-index', action='store_true', help="Add the time index to an existing table")
+    parser.add_argument('--bench', action='store_true', help="Create a synthetic table and time refreshes")
+    parser.add_argument('--moto', action='store_true', help="Run the benchmark against in-process moto")
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--new-items', type=int, default=20)
+    parser.add_argument('--devices', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.moto:
+        from moto import mock_aws
+        mock = mock_aws()
+        mock.start()
+
+    dynamodb = boto3.resource('dynamodb', region_name=args.region, endpoint_url=args.endpoint_url)
+    if args.create_index:
+        created = create_time_index(dynamodb.meta.client, args.table)
+        print(f"[STORE] {TIME_INDEX}: {'creating (backfill runs in the background)' if created else 'already exists'}")
+    if args.bench:
+        table_name = args.table if args.moto else f"{args.table}Bench"
+        table = create_table(dynamodb, table_name)
+        table.wait_until_exists()
+        try:
+            ok = run_bench(table, args.items, args.new_items, args.devices)
+        finally:
+            if not args.moto:
+                table.delete()
+        raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
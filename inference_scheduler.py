@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+inference_scheduler.py - Adaptive model cascade for GAGAN NETRA
+
+The fire detector runs on every frame. Secondary detectors (human, object)
+only run when the fire detector crosses a trigger confidence, every Nth
+frame, or when their cached result has gone stale. In between, the last
+result is reused.
+"""
+
+import time
+
+
+class ScheduledModel:
+    """Cached result and counters for one secondary detector"""
+
+    def __init__(self, name, run_fn, every_n, max_age, trigger_conf, empty_result):
+        self.name = name
+        self.run_fn = run_fn
+        self.every_n = every_n
+        self.max_age = max_age
+        self.trigger_conf = trigger_conf
+
+        self.result = empty_result
+        self.last_frame_id = None
+        self.last_run_time = 0.0
+        self.runs = 0
+        self.skipped = 0
+
+    def is_due(self, frame_id, trigger_score, now):
+        """Check whether the cached result must be refreshed for this frame"""
+        if self.last_frame_id is None:
+            return True
+        if self.trigger_conf is not None and trigger_score >= self.trigger_conf:
+            return True
+        if self.every_n and frame_id - self.last_frame_id >= self.every_n:
+            return True
+        if self.max_age is not None and now - self.last_run_time >= self.max_age:
+            return True
+        return False
+
+
+class InferenceScheduler:
+    def __init__(self, trigger_conf=0.4, every_n=15, max_age=2.0):
+        self.trigger_conf = trigger_conf
+        self.every_n = every_n
+        self.max_age = max_age
+        self.models = {}
+
+    def register(self, name, run_fn, every_n=None, max_age=None, trigger_conf=None,
+                 empty_result=None):
+        """
+        Register a secondary detector.
+
+        run_fn(frame) must return the detector result; per-model settings
+        default to the scheduler-wide ones.
+        """
+        self.models[name] = ScheduledModel(
+            name, run_fn,
+            every_n=self.every_n if every_n is None else every_n,
+            max_age=self.max_age if max_age is None else max_age,
+            trigger_conf=self.trigger_conf if trigger_conf is None else trigger_conf,
+            empty_result=[] if empty_result is None else empty_result,
+        )
+
+    def run(self, name, frame, frame_id, trigger_score=0.0, now=None, reuse=False):
+        """
+        Get the result of model `name` for this frame, running it only if due
+
+        reuse: return the cached result even if due (e.g. the scene has not
+        changed since it was computed); ignored before the first run
+        Returns: (result, fresh) where fresh is False when a cached result was reused
+        """
+        model = self.models[name]
+        now = time.time() if now is None else now
+        if (reuse and model.last_frame_id is not None) or not model.is_due(frame_id, trigger_score, now):
+            model.skipped += 1
+            return model.result, False
+
+        model.result = model.run_fn(frame)
+        model.last_frame_id = frame_id
+        model.last_run_time = now
+        model.runs += 1
+        return model.result, True
+
+    def get_stats(self):
+        """Get run/skip counts per model"""
+        return {name: {'runs': m.runs, 'skipped': m.skipped}
+                for name, m in self.models.items()}
+
+    def get_saved_inferences(self):
+        """Total number of inferences avoided by reusing cached results"""
+        return sum(m.skipped for m in self.models.values())
+
+    def get_stats_string(self):
+        parts = [f"{name}:{m.runs}run/{m.skipped}skip" for name, m in self.models.items()]
+        return f"{' '.join(parts)} | saved {self.get_saved_inferences()}"
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+ingest_loadgen.py - Simulated drone fleet for ingest_service.py
+
+Runs dozens of drones as asyncio tasks on one machine. Each keeps one
+connection to the ingestion service and sends upload spool batches:
+incidents shaped like main.py's (with an evidence blob), clip/peak
+updates of earlier incidents, and resends of whole batches as if an ack
+had been lost. By default the service runs in-process on a temporary
+LocalBackend, and the stored incidents are checked against what was sent.
+
+    python3 ingest_loadgen.py --drones 50 --incidents 200
+    python3 ingest_loadgen.py --connect ground-station:9200 --drones 20
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+
+import numpy as np
+
+from incident_store import synthetic_items
+from ingest_service import INGEST_PORT, IngestServer, LocalBackend, encode_frame, read_frame
+
+
+def make_entries(device_id, count, blob_size, update_rate, rng):
+    """Spool journal entries (wire form) and blobs for one drone: puts plus updates of earlier puts"""
+    entries = []
+    incident_ids = []
+    for item in synthetic_items(count, devices=1):
+        item['device_id'] = device_id
+        item['fire_confidence'] = Decimal('0.87')
+        incident_id = item['incident_id']
+        incident_ids.append(incident_id)
+        s3_key = f"evidence/{device_id}/{incident_id}.jpg"
+        entries.append(({'op': 'put', 'id': incident_id, 'item': item, 's3_key': s3_key,
+                         'content_type': 'image/jpeg', 'blob_size': blob_size}, rng.randbytes(blob_size)))
+        if rng.random() < update_rate:
+            target = rng.choice(incident_ids)
+            entries.append(({'op': 'update', 'id': f"{target}:{uuid.uuid4().hex[:12]}",
+                             'key': {'incident_id': target}, 'attributes': {'detections': rng.randint(2, 20)},
+                             's3_key': None, 'content_type': 'image/jpeg', 'blob_size': 0}, None))
+    return entries, incident_ids
+
+
+async def run_drone(host, port, device_id, entries, batch_size, window, resend_rate, rng, latencies, totals):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode_frame({'op': 'hello', 'device_id': device_id}))
+    welcome, _ = await read_frame(reader)
+    assert welcome['op'] == 'welcome', welcome
+
+    batches = [entries[i:i + batch_size] for i in range(0, len(entries), batch_size)]
+    # A lost ack: the spool sends the same batch again
+    batches += [batch for batch in batches if rng.random() < resend_rate]
+    sent_at = {}
+    slots = asyncio.Semaphore(window)  # Unacknowledged batches
+
+    async def receive_acks():
+        for _ in batches:
+            reply, _ = await read_frame(reader)
+            if reply['op'] != 'ack':
+                raise RuntimeError(f"{device_id}: {reply}")
+            latencies.append(time.perf_counter() - sent_at.pop(reply['seq']))
+            totals['duplicates'] += reply['duplicates']
+            slots.release()
+
+    receiver = asyncio.create_task(receive_acks())
+    for seq, batch in enumerate(batches, 1):
+        await slots.acquire()
+        sent_at[seq] = time.perf_counter()
+        writer.write(encode_frame({'op': 'batch', 'seq': seq, 'entries': [entry for entry, _ in batch]},
+                                  [blob for _, blob in batch if blob]))
+        await writer.drain()
+        totals['entries'] += len(batch)
+        totals['bytes'] += sum(len(blob) for _, blob in batch if blob)
+    await receiver
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(args):
+    server, data_dir = None, None
+    if args.connect:
+        host, _, port = args.connect.rpartition(':') if ':' in args.connect else (args.connect, '', '')
+        port = int(port) if port else INGEST_PORT
+    else:
+        data_dir = tempfile.mkdtemp(prefix='gagan_ingest_')
+        server = IngestServer(LocalBackend(data_dir), host='127.0.0.1', port=0, batch_size=args.flush_size,
+                              max_queue=args.max_queue)
+        await server.start()
+        host, port = '127.0.0.1', server.port
+
+    rng = random.Random(args.seed)
+    drones = {}
+    for i in range(args.drones):
+        device_id = f"GAGAN_NETRA_{i + 1:02d}"
+        drones[device_id] = make_entries(device_id, args.incidents, args.evidence_kb * 1024,
+                                         args.update_rate, random.Random(rng.random()))
+
+    latencies, totals = [], {'entries': 0, 'bytes': 0, 'duplicates': 0}
+    print(f"[LOADGEN] {args.drones} drones x {args.incidents} incidents -> {host}:{port}")
+    t0 = time.perf_counter()
+    await asyncio.gather(*(run_drone(host, port, device_id, entries, args.batch, args.window, args.resend_rate,
+                                     random.Random(rng.random()), latencies, totals)
+                           for device_id, (entries, _) in drones.items()))
+    elapsed = time.perf_counter() - t0
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    print(f"[LOADGEN] {totals['entries']} entries ({totals['bytes'] / 1e6:.0f} MB) in {elapsed:.2f}s = "
+          f"{totals['entries'] / elapsed:.0f} entries/s, {totals['bytes'] / 1e6 / elapsed:.1f} MB/s")
+    print(f"[LOADGEN] Batch ack latency p50 {p50:.1f}ms p95 {p95:.1f}ms p99 {p99:.1f}ms | "
+          f"duplicates acknowledged {totals['duplicates']}")
+
+    ok = True
+    if server:
+        stats = server.get_stats()
+        print(f"[LOADGEN] Service: stored {stats['stored']} | duplicates {stats['duplicates']} | "
+              f"lag p95 <= {1000 * stats['lag_p95_s']:.0f}ms | "
+              f"{server.m_flushes.labels('ok').value} writes")
+        expected = sum(len(ids) for _, ids in drones.values())
+        stored = server.backend.count()
+        ok = stored == expected and stats['write_errors'] == 0
+        print(f"[LOADGEN] {'OK' if ok else '? MISMATCH'}: {stored} incidents stored, {expected} sent")
+        await server.close()
+        server.backend.close()
+        if not args.keep:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        else:
+            print(f"[LOADGEN] Store kept in {data_dir}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated drone fleet for the ingestion service")
+    parser.add_argument('--connect', help="host:port of a running ingest_service.py (default: in-process)")
+    parser.add_argument('--drones', type=int, default=50)
+    parser.add_argument('--incidents', type=int, default=100, help="Per drone")
+    parser.add_argument('--batch', type=int, default=25, help="Entries per batch (the spool's batch_size)")
+    parser.add_argument('--window', type=int, default=1, help="Unacknowledged batches per drone (spool: 1)")
+    parser.add_argument('--evidence-kb', type=int, default=60)
+    parser.add_argument('--update-rate', type=float, default=0.3, help="Updates per incident")
+    parser.add_argument('--resend-rate', type=float, default=0.05, help="Batches sent twice")
+    parser.add_argument('--flush-size', type=int, default=200, help="In-process service: entries per write")
+    parser.add_argument('--max-queue', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help="Keep the in-process service's store")
+    args = parser.parse_args()
+    raise SystemExit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
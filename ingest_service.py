@@ -0,0 +1,661 @@
+#!/usr/bin/env python3
+"""
+ingest_service.py - Ground ingestion service for a GAGAN NETRA fleet
+
+Each UAV used to write its incidents straight to DynamoDB and S3. With a
+fleet that is one set of connections and credentials per drone and no
+back-pressure. Here drones keep one persistent TCP connection to this
+asyncio service and send their upload spool batches over it; the service
+batches entries from all drones into few large writes:
+
+    drones --(batches)--> bounded queue --> writer --> evidence store
+                                                   --> incident store
+
+Wire protocol, both directions: frames of a 4-byte big-endian header
+length, a JSON header and (client -> service) the entries' blobs:
+
+    {"op": "hello", "device_id": ...}               -> {"op": "welcome"}
+    {"op": "batch", "seq": n, "entries": [...]}     -> {"op": "ack", "seq": n, ...}
+                                                    or {"op": "error", "seq": n, "error": ...}
+
+Entries are upload_spool.py journal entries ("put"/"update"), with the
+blob file name replaced by "blob_size"; the blobs follow the header in
+entry order. A batch is acknowledged once all its entries are stored, so
+the drone's spool keeps (and retries) anything not acknowledged. The ack
+lists entries that can never be stored ("rejected": {id: reason}); the
+spool sets those aside.
+
+    - Back-pressure: when the queue is full, connections stop being read
+      (and TCP pushes back on the drones) instead of buffering without bound
+    - Idempotent retries: an entry id (incident_id for puts, the spool's
+      update id for updates) that was already stored is acknowledged
+      without writing it again. Ids are remembered for the last
+      `dedup_window` entries; the local backend also ignores puts of
+      existing incidents across restarts.
+    - One writer applies flushes in arrival order (evidence, puts, then
+      updates), so an update never lands before its incident
+    - A flush the backend refuses is retried one entry at a time, and the
+      entries it refuses for themselves (validation, bad key) are rejected,
+      so one bad entry doesn't fail every drone's batch. Any other error
+      (throttling, timeouts) fails the batches that were not stored
+
+LocalBackend (SQLite + evidence files) stands in for DynamoDB and S3;
+AwsBackend writes the same tables/buckets as the drones used to.
+Throughput, lag and queue depth are exposed on a metrics.py endpoint.
+
+Usage:
+    python3 ingest_service.py --data-dir ingest_store              # local stand-in
+    python3 ingest_service.py --backend aws --endpoint-url http://localhost:8000
+    python3 main.py --ingest ground-station:9200 --device-id GAGAN_NETRA_02
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import struct
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from metrics import MetricsRegistry, MetricsServer
+from upload_spool import UPLOADED_AT_FORMAT, _is_entry_error, _to_json, set_attributes
+
+INGEST_PORT = 9200
+MAX_HEADER_BYTES = 4 * 1024 * 1024
+MAX_FRAME_BYTES = 256 * 1024 * 1024   # Blobs of one batch (evidence JPEGs, clips)
+_LENGTH = struct.Struct('>I')
+
+# Seconds from receiving an entry to having it stored
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FLUSH_SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 500, 1000)
+
+
+class IngestError(Exception):
+    """The service refused a batch, or the connection broke"""
+
+
+class EntryError(ValueError):
+    """An entry the backend can never store (retrying cannot help)"""
+
+
+# ============================================================
+# FRAMING
+# ============================================================
+def encode_frame(header, blobs=()):
+    data = json.dumps(header, default=_to_json, separators=(',', ':')).encode()
+    return b''.join([_LENGTH.pack(len(data)), data, *blobs])
+
+
+def _blob_sizes(header):
+    if header.get('op') != 'batch':
+        return []
+    return [entry.get('blob_size') or 0 for entry in header.get('entries', ())]
+
+
+def _decode_header(data):
+    return json.loads(data, parse_float=Decimal)
+
+
+def _split_blobs(sizes, data):
+    blobs, offset = [], 0
+    for size in sizes:
+        blobs.append(data[offset:offset + size] if size else None)
+        offset += size
+    return blobs
+
+
+async def read_frame(reader, max_frame=MAX_FRAME_BYTES):
+    """(header, blobs) of the next frame; raises asyncio.IncompleteReadError at EOF"""
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    if length > MAX_HEADER_BYTES:
+        raise IngestError(f"Header of {length} bytes")
+    header = _decode_header(await reader.readexactly(length))
+    sizes = _blob_sizes(header)
+    total = sum(sizes)
+    if total > max_frame:
+        raise IngestError(f"Frame of {total} bytes")
+    return header, _split_blobs(sizes, await reader.readexactly(total) if total else b'')
+
+
+# ============================================================
+# DRONE SIDE
+# ============================================================
+class IngestClient:
+    """
+    Blocking client used by UploadSpool's uploader thread
+
+    Connects lazily and reconnects after any error; errors are raised so
+    the spool backs off and retries the batch (the service drops the
+    entries it already stored).
+    """
+
+    def __init__(self, host, port=INGEST_PORT, device_id='GAGAN_NETRA_01', timeout=10.0):
+        self.host = host
+        self.port = port
+        self.device_id = device_id
+        self.timeout = timeout
+        self.sock = None
+        self.seq = 0
+
+    @classmethod
+    def from_address(cls, address, **kwargs):
+        """'host:port' (or just 'host')"""
+        host, _, port = address.rpartition(':') if ':' in address else (address, '', '')
+        return cls(host, int(port) if port else INGEST_PORT, **kwargs)
+
+    def _recv_exactly(self, size):
+        chunks = []
+        while size:
+            chunk = self.sock.recv(min(size, 1 << 20))
+            if not chunk:
+                raise IngestError("Connection closed by the ingest service")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def _request(self, header, blobs=()):
+        self.sock.sendall(encode_frame(header, blobs))
+        (length,) = _LENGTH.unpack(self._recv_exactly(_LENGTH.size))
+        try:
+            return _decode_header(self._recv_exactly(length))
+        except ValueError as e:  # Not the entries' fault
+            raise IngestError(f"Garbled reply: {e}") from e
+
+    def _connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        reply = self._request({'op': 'hello', 'device_id': self.device_id})
+        if reply.get('op') != 'welcome':
+            raise IngestError(f"Handshake refused: {reply.get('error', reply)}")
+        print(f"[INGEST] Connected to {self.host}:{self.port} as {self.device_id}")
+
+    def send_batch(self, entries, blob_dir):
+        """Send spool journal entries (and their blob files); returns the service's ack"""
+        wire_entries, blobs = [], []
+        for entry in entries:
+            blob = None
+            if entry.get('blob'):
+                with open(os.path.join(blob_dir, entry['blob']), 'rb') as f:
+                    blob = f.read()
+            wire_entry = {k: v for k, v in entry.items() if k != 'blob'}
+            wire_entry['blob_size'] = len(blob) if blob else 0
+            wire_entries.append(wire_entry)
+            if blob:
+                blobs.append(blob)
+
+        try:
+            if self.sock is None:
+                self._connect()
+            self.seq += 1
+            reply = self._request({'op': 'batch', 'seq': self.seq, 'entries': wire_entries}, blobs)
+        except (OSError, ValueError, IngestError):
+            self.close()
+            raise
+        if reply.get('op') != 'ack' or reply.get('seq') != self.seq:
+            self.close()
+            raise IngestError(f"Batch {self.seq} not stored: {reply.get('error', reply)}")
+        return reply
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+
+# ============================================================
+# STORAGE BACKENDS
+# ============================================================
+class LocalBackend:
+    """
+    Stand-in for DynamoDB + S3 on one machine
+
+    Incidents go to an SQLite table (one transaction per flush), evidence
+    to files under `root`/objects named by their S3 key.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.object_dir = os.path.join(root, 'objects')
+        os.makedirs(self.object_dir, exist_ok=True)
+        # Only the writer's executor thread writes; readers (load generator) just count
+        self.db = sqlite3.connect(os.path.join(root, 'incidents.db'), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS incidents (incident_id TEXT PRIMARY KEY, "
+                        "device_id TEXT, uploaded_at TEXT, item TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS incidents_device_time ON incidents (device_id, uploaded_at)")
+        self.db.commit()
+
+    def _object_path(self, key):
+        path = os.path.normpath(os.path.join(self.object_dir, key))
+        if not path.startswith(self.object_dir + os.sep):
+            raise EntryError(f"Bad object key {key!r}")
+        return path
+
+    def write(self, entries, uploaded_at):
+        """entries: [(journal entry, blob bytes or None)] in arrival order"""
+        for entry, blob in entries:
+            if blob is not None and entry.get('s3_key'):
+                path = self._object_path(entry['s3_key'])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(blob)
+                os.replace(path + '.tmp', path)
+
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO incidents VALUES (?, ?, ?, ?) ON CONFLICT(incident_id) DO NOTHING",
+                [(entry['item']['incident_id'], entry['item'].get('device_id'), uploaded_at,
+                  json.dumps(dict(entry['item'], uploaded_at=uploaded_at), default=_to_json))
+                 for entry, _ in entries if entry['op'] == 'put'])
+            for entry, _ in entries:
+                if entry['op'] == 'update':
+                    incident_id = entry['key']['incident_id']
+                    row = self.db.execute("SELECT item FROM incidents WHERE incident_id = ?",
+                                          (incident_id,)).fetchone()
+                    # Like DynamoDB's update_item, an update of a missing item creates it
+                    item = json.loads(row[0]) if row else dict(entry['key'])
+                    item.update(entry['attributes'], uploaded_at=uploaded_at)
+                    self.db.execute(
+                        "INSERT INTO incidents VALUES (?, ?, ?, ?) ON CONFLICT(incident_id) DO UPDATE "
+                        "SET uploaded_at = excluded.uploaded_at, item = excluded.item",
+                        (incident_id, item.get('device_id'), uploaded_at, json.dumps(item, default=_to_json)))
+
+    def get(self, incident_id):
+        row = self.db.execute("SELECT item FROM incidents WHERE incident_id = ?", (incident_id,)).fetchone()
+        return json.loads(row[0], parse_float=Decimal) if row else None
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM incidents").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+
+class AwsBackend:
+    """The DynamoDB table and S3 bucket the drones used to write directly"""
+
+    def __init__(self, bucket, table_name, region='ap-south-1', endpoint_url=None,
+                 s3_client=None, table=None, workers=8):
+        import boto3
+        from botocore.config import Config
+
+        config = Config(retries={'max_attempts': 5, 'mode': 'standard'}, max_pool_connections=workers)
+        self.bucket = bucket
+        self.s3_client = s3_client or boto3.client('s3', region_name=region, config=config)
+        self.table = table or boto3.resource('dynamodb', region_name=region, config=config,
+                                             endpoint_url=endpoint_url).Table(table_name)
+        self.pool = ThreadPoolExecutor(max_workers=workers)  # Evidence uploads in parallel
+
+    def _put_object(self, entry, blob):
+        self.s3_client.put_object(Bucket=self.bucket, Key=entry['s3_key'], Body=blob, ACL='public-read',
+                                  ContentType=entry.get('content_type', 'image/jpeg'))
+
+    def write(self, entries, uploaded_at):
+        # Evidence first, so an item never points at a missing object
+        uploads = [self.pool.submit(self._put_object, entry, blob)
+                   for entry, blob in entries if blob is not None and entry.get('s3_key')]
+        for upload in uploads:
+            upload.result()
+        with self.table.batch_writer() as writer:  # 25 items per request
+            for entry, _ in entries:
+                if entry['op'] == 'put':
+                    writer.put_item(Item=dict(entry['item'], uploaded_at=uploaded_at))
+        for entry, _ in entries:
+            if entry['op'] == 'update':
+                set_attributes(self.table, entry['key'], dict(entry['attributes'], uploaded_at=uploaded_at))
+
+    def close(self):
+        self.pool.shutdown()
+
+
+# ============================================================
+# SERVICE
+# ============================================================
+class _Pending:
+    __slots__ = ('entry', 'blob', 'received', 'future')
+
+    def __init__(self, entry, blob, received, future):
+        self.entry = entry
+        self.blob = blob
+        self.received = received
+        self.future = future
+
+
+def _validate(entry):
+    """Reason an entry cannot be stored, or None"""
+    op = entry.get('op')
+    if not entry.get('id'):
+        return "no id"
+    if op == 'put':
+        item = entry.get('item')
+        if not isinstance(item, dict) or not item.get('incident_id') or not isinstance(item['incident_id'], str):
+            return "no item"
+        return None
+    if op == 'update':
+        key = entry.get('key')
+        if not isinstance(key, dict) or not key.get('incident_id') or not entry.get('attributes'):
+            return "no key/attributes"
+        return None
+    return f"unknown op {op!r}"
+
+
+class IngestServer:
+    def __init__(self, backend, host='0.0.0.0', port=INGEST_PORT, batch_size=200, flush_interval=0.02,
+                 max_queue=5000, max_in_flight=8, dedup_window=500000, registry=None):
+        """
+        batch_size: entries per backend write
+        flush_interval: seconds a flush waits for more entries when the queue is short
+        max_queue: entries waiting for the writer before connections stop being read
+        max_in_flight: unacknowledged batches per connection
+        dedup_window: stored entry ids remembered for idempotent retries
+        """
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_in_flight = max_in_flight
+        self.dedup_window = dedup_window
+
+        self.queue = None
+        self.server = None
+        self._tasks = []
+        self._seen = OrderedDict()  # Stored entry ids, oldest first
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-writer')
+        self.devices = {}           # device_id -> open connections
+
+        self.registry = registry or MetricsRegistry(prefix='gagan_ingest_')
+        self.m_entries = self.registry.counter('entries_total', "Entries acknowledged, by outcome",
+                                               ('outcome',))
+        self.m_bytes = self.registry.counter('received_bytes_total', "Batch bytes received (headers and blobs)")
+        self.m_batches = self.registry.counter('batches_total', "Batches received from drones")
+        self.m_flushes = self.registry.counter('flushes_total', "Backend writes, by outcome", ('outcome',))
+        self.m_flush_size = self.registry.histogram('flush_entries', "Entries per backend write",
+                                                    buckets=FLUSH_SIZE_BUCKETS)
+        self.m_flush_time = self.registry.histogram('flush_seconds', "Duration of backend writes")
+        self.m_lag = self.registry.histogram('lag_seconds', "Time from receiving an entry to storing it",
+                                             buckets=LAG_BUCKETS)
+        self.m_queue = self.registry.gauge('queue_depth', "Entries waiting for the writer")
+        self.m_connections = self.registry.gauge('connections', "Connected drones")
+        self.m_rate = self.registry.gauge('entries_per_second', "Stored entries per second (last interval)")
+        self.registry.add_collector(self._collect)
+        self._last_rate = (time.monotonic(), 0)
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    async def start(self):
+        self.queue = asyncio.Queue(self.max_queue)
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # If started on port 0
+        self._tasks.append(asyncio.create_task(self._write_loop()))
+        print(f"[INGEST] Listening on {self.host}:{self.port}")
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        # Let the writer store what was already received
+        while self.queue is not None and not self.queue.empty():
+            await asyncio.sleep(self.flush_interval)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._executor.shutdown()
+
+    # ------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        device_id = None
+        acks = asyncio.Queue(self.max_in_flight)
+        sender = asyncio.create_task(self._send_acks(writer, acks))
+        try:
+            hello, _ = await read_frame(reader)
+            device_id = hello.get('device_id')
+            if hello.get('op') != 'hello' or not device_id:
+                writer.write(encode_frame({'op': 'error', 'error': "expected hello with device_id"}))
+                return
+            writer.write(encode_frame({'op': 'welcome'}))
+            self.devices[device_id] = self.devices.get(device_id, 0) + 1
+            print(f"[INGEST] {device_id} connected from {peer}")
+
+            loop = asyncio.get_running_loop()
+            while True:
+                header, blobs = await read_frame(reader)
+                if header.get('op') != 'batch':
+                    await acks.put((header.get('seq'), None, f"unexpected op {header.get('op')!r}"))
+                    continue
+                self.m_batches.inc()
+                self.m_bytes.inc(sum(len(blob) for blob in blobs if blob))
+                received = time.monotonic()
+                futures = []
+                for entry, blob in zip(header['entries'], blobs):
+                    if entry.get('op') == 'put' and isinstance(entry.get('item'), dict):
+                        entry['item'].setdefault('device_id', device_id)
+                    future = loop.create_future()
+                    futures.append(future)
+                    # Blocks while the queue is full: the drone's socket backs up
+                    await self.queue.put(_Pending(entry, blob, received, future))
+                await acks.put((header.get('seq'), futures, None))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (IngestError, ValueError, KeyError, TypeError) as e:
+            print(f"[INGEST] ? Dropping {device_id or peer}: {e}")
+        finally:
+            # Pending acks are still sent if the drone only half-closed
+            await acks.put(None)
+            await sender
+            if device_id in self.devices:
+                self.devices[device_id] -= 1
+                if not self.devices[device_id]:
+                    del self.devices[device_id]
+                print(f"[INGEST] {device_id} disconnected")
+            writer.close()
+
+    async def _send_acks(self, writer, acks):
+        """Reply to a connection's batches in order, as their entries are stored"""
+        broken = False
+        while True:
+            item = await acks.get()
+            if item is None:
+                return
+            seq, futures, error = item
+            if futures is not None:
+                outcomes = await asyncio.gather(*futures)
+                failed = [o for o in outcomes if isinstance(o, Exception)]
+                if failed:
+                    error = str(failed[0])
+            if broken:
+                continue
+            if error:
+                reply = {'op': 'error', 'seq': seq, 'error': error}
+            else:
+                reply = {'op': 'ack', 'seq': seq, 'entries': len(outcomes),
+                         'duplicates': outcomes.count('duplicate'),
+                         'rejected': {o[1]: o[2] for o in outcomes if isinstance(o, tuple)}}
+            try:
+                writer.write(encode_frame(reply))
+                await writer.drain()
+            except ConnectionError:
+                broken = True  # Keep draining futures; the drone retries the batch
+
+    # ------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------
+    async def _write_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            if self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.flush_interval)  # Gather entries from other drones
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        to_store, ids = [], set()
+        for pending in batch:
+            entry_id = pending.entry.get('id')
+            reason = _validate(pending.entry)
+            if reason:
+                self._reject(pending, reason)
+            elif entry_id in self._seen or entry_id in ids:
+                self.m_entries.labels('duplicate').inc()
+                pending.future.set_result('duplicate')
+            else:
+                ids.add(entry_id)
+                to_store.append(pending)
+        if not to_store:
+            return
+
+        uploaded_at = datetime.now(timezone.utc).strftime(UPLOADED_AT_FORMAT)
+        error = await self._write(to_store, uploaded_at)
+        if error:
+            print(f"[INGEST] ? Write of {len(to_store)} entries failed: {error}")
+            to_store, rejected, failed, error = await self._write_each(to_store, uploaded_at)
+            for pending, entry_error in rejected:
+                self._reject(pending, str(entry_error))
+            for pending in failed:
+                pending.future.set_result(error)
+
+        now = time.monotonic()
+        stored = self.m_entries.labels('stored')
+        for pending in to_store:
+            self._seen[pending.entry['id']] = None
+            self.m_lag.observe(now - pending.received)
+            stored.inc()
+            pending.future.set_result('stored')
+        while len(self._seen) > self.dedup_window:
+            self._seen.popitem(last=False)
+
+    async def _write(self, pendings, uploaded_at):
+        """One backend write; returns the exception if it failed"""
+        t0 = time.perf_counter()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.backend.write, [(p.entry, p.blob) for p in pendings], uploaded_at)
+        except Exception as e:
+            self.m_flushes.labels('error').inc()
+            return e
+        self.m_flushes.labels('ok').inc()
+        self.m_flush_time.observe(time.perf_counter() - t0)
+        self.m_flush_size.observe(len(pendings))
+        return None
+
+    async def _write_each(self, pendings, uploaded_at):
+        """
+        Retry a failed flush one entry at a time, in arrival order
+
+        One entry the backend cannot store would otherwise fail every
+        drone's batch in the flush, and the whole fleet would retry it in
+        lockstep. Returns (stored, rejected [(pending, error)], failed,
+        error): at the first error that is not the entry's own (throttling,
+        a timeout, the backend down) that entry and the rest fail with it,
+        so the drones retry them.
+        """
+        stored, rejected = [], []
+        for i, pending in enumerate(pendings):
+            error = await self._write([pending], uploaded_at)
+            if error is None:
+                stored.append(pending)
+            elif isinstance(error, EntryError) or _is_entry_error(error):
+                rejected.append((pending, error))
+            else:
+                return stored, rejected, pendings[i:], error
+        return stored, rejected, [], None
+
+    def _reject(self, pending, reason):
+        entry_id = pending.entry.get('id')
+        print(f"[INGEST] ? Rejected entry {entry_id}: {reason}")
+        self.m_entries.labels('rejected').inc()
+        pending.future.set_result(('rejected', entry_id, reason))
+
+    # ------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------
+    def _collect(self):
+        self.m_queue.set(self.queue.qsize() if self.queue else 0)
+        self.m_connections.set(sum(self.devices.values()))
+        now, stored = time.monotonic(), self.m_entries.labels('stored').value
+        last_time, last_stored = self._last_rate
+        if now - last_time >= 1.0:
+            self.m_rate.set((stored - last_stored) / (now - last_time))
+            self._last_rate = (now, stored)
+
+    def get_stats(self):
+        self._collect()
+        return {
+            'connections': int(self.m_connections.value),
+            'devices': len(self.devices),
+            'stored': self.m_entries.labels('stored').value,
+            'duplicates': self.m_entries.labels('duplicate').value,
+            'rejected': self.m_entries.labels('rejected').value,
+            'write_errors': self.m_flushes.labels('error').value,
+            'queue': int(self.m_queue.value),
+            'entries_per_s': self.m_rate.value,
+            'lag_p95_s': self.m_lag.quantile(0.95),
+        }
+
+
+# ============================================================
+# MAIN
+# ============================================================
+async def serve(server, stats_interval=10.0):
+    await server.start()
+    try:
+        while True:
+            await asyncio.sleep(stats_interval)
+            stats = server.get_stats()
+            print(f"[INGEST] {stats['devices']} drones | {stats['entries_per_s']:.0f} entries/s | "
+                  f"stored {stats['stored']} dup {stats['duplicates']} | queue {stats['queue']} | "
+                  f"lag p95 {1000 * stats['lag_p95_s']:.0f}ms")
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GAGAN NETRA fleet ingestion service")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=INGEST_PORT)
+    parser.add_argument('--backend', choices=('local', 'aws'), default='local')
+    parser.add_argument('--data-dir', default="ingest_store", help="Local backend: SQLite + evidence files")
+    parser.add_argument('--bucket', default='gagan-netra-evidence')
+    parser.add_argument('--table', default='GaganNetraIncidents')
+    parser.add_argument('--region', default='ap-south-1')
+    parser.add_argument('--endpoint-url', help="e.g. http://localhost:8000 for DynamoDB Local")
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--flush-ms', type=float, default=20.0)
+    parser.add_argument('--max-queue', type=int, default=5000)
+    parser.add_argument('--metrics-port', type=int, default=9109, help="0 disables the metrics endpoint")
+    args = parser.parse_args()
+
+    if args.backend == 'aws':
+        backend = AwsBackend(args.bucket, args.table, region=args.region, endpoint_url=args.endpoint_url)
+    else:
+        backend = LocalBackend(args.data_dir)
+    server = IngestServer(backend, host=args.host, port=args.port, batch_size=args.batch_size,
+                          flush_interval=args.flush_ms / 1000, max_queue=args.max_queue)
+    metrics_server = MetricsServer(server.registry, port=args.metrics_port) if args.metrics_port else None
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        print("\n[INGEST] Stopped")
+    finally:
+        if metrics_server:
+            metrics_server.close()
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,370 +3,603 @@
 GAGAN NETRA - Phase 2
 UAV-based Fire/Smoke Detection System with AWS Integration
 Intelligent Fire Source Classification using BME688 + PMS7003
+
+Usage:
+    python3 main.py                     # Flight mode (camera, sensors, GPS, AWS)
+    python3 main.py --replay-video flight.avi --replay-sensors trace.csv \
+        --replay-gps track.csv --replay-speed 0 --headless --offline
 """
 
+import argparse
 import cv2
+import numpy as np
 import time
-import csv
+import json
+import threading
 import os
-import serial
-import smbus2
-import bme680
+import hashlib
 from datetime import datetime
-from ultralytics import YOLO
-import boto3
 import uuid
-from botocore.exceptions import ClientError
 from decimal import Decimal
 from gps_reader import CubeOrangeGPS
+from fusion_rules import detect_fire_or_smoke, classify_fire_source, get_severity
+from pipeline import Pipeline, LatencyRecorder
+from metrics import MetricsRegistry, MetricsServer, SnapshotWriter, read_thermal_zones
+from inference_scheduler import InferenceScheduler
+from scene_gate import SceneGate
+from tiled_inference import TiledDetector, TILE_MODES, result_arrays
+from preprocess import FramePreprocessor, SharedInputModel
+from upload_spool import UploadSpool
+from ingest_service import IngestClient
+from flight_log import FlightLog
+from video_recorder import VideoRecorder, DROP_POLICIES
+from clip_buffer import PreRollBuffer
+from fire_tracker import FireTracker
+from hotspot_index import HotspotIndex
+from georeference import CameraModel, GroundProjector, fuse
+from pms7003_reader import PMS7003Reader
+from bme688_sampler import BME688Sampler
+from threaded_camera import ThreadedCamera
 
 # ============================================================
 # AWS CONFIGURATION
 # ============================================================
-dynamodb = boto3.resource('dynamodb', region_name='ap-south-1')
-s3_client = boto3.client('s3', region_name='ap-south-1')
-table = dynamodb.Table('GaganNetraIncidents')
+AWS_REGION = 'ap-south-1'
+DYNAMODB_TABLE = 'GaganNetraIncidents'
 S3_BUCKET = 'gagan-netra-evidence'
+SPOOL_DIR = "upload_spool"  # Incidents wait here until the uploader syncs them
+DEVICE_ID = 'GAGAN_NETRA_01'  # Identifies this UAV's incidents (dashboard DEVICE_IDS)
+INGEST_ADDRESS = None         # 'host:port' of ingest_service.py; None uploads to AWS directly
 
 # ============================================================
 # CONFIGURATION
 # ============================================================
 HEADLESS_MODE = False  # Set to True for UAV flight (no display)
 VIDEO_DEVICE = "/dev/video42"
+CAMERA_START_TIMEOUT = 10.0  # Seconds to wait for the first frame
 PMS7003_PORT = "/dev/ttyTHS1"
 BME688_BUS = 7
+BME688_INTERVAL = 1.0  # Seconds between BME688 measurements
+BME688_MAX_AGE = 5.0   # Older readings are treated as missing
+PMS7003_MAX_AGE = 5.0  # Same for PM2.5 (the sensor reports every 1-2.3 s)
 VIDEO_SAVE_PATH = "/home/aigen/gagan_netra/flight_recordings"
 RECORD_VIDEO = True
-# Create the directory if it doesn't exist
-if not os.path.exists(VIDEO_SAVE_PATH):
-    os.makedirs(VIDEO_SAVE_PATH, exist_ok=True)
+VIDEO_FPS = 5.0              # Segment rate until the capture rate has been measured
+VIDEO_SEGMENT_SECONDS = 60.0 # Rotate recordings so a crash loses at most one segment
+VIDEO_SEGMENT_MB = 512
+VIDEO_QUEUE_SIZE = 8         # Frames buffered for the recorder thread
+VIDEO_DROP_POLICY = 'drop_oldest'  # When the recorder falls behind: drop_oldest, drop_newest or block
 FIRE_MODEL = "ml/smoke fire detection/models/best_nano_111.engine"
 HUMAN_MODEL = "ml/human detection/model/best.engine"
 OBJECT_MODEL = "ml/object detection/model/best.engine"
+MODEL_INPUT_SIZE = 640   # Input size the three engines were exported with
+SHARED_PREPROCESS = True # Letterbox/normalise each frame once for all detectors (see preprocess.py)
 CSV_FILE = "gagan_netra_flight_log.csv"
+FLIGHT_SEGMENT_DIR = "flight_segments"  # Parquet copies of the flight log (needs pyarrow)
+FLIGHT_LOG_FSYNC = 'flush'  # 'flush', 'close' or 'never' (see flight_log.py)
 EVIDENCE_DIR = "evidence"
-COOLDOWN = 5  # seconds between logs
+EVIDENCE_JPEG_QUALITY = 95  # cv2 default
+EVIDENCE_MAX_WIDTH = 0      # Downscale wider evidence frames to this (0 = full resolution)
+RECORD_CLIPS = True         # Save a short clip around every incident
+CLIP_DIR = "evidence_clips"
+CLIP_PRE_ROLL = 5.0         # Seconds before / after the detection
+CLIP_POST_ROLL = 5.0
+CLIP_FPS = 5.0              # Frames kept per second in the pre-roll buffer
+CLIP_WIDTH = 640            # Buffered frames are downscaled to this width...
+CLIP_BUFFER_MB = 32         # ...JPEG-compressed and kept within this budget
+# Fire tracks replace a global log cooldown: one incident per fire, then updates
+TRACK_IOU_THRESHOLD = 0.2
+TRACK_CONFIRM_HITS = 3        # Detections before a track is logged as an incident
+TRACK_MAX_AGE = 3.0           # Seconds a track survives without a detection
+TRACK_UPDATE_INTERVAL = 10.0  # Min seconds between updates of one incident (new peaks only)
+CAMERA_CALIBRATION_SIZE = (1920, 1080)  # Resolution the intrinsics below refer to
+CAMERA_HFOV = 118.0           # GoPro wide lens, used when CAMERA_INTRINSICS is None
+CAMERA_INTRINSICS = None      # (fx, fy, cx, cy) in pixels from a calibration
+CAMERA_TILT = 45.0            # Degrees below the nose the camera is mounted (90 = nadir)
+GEO_GPS_ERROR = 2.5           # 1-sigma errors used for the fire position uncertainty:
+GEO_ALTITUDE_ERROR = 3.0      #   metres (height above ground; terrain is assumed flat at home height)
+GEO_ATTITUDE_ERROR = 1.0      #   degrees (attitude + mount alignment)
+GEO_MAX_OFF_NADIR = 80.0      # Boxes seen flatter than this get no ground position
+HOTSPOT_RADIUS_M = 75.0       # A new track this close to a logged fire updates its incident...
+HOTSPOT_WINDOW = 1800.0       # ...if that fire was seen within this many seconds
 FIRE_CONFIDENCE_THRESHOLD = 0.4
 FIRE_PM25_THRESHOLD = 35
-BASELINE_TEMPERATURE = 25.0  # Baseline for temperature rise calculation
+# Secondary (human/object) detectors run only when needed
+SECONDARY_TRIGGER_CONF = 0.4  # Run them on frames where fire confidence reaches this
+SECONDARY_EVERY_N = 15        # ...otherwise refresh every Nth frame
+SECONDARY_MAX_AGE = 2.0       # ...or when the cached result is older than this (seconds)
+# Scene gating: reuse the last detections while the view has not changed
+SCENE_GATE = True
+SCENE_GATE_SENSITIVITY = 0.02  # Fraction of a block's pixels that must change (lower = more inference)
+SCENE_GATE_MAX_AGE = 1.0       # Seconds; run the detectors at least this often anyway
+TILE_MODE = 'adaptive'    # Fire detector tiling: 'off', 'adaptive' or 'full' (see tiled_inference.py)
+TILE_SIZE = 640           # Crop size in frame pixels (match the model input size)
+TILE_OVERLAP = 0.2
+TILE_CANDIDATE_CONF = 0.15   # Adaptive: coarse detections from here up get a full-resolution crop
+TILE_FULL_ALTITUDE = 60.0    # Adaptive: metres above home from which the whole frame is tiled
+TILE_MAX_BATCH = 0           # Crops per model call (0 = all; set 1 for a fixed-batch engine)
+STATS_INTERVAL = 10  # seconds between pipeline stat prints
+METRICS_PORT = 9108  # Prometheus /metrics endpoint (0 = off)
+METRICS_SNAPSHOT = "logs/metrics.json"  # Compact JSON snapshot, rewritten every METRICS_INTERVAL
+METRICS_INTERVAL = 10.0
+
+# ============================================================
+# RUNTIME STATE (filled in by main())
+# ============================================================
+pms_sensor = None
+bme = None
+bme_sampler = None
+gps = None
+fire_model = human_model = object_model = None
+fire_detector = None  # fire_model wrapped for tiled inference
+preprocessor = None
+scheduler = None
+scene_gate = None
+last_fire_results = []  # Reused on frames the scene gate skips
+spool = None
+flight_log = None
+clip_buffer = None
+cap = None
+video_recorder = None
+pipeline = None
+display_queue = None
+event_queue = None
+fire_tracker = None
+track_incidents = {}  # track_id -> incident_id (log stage only)
+hotspots = None       # Logged fires by position, keyed by track_id (log stage only)
+projector = None      # Fire box -> ground position (inference stage)
+timings = LatencyRecorder()  # Hot-path steps and capture -> annotated ('end_to_end')
+metrics_server = None
+metrics_snapshot = None
+
+# ============================================================
+# METRICS
+# ============================================================
+# Histograms are fed from the hot path; everything else is pulled from
+# the components' own counters when /metrics is scraped.
+metrics = MetricsRegistry()
+stage_latency = metrics.histogram('stage_latency_seconds', "Pipeline stage processing time", ('stage',))
+step_latency = metrics.histogram('step_latency_seconds',
+                                 "Hot-path step time (models, drawing, evidence, CSV, video)", ('step',))
+events_logged = metrics.counter('events_logged_total', "Fire/smoke events written to CSV and spool")
+incidents_merged = metrics.counter('incidents_merged_total',
+                                   "New fire tracks merged into an incident logged nearby")
+georeferenced = metrics.counter('georeferenced_boxes_total',
+                                "Fire boxes projected to the ground, or rejected (no altitude, near horizon)",
+                                ('outcome',))
+hotspot_count = metrics.gauge('hotspots', "Distinct fire locations logged this flight")
+incident_updates = metrics.counter('incident_updates_total', "Peak updates queued for already logged incidents")
+fire_tracks = metrics.gauge('fire_tracks', "Fire tracks currently followed", ('state',))
+stage_frames = metrics.counter('stage_frames_total', "Items processed per pipeline stage", ('stage',))
+stage_errors = metrics.counter('stage_errors_total', "Exceptions per pipeline stage", ('stage',))
+stage_fps = metrics.gauge('stage_fps', "Mean throughput per pipeline stage", ('stage',))
+queue_depth = metrics.gauge('queue_depth', "Items waiting between stages", ('queue',))
+queue_dropped = metrics.counter('queue_dropped_total', "Items dropped by full stage queues", ('queue',))
+inferences = metrics.counter('inferences_total', "Detector runs per model", ('model',))
+inferences_skipped = metrics.counter('inferences_skipped_total',
+                                     "Scheduled detector runs replaced by a cached result", ('model',))
+tile_crops = metrics.counter('tile_crops_total', "Full-resolution crops run through the fire detector")
+tiled_frames = metrics.counter('tiled_frames_total', "Frames tiled completely (at or above TILE_FULL_ALTITUDE)")
+preprocessed = metrics.counter('preprocessed_frames_total',
+                               "Detector inputs prepared, or reused by another detector", ('outcome',))
+scene_change = metrics.gauge('scene_change_score', "Changed-pixel fraction of the busiest block vs. the last inferred frame")
+camera_events = metrics.counter('camera_events_total', "Camera frames, drops, duplicates, failures, reconnects", ('event',))
+sensor_age = metrics.gauge('sensor_age_seconds', "Age of the newest sample per sensor", ('sensor',))
+sensor_errors = metrics.counter('sensor_errors_total', "Read/parse errors per sensor", ('sensor',))
+spool_backlog = metrics.gauge('upload_backlog', "Incidents waiting for upload")
+spool_uploaded = metrics.counter('uploads_total', "Incidents uploaded to AWS")
+spool_online = metrics.gauge('upload_online', "1 if the last upload attempt succeeded")
+video_lag = metrics.gauge('video_lag_seconds', "Time from pipeline entry to the frame being recorded")
+video_frames = metrics.counter('video_frames_total', "Recorded video frames by outcome", ('outcome',))
+video_segments = metrics.counter('video_segments_total', "Video segments started")
+clip_buffer_bytes = metrics.gauge('clip_buffer_bytes', "Pre-roll memory: ring and clips awaiting post-roll",
+                                  ('part',))
+clips_written = metrics.counter('clips_written_total', "Incident clips saved")
+flight_log_pending = metrics.gauge('flight_log_pending_rows', "Flight log rows not yet in the CSV/a segment",
+                                   ('stage',))
+thermal = metrics.gauge('thermal_celsius', "SoC thermal zone temperature", ('zone',))
+
+# Resolve the hot-path series once so recording never allocates
+for _step in ('preprocess', 'fire_model', 'human_model', 'object_model', 'georeference', 'draw_boxes', 'overlay',
+              'evidence_encode', 'evidence_write', 'csv_append', 'video_write', 'end_to_end'):
+    timings.observers[_step] = step_latency.labels(_step).observe
+
+def collect_metrics():
+    """Refresh pulled metrics (runs on the scrape/snapshot thread)"""
+    if pipeline:
+        for stage in pipeline.stages:
+            stats = stage.get_stats()
+            stage_frames.labels(stage.name).value = stats['processed']
+            stage_errors.labels(stage.name).value = stats['errors']
+            stage_fps.labels(stage.name).set(stats['fps'])
+            if stage.name == 'inference':
+                inferences.labels('fire').value = stats['processed'] - (scene_gate.skipped if scene_gate else 0)
+        for queue in pipeline.queues:
+            queue_depth.labels(queue.name).set(len(queue))
+            queue_dropped.labels(queue.name).value = queue.dropped
+    if scheduler:
+        for name, stats in scheduler.get_stats().items():
+            inferences.labels(name).value = stats['runs']
+            inferences_skipped.labels(name).value = stats['skipped']
+    if scene_gate:
+        inferences_skipped.labels('fire').value = scene_gate.skipped
+        scene_change.set(scene_gate.last_score)
+    if preprocessor:
+        prep_stats = preprocessor.get_stats()
+        preprocessed.labels('prepared').value = prep_stats['prepared']
+        preprocessed.labels('reused').value = prep_stats['reused']
+    if fire_detector:
+        tile_stats = fire_detector.get_stats()
+        tile_crops.value = tile_stats['crops']
+        tiled_frames.value = tile_stats['full_frames']
+    if cap:
+        cam = cap.get_stats()
+        for key in ('frames', 'dropped', 'duplicates', 'read_failures', 'reconnects'):
+            camera_events.labels(key).value = cam[key]
+    if pms_sensor:
+        sensor_age.labels('pms7003').set(pms_sensor.get_age())
+        pms = pms_sensor.get_stats()
+        sensor_errors.labels('pms7003').value = (pms['checksum_errors'] + pms['length_errors']
+                                                  + pms['read_errors'])
+    if bme_sampler:
+        sensor_age.labels('bme688').set(bme_sampler.get_age())
+        sensor_errors.labels('bme688').value = bme_sampler.get_stats()['read_errors']
+    if gps and gps.connected:
+        sensor_age.labels('gps').set(time.time() - gps.last_update if gps.last_update else float('inf'))
+    if spool:
+        spool_backlog.set(spool.get_backlog())
+        spool_uploaded.value = spool.uploaded
+        spool_online.set(1 if spool.online else 0)
+    if video_recorder:
+        video = video_recorder.get_stats()
+        video_lag.set(video['lag_s'])
+        video_segments.value = video['segments']
+        for outcome in ('written', 'duplicated', 'skipped'):
+            video_frames.labels(outcome).value = video[outcome]
+    if clip_buffer:
+        clip_stats = clip_buffer.get_stats()
+        clip_buffer_bytes.labels('ring').set(clip_stats['ring_bytes'])
+        clip_buffer_bytes.labels('pending').set(clip_stats['pending_bytes'])
+        clips_written.value = clip_stats['clips_written']
+    if fire_tracker:
+        track_stats = fire_tracker.get_stats()
+        fire_tracks.labels('active').set(track_stats['active'])
+        fire_tracks.labels('confirmed').set(track_stats['confirmed'])
+    if hotspots:
+        hotspot_count.set(len(hotspots))
+    if projector:
+        geo_stats = projector.get_stats()
+        georeferenced.labels('projected').value = geo_stats['projected']
+        georeferenced.labels('rejected').value = geo_stats['rejected']
+    if flight_log:
+        log_stats = flight_log.get_stats()
+        flight_log_pending.labels('csv').set(log_stats['buffered'])
+        flight_log_pending.labels('segment').set(log_stats['unsegmented'])
+    for zone, celsius in read_thermal_zones().items():
+        thermal.labels(zone).set(celsius)
+
+metrics.add_collector(collect_metrics)
+
+def init_metrics(port=METRICS_PORT, snapshot_path=METRICS_SNAPSHOT):
+    """Start the /metrics endpoint and the JSON snapshot writer"""
+    global metrics_server, metrics_snapshot
+    if port:
+        try:
+            metrics_server = MetricsServer(metrics, port=port)
+        except OSError as e:
+            print(f"?? Metrics endpoint failed - {e}")
+    if snapshot_path:
+        metrics_snapshot = SnapshotWriter(metrics, snapshot_path, interval=METRICS_INTERVAL)
 
 # ============================================================
 # SENSOR INITIALIZATION
 # ============================================================
-print("=" * 60)
-print("GAGAN NETRA - PHASE 2")
-print("Intelligent Fire/Smoke Detection with Sensor Fusion")
-print("=" * 60)
-
-# PMS7003 Air Quality Sensor
-try:
-    pms_sensor = serial.Serial(PMS7003_PORT, baudrate=9600, timeout=1)
-    print("? UART: PMS7003")
-except Exception as e:
-    print(f"?? UART: PMS7003 failed - {e}")
-    pms_sensor = None
-
-# BME688 Gas Sensor
-try:
-    i2c = smbus2.SMBus(BME688_BUS)
-    bme = bme680.BME680(i2c_addr=0x76, i2c_device=i2c)
-    bme.set_gas_status(bme680.ENABLE_GAS_MEAS)
-    bme.set_filter(bme680.FILTER_SIZE_3)
-    bme.set_gas_heater_temperature(320)
-    bme.set_gas_heater_duration(150)
-    bme.select_gas_heater_profile(0)
-    print("? I2C: BME688")
-except Exception as e:
-    print(f"?? I2C: BME688 failed - {e}")
-    bme = None
-
-# GPS - Cube Orange via DroneKit
-try:
-    gps = CubeOrangeGPS(port='/dev/ttyACM0', baud=115200)
-    print("? GPS: Cube Orange connected")
-except Exception as e:
-    print(f"? GPS: Failed to connect - {e}")
-    gps = None
+def init_sensors():
+    """Connect PMS7003, BME688 and the Cube Orange"""
+    global pms_sensor, bme, bme_sampler, gps
+
+    # PMS7003 Air Quality Sensor
+    try:
+        pms_sensor = PMS7003Reader(PMS7003_PORT, baudrate=9600, max_age=PMS7003_MAX_AGE)
+        print("? UART: PMS7003")
+    except Exception as e:
+        print(f"?? UART: PMS7003 failed - {e}")
+        pms_sensor = None
+
+    # BME688 Gas Sensor
+    try:
+        import smbus2
+        import bme680
+        i2c = smbus2.SMBus(BME688_BUS)
+        bme = bme680.BME680(i2c_addr=0x76, i2c_device=i2c)
+        bme.set_gas_status(bme680.ENABLE_GAS_MEAS)
+        bme.set_filter(bme680.FILTER_SIZE_3)
+        bme.set_gas_heater_temperature(320)
+        bme.set_gas_heater_duration(150)
+        bme.select_gas_heater_profile(0)
+        bme_sampler = BME688Sampler(bme, interval=BME688_INTERVAL, max_age=BME688_MAX_AGE)
+        print("? I2C: BME688")
+    except Exception as e:
+        print(f"?? I2C: BME688 failed - {e}")
+        bme = None
+        bme_sampler = None
+
+    # GPS - Cube Orange via DroneKit
+    try:
+        gps = CubeOrangeGPS(port='/dev/ttyACM0', baud=115200)
+        print("? GPS: Cube Orange connected")
+    except Exception as e:
+        print(f"? GPS: Failed to connect - {e}")
+        gps = None
+
+def init_replay(args):
+    """Replace camera, sensors and GPS with recorded data"""
+    global cap, pms_sensor, bme_sampler, gps
+    from replay import ReplayClock, ReplayCamera, SensorTrace, ReplayPMS7003, ReplayBME688, ReplayGPS
+
+    clock = ReplayClock(speed=args.replay_speed)
+    trace = SensorTrace(args.replay_sensors) if args.replay_sensors else None
+    if trace:
+        pms_sensor = ReplayPMS7003(trace, clock, max_age=PMS7003_MAX_AGE)
+        bme_sampler = ReplayBME688(trace, clock, max_age=BME688_MAX_AGE)
+        print(f"? Replay sensors: {args.replay_sensors} ({len(trace.rows)} samples)")
+    if args.replay_gps:
+        gps = ReplayGPS(args.replay_gps, clock)
+        print(f"? Replay GPS: {args.replay_gps}")
+
+    # Align the first frame with the start of the recorded data
+    start_time = args.replay_start
+    if start_time is None:
+        starts = [t for t in (trace.start_time() if trace else None,
+                              gps.start_time() if gps else None) if t is not None]
+        start_time = min(starts) if starts else time.time()
+
+    cap = ReplayCamera(args.replay_video, clock, fps=args.replay_fps, start_time=start_time)
+    speed = "as fast as possible" if args.replay_speed <= 0 else f"{args.replay_speed}x"
+    print(f"? Replay video: {args.replay_video} @ {cap.fps:.1f} fps, {speed}")
 
 # ============================================================
 # AI MODEL LOADING
 # ============================================================
-print("?? Loading AI models...")
-try:
-    fire_model = YOLO(FIRE_MODEL, task='detect')
-    human_model = YOLO(HUMAN_MODEL, task='detect')
-    object_model = YOLO(OBJECT_MODEL, task='detect')
-    print("? AI models loaded")
-except Exception as e:
-    print(f"? Model loading failed: {e}")
-    exit(1)
+def init_models():
+    global fire_model, human_model, object_model
+    print("?? Loading AI models...")
+    try:
+        # Imported here so benchmark.py can run stub detectors without ultralytics
+        from ultralytics import YOLO
+        fire_model = YOLO(FIRE_MODEL, task='detect')
+        human_model = YOLO(HUMAN_MODEL, task='detect')
+        object_model = YOLO(OBJECT_MODEL, task='detect')
+        print("? AI models loaded")
+    except Exception as e:
+        print(f"? Model loading failed: {e}")
+        exit(1)
+    init_scheduler()
+
+def init_scheduler():
+    global fire_model, human_model, object_model, preprocessor, fire_detector, scheduler, scene_gate
+    if SHARED_PREPROCESS:
+        preprocessor = FramePreprocessor()
+        fire_model, human_model, object_model = (SharedInputModel(model, preprocessor, MODEL_INPUT_SIZE)
+                                                 for model in (fire_model, human_model, object_model))
+    fire_detector = TiledDetector(fire_model, mode=TILE_MODE, tile=TILE_SIZE, overlap=TILE_OVERLAP,
+                                  candidate_conf=TILE_CANDIDATE_CONF,
+                                  full_altitude=TILE_FULL_ALTITUDE, max_batch=TILE_MAX_BATCH)
+    if SCENE_GATE:
+        scene_gate = SceneGate(sensitivity=SCENE_GATE_SENSITIVITY, max_age=SCENE_GATE_MAX_AGE)
+    scheduler = InferenceScheduler(trigger_conf=SECONDARY_TRIGGER_CONF,
+                                   every_n=SECONDARY_EVERY_N,
+                                   max_age=SECONDARY_MAX_AGE)
+    scheduler.register('human', run_human_model)
+    scheduler.register('object', run_object_model)
+
+def run_human_model(frame):
+    with timings.time('human_model'):
+        return human_model(frame, conf=0.5, verbose=False)
+
+def run_object_model(frame):
+    try:
+        with timings.time('object_model'):
+            return object_model(frame, conf=0.5, verbose=False)
+    except Exception as e:
+        print(f"? Object detection failed: {e}")
+        return []
 
 # ============================================================
-# CSV INITIALIZATION
+# CLOUD UPLOAD SPOOL
 # ============================================================
-os.makedirs(EVIDENCE_DIR, exist_ok=True)
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            'timestamp', 'latitude', 'longitude', 'altitude', 'pm25', 
-            'gas_resistance', 'temperature', 'fire_confidence', 
-            'fire_source', 'severity', 'gps_satellites', 'gps_fix_type', 'evidence_url'
-        ])
+def init_spool(offline=False):
+    """offline: journal incidents but never start the uploader"""
+    global spool
+    ingest = IngestClient.from_address(INGEST_ADDRESS, device_id=DEVICE_ID) if INGEST_ADDRESS else None
+    spool = UploadSpool(SPOOL_DIR, S3_BUCKET, DYNAMODB_TABLE, region=AWS_REGION, ingest=ingest)
+    if not offline:
+        spool.start()
+
+# ============================================================
+# FLIGHT LOG INITIALIZATION
+# ============================================================
+def init_flight_log():
+    """Buffered CSV + Parquet segments; recovers a torn tail and migrates old headers"""
+    global flight_log
+    os.makedirs(EVIDENCE_DIR, exist_ok=True)
+    flight_log = FlightLog(CSV_FILE, segment_dir=FLIGHT_SEGMENT_DIR, fsync=FLIGHT_LOG_FSYNC)
+
+def init_clip_buffer():
+    global clip_buffer
+    if not RECORD_CLIPS:
+        return
+    clip_buffer = PreRollBuffer(CLIP_DIR, pre_roll=CLIP_PRE_ROLL, post_roll=CLIP_POST_ROLL,
+                                fps=CLIP_FPS, width=CLIP_WIDTH, budget_bytes=CLIP_BUFFER_MB * 2**20)
+    print(f"[*] Incident clips: {CLIP_PRE_ROLL:.0f}s + {CLIP_POST_ROLL:.0f}s at {CLIP_FPS:.0f} fps "
+          f"({CLIP_BUFFER_MB} MB buffer)")
 
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
-def read_pms7003():
-    """Read PM2.5 from PMS7003 sensor"""
+def read_pms7003(timestamp=None):
+    """Get PM2.5 from the PMS7003 reader thread (no serial I/O), as of `timestamp` if given"""
     if not pms_sensor:
         return 0
-    try:
-        pms_sensor.flushInput()
-        data = pms_sensor.read(32)
-        if len(data) == 32 and data[0] == 0x42 and data[1] == 0x4d:
-            pm25 = (data[12] << 8) | data[13]
-            return pm25
-    except:
-        pass
+    now = time.time() if timestamp is None else timestamp
+    sample = pms_sensor.sample_at(now)
+    # A stalled stream must not keep feeding its last value into fusion
+    if sample and now - sample.timestamp <= PMS7003_MAX_AGE:
+        return sample.pm2_5
     return 0
 
-def read_bme688():
-    """Read temperature and gas resistance from BME688"""
-    if not bme:
+def read_bme688(timestamp=None):
+    """Get temperature and gas resistance from the BME688 sampler (no I2C), as of `timestamp` if given"""
+    if not bme_sampler:
         return 25.0, 100000
-    try:
-        if bme.get_sensor_data():
-            return bme.data.temperature, bme.data.gas_resistance
-    except:
-        pass
+    now = time.time() if timestamp is None else timestamp
+    sample = bme_sampler.sample_at(now)
+    if sample and now - sample.timestamp <= BME688_MAX_AGE:
+        return sample.temperature, sample.gas_resistance
     return 25.0, 100000
 
-def get_gps():
-    """Get GPS coordinates from Cube Orange"""
+def get_gps(timestamp=None):
+    """Get GPS coordinates from Cube Orange, interpolated to `timestamp` if given"""
     if gps and gps.connected and gps.has_fix():
-        coords = gps.get_coordinates()
+        coords = gps.get_coordinates() if timestamp is None else gps.position_at(timestamp)
         return coords['lat'], coords['lon'], coords['alt']
     return 0.0, 0.0, 0.0
 
-def detect_fire_or_smoke(fire_conf, pm25, temp, gas_res, baseline_temp=BASELINE_TEMPERATURE):
+def get_pose(timestamp):
+    """Position and attitude from Cube Orange at `timestamp` (see position_at), or None without a fix"""
+    if gps and gps.connected and gps.has_fix():
+        return gps.position_at(timestamp)
+    return None
+
+def get_altitude(timestamp=None):
+    """Height above home from Cube Orange at `timestamp`, or None without a fix"""
+    if gps and gps.connected and gps.has_fix():
+        coords = gps.get_coordinates() if timestamp is None else gps.position_at(timestamp)
+        return coords['alt_relative']
+    return None
+
+def save_evidence(frame, t_capture):
     """
-    Determine if it's active fire or smoke based on sensor fusion
-    
-    Returns: 'ACTIVE_FIRE', 'HEAVY_SMOKE', or 'SMOKE_ONLY'
+    Encode the event frame once and write it to EVIDENCE_DIR
+
+    The name carries the capture time and a content hash, so the CSV row,
+    S3 key and DynamoDB item all refer to the same unique file.
     """
-    temp_rise = temp - baseline_temp
-    
-    # Active Fire Detection Criteria
-    if fire_conf > 0.6 and temp_rise > 5.0 and gas_res < 80000:
-        return "ACTIVE_FIRE"
-    elif fire_conf > 0.5 and temp_rise > 3.0:
-        return "ACTIVE_FIRE"
-    # Smoke without visible flames
-    elif fire_conf > 0.3 and pm25 > 50 and temp_rise < 3.0:
-        return "SMOKE_ONLY"
-    # Heavy smoke (might have fire nearby)
-    elif pm25 > 100 and gas_res < 50000:
-        return "HEAVY_SMOKE"
-    else:
-        return "SMOKE_ONLY"
+    if EVIDENCE_MAX_WIDTH and frame.shape[1] > EVIDENCE_MAX_WIDTH:
+        height = round(frame.shape[0] * EVIDENCE_MAX_WIDTH / frame.shape[1])
+        frame = cv2.resize(frame, (EVIDENCE_MAX_WIDTH, height), interpolation=cv2.INTER_AREA)
+    with timings.time('evidence_encode'):
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, EVIDENCE_JPEG_QUALITY])
+    img_bytes = buffer.tobytes()
+    digest = hashlib.sha256(img_bytes).hexdigest()
+    name = f"evid_{datetime.fromtimestamp(t_capture).strftime('%Y%m%d_%H%M%S')}_{digest[:16]}.jpg"
+    path = os.path.join(EVIDENCE_DIR, name)
+
+    with timings.time('evidence_write'):
+        if not os.path.exists(path):  # Same content = same file
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(img_bytes)
+            os.replace(tmp_path, path)
+    return {'name': name, 'path': path, 'bytes': img_bytes, 'sha256': digest}
 
-def classify_fire_source(pm25, gas_res, temp, human_detected, fire_type):
+def upload_to_aws(evidence, detection_data, track_id=None):
     """
-    Classify fire/smoke source based on sensor patterns using BME688 + PMS7003
-    
-    BME688 Gas Resistance Patterns:
-    - Very Low (< 20,000 O): Electrical/Plastic/Chemical fire (toxic gases)
-    - Low (20,000 - 80,000 O): Active combustion with smoke
-    - Medium (80,000 - 150,000 O): Wood/Biomass burning
-    - High (> 150,000 O): Clean air or cooking smoke
-    
-    PMS7003 PM2.5 Patterns:
-    - Low (< 35 µg/m³): Normal air quality
-    - Medium (35-100 µg/m³): Smoke present
-    - High (100-250 µg/m³): Heavy smoke
-    - Very High (> 250 µg/m³): Dense smoke/industrial
+    Queue incident for DynamoDB and evidence for S3.
+    The spool persists it locally; the background uploader syncs it when online.
+    Returns the incident id.
     """
-    
-    # Electrical/Plastic Fire (most dangerous - toxic gases)
-    if gas_res < 20000 and pm25 > 50:
-        if fire_type == "ACTIVE_FIRE":
-            return "Electrical/Plastic Fire (TOXIC)"
-        else:
-            return "Electrical/Plastic Smoke (TOXIC)"
-    
-    # Chemical/Industrial Fire
-    elif gas_res < 30000 and pm25 > 150:
-        if fire_type == "ACTIVE_FIRE":
-            return "Chemical/Industrial Fire"
-        else:
-            return "Industrial Smoke"
-    
-    # Active Wood/Biomass Fire
-    elif pm25 > 100 and gas_res >= 80000 and gas_res < 200000 and temp > 28:
-        if fire_type == "ACTIVE_FIRE":
-            return "Wood/Biomass Fire"
-        else:
-            return "Biomass Smoke"
-    
-    # Vehicle/Tire Fire (rubber burning)
-    elif gas_res < 40000 and pm25 > 80 and pm25 < 200:
-        if fire_type == "ACTIVE_FIRE":
-            return "Vehicle/Rubber Fire"
-        else:
-            return "Rubber Smoke"
-    
-    # Trash/Waste Fire
-    elif pm25 > 120 and gas_res < 100000 and temp > 27:
-        if fire_type == "ACTIVE_FIRE":
-            return "Trash/Waste Fire"
-        else:
-            return "Waste Burning Smoke"
-    
-    # Human-caused fire (cooking, campfire, arson)
-    elif human_detected and pm25 > 50:
-        if fire_type == "ACTIVE_FIRE":
-            if pm25 < 100 and gas_res > 100000:
-                return "Cooking Fire"
-            else:
-                return "Human Activity Fire"
-        else:
-            return "Human-caused Smoke"
-    
-    # Grass/Agricultural Fire
-    elif pm25 > 80 and pm25 < 150 and gas_res > 100000:
-        if fire_type == "ACTIVE_FIRE":
-            return "Grass/Agricultural Fire"
-        else:
-            return "Agricultural Smoke"
-    
-    # Light smoke (possible early stage fire)
-    elif pm25 > 35 and pm25 < 80:
-        if fire_type == "ACTIVE_FIRE":
-            return "Small Fire (Early Stage)"
-        else:
-            return "Light Smoke Source"
-    
-    # Heavy smoke with low visibility
-    elif pm25 > 250:
-        return "Dense Smoke (Fire Nearby)"
-    
-    # Default classification
-    else:
-        if fire_type == "ACTIVE_FIRE":
-            return "Unknown Fire Source"
-        else:
-            return "Unknown Smoke Source"
+    incident_id = str(uuid.uuid4())
+    timestamp = datetime.now().isoformat()
 
-def get_severity(fire_conf, pm25, gas_res, fire_type):
-    """Calculate severity level based on fire type and sensor data"""
-    
-    # CRITICAL: Toxic fires or very high danger
-    if gas_res < 20000 or pm25 > 250:
-        return "CRITICAL"
-    
-    # CRITICAL: Active fire with high confidence and dangerous levels
-    if fire_type == "ACTIVE_FIRE" and fire_conf > 0.75 and pm25 > 150:
-        return "CRITICAL"
-    
-    # HIGH: Active fire with elevated readings
-    if fire_type == "ACTIVE_FIRE" and fire_conf > 0.6 and pm25 > 100:
-        return "HIGH"
-    
-    # HIGH: Heavy smoke that could indicate nearby fire
-    if fire_type == "HEAVY_SMOKE" and pm25 > 150:
-        return "HIGH"
-    
-    # MEDIUM: Moderate fire or significant smoke
-    if fire_type == "ACTIVE_FIRE" and fire_conf > 0.4:
-        return "MEDIUM"
-    
-    # MEDIUM: Significant smoke levels
-    if pm25 > 100:
-        return "MEDIUM"
-    
-    # LOW: Light smoke or small fire
-    return "LOW"
+    # 1. Evidence was encoded once by save_evidence(); S3 uses the same name
+    s3_key = f"incidents/{evidence['name']}"
+
+    evidence_url = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
 
-from botocore.config import Config
+    # 2. DynamoDB item
+    item = {
+        'incident_id': incident_id,
+        'timestamp': timestamp,
+        'latitude': str(detection_data.get('latitude', 0.0)),
+        'longitude': str(detection_data.get('longitude', 0.0)),
+        'altitude': str(detection_data.get('altitude', 0.0)),
+        'pm25': int(detection_data['pm25']),
+        'gas_resistance': int(detection_data['gas_resistance']),
+        'temperature': Decimal(str(round(detection_data['temperature'], 2))),
+        'fire_confidence': Decimal(str(round(detection_data['fire_confidence'], 3))),
+        'fire_source': detection_data['fire_source'],
+        'severity': detection_data['severity'],
+        'gps_satellites': int(detection_data.get('gps_satellites', 0)),
+        'gps_fix_type': int(detection_data.get('gps_fix_type', 0)),
+        'evidence_url': evidence_url,
+        'evidence_sha256': evidence['sha256'],
+        'track_id': track_id,
+        'peak_fire_confidence': Decimal(str(round(detection_data['fire_confidence'], 3))),
+        'peak_pm25': int(detection_data['pm25']),
+        'detections': 1,
+        'status': 'NEW',
+        'device_id': DEVICE_ID
+    }
+    if detection_data.get('ground'):
+        item.update(ground_fields(detection_data['ground']))
 
-def upload_to_aws(frame, detection_data):
+    # 3. Hand over to the spool (never blocks on the network)
+    spool.enqueue(item, blob=evidence['bytes'], s3_key=s3_key, blob_path=evidence['path'])
+    print(f"?? AWS: Queued for sync ({incident_id[:8]}, backlog {spool.get_backlog()})")
+    return incident_id
+
+def attach_clip(incident_ids, clip_path):
+    """Queue a finished incident clip for S3 and link it from the DynamoDB item(s)"""
+    s3_key = f"incidents/{os.path.basename(clip_path)}"
+    clip_url = f"https://{S3_BUCKET}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+    for i, incident_id in enumerate(incident_ids):
+        # Upload the clip once; the other incidents of the frame just link to it
+        spool.update(incident_id, {'clip_url': clip_url}, content_type='video/x-msvideo',
+                     s3_key=s3_key if i == 0 else None, blob_path=clip_path if i == 0 else None)
+
+def ground_fields(ground):
+    """DynamoDB attributes for a fire position estimate (strings, like latitude/longitude)"""
+    lat, lon, error = ground
+    return {'fire_latitude': f"{lat:.7f}", 'fire_longitude': f"{lon:.7f}",
+            'fire_position_error_m': Decimal(str(round(error, 1)))}
+
+def update_incident(incident_id, event, hotspot=None):
     """
-    Upload incident to DynamoDB and evidence to S3.
-    Designed for UAV flight: skips quickly if offline to prevent script freezing.
+    Queue the new peak confidence/PM2.5 of a tracked fire for its DynamoDB item
+
+    hotspot: the fire's entry in the hotspot index, whose peaks and track
+    count cover every track merged into this incident
     """
-    try:
-        # 1. Define timeout configuration (Fast fail if no network)
-        fast_config = Config(
-            connect_timeout=1, 
-            read_timeout=1, 
-            retries={'max_attempts': 0}
-        )
-        
-        # Re-initialize clients with fast timeout (or use global ones)
-        s3_fast = boto3.client('s3', region_name='ap-south-1', config=fast_config)
-        db_fast = boto3.resource('dynamodb', region_name='ap-south-1', config=fast_config)
-        table_fast = db_fast.Table('GaganNetraIncidents')
-
-        incident_id = str(uuid.uuid4())
-        timestamp = datetime.now().isoformat()
-        
-        # 2. Prepare Evidence Image filename
-        # Note: The physical file is already saved in log_burn_event() 
-        # but we need the filename for S3
-        evidence_filename = f"evidence_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-        s3_key = f"incidents/{evidence_filename}"
-        
-        # Encode frame to memory buffer for upload
-        _, buffer = cv2.imencode('.jpg', frame)
-        img_bytes = buffer.tobytes()
-        
-        # 3. Upload to S3
-        s3_fast.put_object(
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            Body=img_bytes,
-            ACL='public-read',
-            ContentType='image/jpeg'
-        )
-        
-        evidence_url = f"https://{S3_BUCKET}.s3.ap-south-1.amazonaws.com/{s3_key}"
-        
-        # 4. Upload to DynamoDB
-        item = {
-            'incident_id': incident_id,
-            'timestamp': timestamp,
-            'latitude': str(detection_data.get('latitude', 0.0)),
-            'longitude': str(detection_data.get('longitude', 0.0)),
-            'altitude': str(detection_data.get('altitude', 0.0)),
-            'pm25': int(detection_data['pm25']),
-            'gas_resistance': int(detection_data['gas_resistance']),
-            'temperature': Decimal(str(round(detection_data['temperature'], 2))),
-            'fire_confidence': Decimal(str(round(detection_data['fire_confidence'], 3))),
-            'fire_source': detection_data['fire_source'],
-            'severity': detection_data['severity'],
-            'gps_satellites': int(detection_data.get('gps_satellites', 0)),
-            'gps_fix_type': int(detection_data.get('gps_fix_type', 0)),
-            'evidence_url': evidence_url,
-            'status': 'NEW',
-            'device_id': 'GAGAN_NETRA_01'
-        }
-        
-        table_fast.put_item(Item=item)
-        print(f"?? AWS: Sync Successful ({incident_id[:8]})")
-        return True
-        
-    except Exception:
-        # This block catches connection timeouts and No-Network errors
-        # It allows the Jetson to keep flying and detecting without lag
-        print("?? AWS: Offline Mode (Skipping cloud upload, saving locally only)")
-        return False
-        
-def log_burn_event(frame, fire_conf, pm25, gas_res, temp, human_detected):
-    """Log fire/smoke detection event to CSV and AWS with unified naming schema"""
-    timestamp_obj = datetime.now()
+    peak_conf = hotspot.peak_conf if hotspot else event['peak_conf']
+    peak_pm25 = hotspot.peak_pm25 if hotspot else event['peak_pm25']
+    fields = {
+        'peak_fire_confidence': Decimal(str(round(peak_conf, 3))),
+        'peak_pm25': int(peak_pm25),
+    }
+    if hotspot:
+        fields['detections'] = hotspot.count
+    # The position is refined by the track the incident was logged for, not merged ones
+    if event.get('ground') and (hotspot is None or hotspot.incident_id == event['track_id']):
+        fields.update(ground_fields(event['ground']))
+    spool.update(incident_id, fields)
+    incident_updates.inc()
+    print(f"?? Incident {incident_id[:8]} (track {event['track_id']}) updated: "
+          f"peak conf {peak_conf:.2f}, peak PM2.5 {peak_pm25}")
+
+def log_burn_event(evidence, fire_conf, pm25, gas_res, temp, human_detected, t_capture=None,
+                   track_id=None, ground=None, clip_path=''):
+    """
+    Log fire/smoke detection event to CSV and AWS with unified naming schema. Returns the incident id
+
+    ground: (lat, lon, error_m) of the fire itself, next to the UAV position
+    clip_path: the incident clip, if the clip buffer accepted one
+    """
+    # Stamp the event with the frame's capture time, not the time it reached the logger
+    t_capture = time.time() if t_capture is None else t_capture
+    timestamp_obj = datetime.fromtimestamp(t_capture)
     timestamp_str = timestamp_obj.strftime("%Y-%m-%d %H:%M:%S")
-    lat, lon, alt = get_gps()
+    lat, lon, alt = get_gps(t_capture)
     
     # 1. Get GPS status
     gps_sats = 0
@@ -376,10 +609,9 @@ def log_burn_event(frame, fire_conf, pm25, gas_res, temp, human_detected):
         gps_sats = coords.get('satellites', 0)
         gps_fix = coords.get('fix_type', 0)
     
-    # 2. Save Image Locally for CSV Reference
-    img_name = f"evid_{timestamp_obj.strftime('%Y%m%d_%H%M%S')}.jpg"
-    local_img_path = os.path.join(EVIDENCE_DIR, img_name)
-    cv2.imwrite(local_img_path, frame)
+    # 2. Evidence image was already saved by the evidence stage; the clip
+    #    is written once its post-roll has been captured
+    local_img_path = evidence['path']
     
     # 3. Logic for Classification and Severity
     fire_type = detect_fire_or_smoke(fire_conf, pm25, temp, gas_res)
@@ -387,16 +619,16 @@ def log_burn_event(frame, fire_conf, pm25, gas_res, temp, human_detected):
     severity = get_severity(fire_conf, pm25, gas_res, fire_type)
     full_source_desc = f"{fire_type}: {fire_source_val}"
     
-    # 4. LOG TO CSV (Sync with your Dashboard)
-    with open(CSV_FILE, 'a', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow([
+    # 4. LOG TO CSV (buffered; flushed by the flight log's own thread)
+    with timings.time('csv_append'):
+        flight_log.append([
             timestamp_str, lat, lon, alt, pm25, gas_res, temp, 
-            fire_conf, full_source_desc, severity, gps_sats, gps_fix, local_img_path
+            fire_conf, full_source_desc, severity, gps_sats, gps_fix, local_img_path, clip_path,
+            *(ground if ground else ('', '', '')), bool(human_detected)
         ])
     
     # 5. UPLOAD TO AWS (Sync with Cloud)
-    upload_to_aws(frame, {
+    incident_id = upload_to_aws(evidence, {
         'latitude': lat,
         'longitude': lon,
         'altitude': alt,
@@ -407,197 +639,527 @@ def log_burn_event(frame, fire_conf, pm25, gas_res, temp, human_detected):
         'fire_source': full_source_desc,
         'severity': severity,
         'gps_satellites': gps_sats,
-        'gps_fix_type': gps_fix
-    })
+        'gps_fix_type': gps_fix,
+        'ground': ground
+    }, track_id=track_id)
     
-    print(f"?? Event Logged: {full_source_desc} | Severity: {severity}")
+    print(f"?? Event Logged: {full_source_desc} | Severity: {severity} | Track {track_id}")
     
     gps_status = f"GPS Fix:{gps_fix} Sats:{gps_sats}" if gps and gps.connected else "GPS:N/A"
     print(f"?? {fire_type} | {severity} | PM2.5:{pm25} | GasRes:{gas_res} | Temp:{temp:.1f}°C")
     print(f"   Location: ({lat:.7f}, {lon:.7f}, {alt:.1f}m) | {gps_status}")
-    print(f"   Classification: {fire_source}")
+    if ground:
+        print(f"   Fire at: ({ground[0]:.7f}, {ground[1]:.7f}) +/- {ground[2]:.0f}m")
+    print(f"   Classification: {fire_source_val}")
+    return incident_id
 
 # ============================================================
 # VIDEO CAPTURE
 # ============================================================
-print(f"?? Opening {VIDEO_DEVICE} (attempt 1)...")
-cap = cv2.VideoCapture(VIDEO_DEVICE, cv2.CAP_V4L2)
-
-if not cap.isOpened():
-    print(f"?? Opening {VIDEO_DEVICE} (attempt 2)...")
-    time.sleep(3)
-    cap = cv2.VideoCapture(VIDEO_DEVICE)
-
-if not cap.isOpened():
-    print(f"?? Opening {VIDEO_DEVICE} (attempt 3)...")
-    time.sleep(3)
-    cap = cv2.VideoCapture(VIDEO_DEVICE)
-
-if not cap.isOpened():
-    print("? No camera!")
-    exit(1)
-
-# Set buffer size to minimize latency
-cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-print("? Camera ready\\\\\\\\n")
-
-if RECORD_VIDEO and cap.isOpened():
-    fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    video_filename = os.path.join(VIDEO_SAVE_PATH, f"flight_{timestamp}.avi")
-    
-    # Get camera resolution
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = 5.0  # Common for Jetson; adjust if the video plays too fast/slow..
-    
-    video_writer = cv2.VideoWriter(video_filename, fourcc, fps, (width, height))
-    print(f"[*] Recording initialized: {video_filename}")
+def init_camera():
+    """The capture thread keeps reconnecting on its own; we only wait for the first frame"""
+    global cap
+    print(f"?? Opening {VIDEO_DEVICE}...")
+    cap = ThreadedCamera(VIDEO_DEVICE, buffer_size=1)
+
+def init_video_recorder():
+    """Segments open on the first frame, at the measured capture rate"""
+    global video_recorder
+    if not RECORD_VIDEO:
+        return
+    if VIDEO_DROP_POLICY not in DROP_POLICIES:
+        raise ValueError(f"VIDEO_DROP_POLICY must be one of {DROP_POLICIES}")
+    video_recorder = VideoRecorder(VIDEO_SAVE_PATH, fps=VIDEO_FPS,
+                                   segment_seconds=VIDEO_SEGMENT_SECONDS,
+                                   segment_bytes=VIDEO_SEGMENT_MB * 2**20)
+    print(f"[*] Recording initialized: {VIDEO_SAVE_PATH} ({VIDEO_DROP_POLICY} when behind)")
+
 # ============================================================
-# MAIN DETECTION LOOP
+# PIPELINE STAGES
 # ============================================================
-last_log_time = 0
-frame_count = 0
+# capture -> sensors -> inference -> annotate -> display / record / log
+# Frame rate is set by the slowest stage; queues between stages keep only
+# the newest frame so no stage ever works on stale data.
+def capture_stage():
+    """Wait for the next new frame from the capture thread (never a duplicate)"""
+    seq, t_capture, frame = cap.read_new(timeout=1.0)
+    if frame is None:
+        if getattr(cap, 'finished', False):
+            time.sleep(0.1)  # Replay source exhausted
+        else:
+            print("?? Frame read failed")
+        return None
+    return {'frame_id': seq, 'frame': frame, 't_capture': t_capture,
+            't_wall': time.perf_counter()}
 
-print("?? Starting intelligent detection...")
-print("-" * 60)
+def preroll_stage(packet):
+    """Keep a compressed copy of recent frames for incident clips"""
+    clip_buffer.add(packet['frame'], packet['t_capture'])
+    return None
 
-try:
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("?? Frame read failed")
-            time.sleep(0.1)
+def sensor_stage(packet):
+    """Attach the current sensor readings to the frame"""
+    packet['pm25'] = read_pms7003(packet['t_capture'])
+    packet['temp'], packet['gas_res'] = read_bme688(packet['t_capture'])
+    packet['pose'] = get_pose(packet['t_capture'])
+    return packet
+
+def inference_stage(packet):
+    """Run the fire detector, and the secondary detectors when scheduled"""
+    global last_fire_results
+    frame = packet['frame']
+    # Static scene: keep the previous detections (they only keep their tracks alive below)
+    fresh = scene_gate.should_run(frame, packet['t_capture']) if scene_gate else True
+    if fresh:
+        if preprocessor:
+            # Prepared once here; the fire, human and object calls below reuse it
+            with timings.time('preprocess'):
+                preprocessor.prepare(frame, MODEL_INPUT_SIZE)
+        with timings.time('fire_model'):
+            fire_results = fire_detector(frame, conf=FIRE_CONFIDENCE_THRESHOLD, verbose=False,
+                                         altitude=get_altitude(packet['t_capture']))
+        last_fire_results = fire_results
+    else:
+        fire_results = last_fire_results
+
+    # Check for fire detection (boxes copied off the GPU for the tracker)
+    fire_boxes, fire_confs, _ = result_arrays(fire_results)
+    max_fire_conf = float(fire_confs.max()) if len(fire_confs) else 0.0
+    fire_detected = max_fire_conf > 0.5
+
+    # Stable IDs per fire, so each one is logged once (see annotate_stage)
+    packet['fire_tracks'] = fire_tracker.update(fire_boxes, fire_confs, packet['t_capture'],
+                                                packet['pm25'], reused=not fresh)
+    # Reused detections would only repeat the last estimate
+    if fresh and packet['fire_tracks'] and packet['pose']:
+        with timings.time('georeference'):
+            georeference_tracks(packet['fire_tracks'], frame.shape, packet['pose'])
+
+    # Secondary detectors reuse their cached result unless due
+    human_results, _ = scheduler.run('human', frame, packet['frame_id'], max_fire_conf,
+                                     now=packet['t_capture'], reuse=not fresh)
+    object_results, _ = scheduler.run('object', frame, packet['frame_id'], max_fire_conf,
+                                      now=packet['t_capture'], reuse=not fresh)
+
+    packet['fire_results'] = fire_results
+    packet['inference_fresh'] = fresh
+    packet['human_results'] = human_results
+    packet['object_results'] = object_results
+    packet['fire_detected'] = fire_detected
+    packet['max_fire_conf'] = max_fire_conf
+    packet['human_detected'] = len(human_results[0].boxes) > 0 if human_results else False
+    packet['object_detected'] = len(object_results[0].boxes) > 0 if object_results else False
+    return packet
+
+def georeference_tracks(tracks, frame_shape, pose):
+    """Project this frame's fire boxes onto the ground and fold them into each track's estimate"""
+    lat, lon, error = projector.project(np.stack([track.box for track in tracks]),
+                                        (frame_shape[1], frame_shape[0]), pose)
+    for i, track in enumerate(tracks):
+        track.ground = fuse(track.ground, lat[i], lon[i], error[i], floor=GEO_GPS_ERROR)
+
+def annotate_stage(packet):
+    """Draw detections and sensor overlay, and hand fire events to the logger"""
+    pm25, temp, gas_res = packet['pm25'], packet['temp'], packet['gas_res']
+    t0 = time.perf_counter()
+    annotated_frame = packet['frame'].copy()
+
+    # Draw fire detections (red boxes, with their track ID)
+    for track in packet['fire_tracks']:
+        x1, y1, x2, y2 = map(int, track.box)
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
+        cv2.putText(annotated_frame, f"FIRE #{track.track_id} {track.conf:.2f}", (x1, y1-10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+    # Draw human detections (green boxes)
+    for result in packet['human_results']:
+        if result.boxes:
+            for box in result.boxes:
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
+                cv2.putText(annotated_frame, "HUMAN", (x1, y1-10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+
+    # Draw object detections (blue boxes)
+    for result in packet['object_results']:
+        if result.boxes:
+            for box in result.boxes:
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (255, 0, 0), 3)
+                cv2.putText(annotated_frame, "OBJECT", (x1, y1-10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
+
+    t1 = time.perf_counter()
+    timings.record('draw_boxes', t1 - t0)
+
+    # Add sensor data overlay (top of screen)
+    gps_text = ""
+    if gps and gps.connected:
+        coords = gps.position_at(packet['t_capture'])
+        if gps.has_fix():
+            gps_text = f" | GPS: {coords['lat']:.5f},{coords['lon']:.5f} {coords['alt']:.0f}m"
+        else:
+            gps_text = f" | GPS: Searching ({coords['satellites']} sats)"
+
+    overlay_text = f"PM2.5: {pm25} | Temp: {temp:.1f}C | Gas: {gas_res:.0f}{gps_text}"
+    cv2.rectangle(annotated_frame, (0, 0), (1200, 50), (0, 0, 0), -1)
+    cv2.putText(annotated_frame, overlay_text, (10, 35),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+
+    # Add alert if fire detected and PM2.5 elevated
+    if packet['fire_detected'] and pm25 > FIRE_PM25_THRESHOLD:
+        # Quick classification for display
+        fire_type = detect_fire_or_smoke(packet['max_fire_conf'], pm25, temp, gas_res)
+        severity = get_severity(packet['max_fire_conf'], pm25, gas_res, fire_type)
+        alert_text = f"ALERT: {severity} {fire_type} DETECTED!"
+        cv2.rectangle(annotated_frame, (0, 60), (900, 120), (0, 0, 255), -1)
+        cv2.putText(annotated_frame, alert_text, (10, 100),
+                   cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
+        queue_track_events(packet)
+    timings.record('overlay', time.perf_counter() - t1)
+
+    # Display stats every 30 frames
+    if packet['frame_id'] % 30 == 0:
+        print(f"Frame:{packet['frame_id']} | PM2.5:{pm25} | Temp:{temp:.1f}°C | Gas:{gas_res:.0f}")
+
+    packet['annotated_frame'] = annotated_frame
+    timings.record('end_to_end', time.perf_counter() - packet['t_wall'])
+    return packet
+
+def queue_track_events(packet):
+    """
+    Hand confirmed fire tracks to the logger: a new incident the first time,
+    then an update when its peak confidence/PM2.5 has risen (at most every
+    TRACK_UPDATE_INTERVAL). Runs on the annotate thread, which owns reported_*.
+    """
+    now = packet['t_capture']
+    events = []
+    for track in packet['fire_tracks']:
+        if not track.confirmed:
             continue
-        
-        frame_count += 1
-        
-        # Read sensors
-        pm25 = read_pms7003()
-        temp, gas_res = read_bme688()
-        
-        # Run AI detection
-        fire_results = fire_model(frame, conf=FIRE_CONFIDENCE_THRESHOLD, verbose=False)
-        human_results = human_model(frame, conf=0.5, verbose=False)
-        try:
-            object_results = object_model(frame, conf=0.5, verbose=False)
-        except Exception as e:
-            print(f"? Object detection failed: {e}")
-            object_results = []
-
-        # Check for fire detection
-        fire_detected = False
-        max_fire_conf = 0.0
-        
-        for result in fire_results:
-            if result.boxes:
-                for box in result.boxes:
-                    conf = float(box.conf[0])
-                    if conf > max_fire_conf:
-                        max_fire_conf = conf
-                    if conf > 0.5:
-                        fire_detected = True
-        
-        # Check for human detection
-        human_detected = len(human_results[0].boxes) > 0 if human_results else False
-        
-        # Check for object detection
-        object_detected = len(object_results[0].boxes) > 0 if object_results else False
-        
-        # Create annotated frame for display
-        annotated_frame = frame.copy()
-        
-        # Draw fire detections (red boxes)
-        for result in fire_results:
-            if result.boxes:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    conf = float(box.conf[0])
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                    cv2.putText(annotated_frame, f"FIRE {conf:.2f}", (x1, y1-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-        
-        # Draw human detections (green boxes)
-        for result in human_results:
-            if result.boxes:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
-                    cv2.putText(annotated_frame, "HUMAN", (x1, y1-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-        
-        # Draw object detections (blue boxes)
-        for result in object_results:
-            if result.boxes:
-                for box in result.boxes:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (255, 0, 0), 3)
-                    cv2.putText(annotated_frame, "OBJECT", (x1, y1-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 0, 0), 2)
-        
-        # Add sensor data overlay (top of screen) - UPDATE THIS SECTION
-        gps_text = ""
-        if gps and gps.connected:
-            coords = gps.get_coordinates()
-            if gps.has_fix():
-                gps_text = f" | GPS: {coords['lat']:.5f},{coords['lon']:.5f} {coords['alt']:.0f}m"
+        if track.reported_at is None:
+            kind = 'new'
+        elif (now - track.reported_at >= TRACK_UPDATE_INTERVAL
+              and (track.peak_conf > track.reported_conf or track.peak_pm25 > track.reported_pm25)):
+            kind = 'update'
+        else:
+            continue
+        events.append((track, {'kind': kind, 'track_id': track.track_id, 'ground': track.ground,
+                               'peak_conf': track.peak_conf, 'peak_pm25': track.peak_pm25}))
+    if not events:
+        return
+    packet['track_events'] = [event for _, event in events]
+    if event_queue.put(packet):  # Rejected when the logger is backed up: retried next frame
+        for track, event in events:
+            track.reported_at = now
+            track.reported_conf, track.reported_pm25 = event['peak_conf'], event['peak_pm25']
+
+def record_stage(packet):
+    """Append the annotated frame to the flight recording, placed by capture time"""
+    with timings.time('video_write'):
+        video_recorder.write(packet['annotated_frame'], packet['t_capture'], packet['t_wall'])
+    return packet
+
+def evidence_stage(packet):
+    """Encode and save the event frame for new incidents (off the log thread)"""
+    if any(event['kind'] == 'new' for event in packet['track_events']):
+        packet['evidence'] = save_evidence(packet['frame'], packet['t_capture'])
+    return packet
+
+def log_stage(packet):
+    """Log new fire tracks to CSV/AWS (or merge them into a fire logged nearby), and update known ones"""
+    incident_ids = []
+    clip_path = None  # Triggered with the frame's first new incident; '' if the buffer refused it
+    logged = threading.Event()
+
+    def on_clip_done(path):
+        # The clip can be written before the rest of the frame's incidents are logged
+        logged.wait()
+        attach_clip(incident_ids, path)
+
+    try:
+        for event in packet['track_events']:
+            track_id = event['track_id']
+            if event['kind'] == 'new':
+                # Where the fire is if it could be projected, else where the UAV was
+                lat, lon = event['ground'][:2] if event['ground'] else get_gps(packet['t_capture'])[:2]
+                hotspot = hotspots.add(track_id, lat, lon, packet['t_capture'],
+                                       conf=event['peak_conf'], pm25=event['peak_pm25'])
+                if hotspot is not None and hotspot.incident_id in track_incidents:
+                    # A fire already logged here (e.g. reacquired while circling it)
+                    incident_id = track_incidents[track_id] = track_incidents[hotspot.incident_id]
+                    print(f"?? Track {track_id} merged into incident {incident_id[:8]} "
+                          f"({hotspot.count} tracks within {HOTSPOT_RADIUS_M:.0f} m)")
+                    update_incident(incident_id, event, hotspot)
+                    incidents_merged.inc()
+                    continue
+                if clip_path is None and clip_buffer:
+                    clip_path = clip_buffer.trigger(packet['evidence']['name'], packet['t_capture'],
+                                                    on_done=on_clip_done) or ''
+                incident_id = log_burn_event(packet['evidence'], event['peak_conf'], packet['pm25'],
+                                             packet['gas_res'], packet['temp'], packet['human_detected'],
+                                             packet['t_capture'], track_id=track_id, ground=event['ground'],
+                                             clip_path=clip_path or '')
+                track_incidents[track_id] = incident_id
+                incident_ids.append(incident_id)
+                events_logged.inc()
+            elif track_id in track_incidents:
+                hotspot = hotspots.get(track_id)
+                if hotspot:
+                    hotspot.absorb(None, event['peak_conf'], event['peak_pm25'])
+                update_incident(track_incidents[track_id], event, hotspot)
+    finally:
+        logged.set()
+    return packet
+
+def init_projector():
+    global projector
+    width, height = CAMERA_CALIBRATION_SIZE
+    fx, fy, cx, cy = CAMERA_INTRINSICS or (None, None, None, None)
+    camera = CameraModel(width, height, hfov=CAMERA_HFOV, fx=fx, fy=fy, cx=cx, cy=cy, tilt=CAMERA_TILT)
+    projector = GroundProjector(camera, gps_error=GEO_GPS_ERROR, altitude_error=GEO_ALTITUDE_ERROR,
+                                attitude_error=GEO_ATTITUDE_ERROR, max_off_nadir=GEO_MAX_OFF_NADIR)
+
+def build_pipeline(block=False):
+    """block: never drop frames between stages (as-fast-as-possible replay)"""
+    global pipeline, display_queue, event_queue, fire_tracker, hotspots
+    pipeline = Pipeline()
+    hotspots = HotspotIndex(radius_m=HOTSPOT_RADIUS_M, window=HOTSPOT_WINDOW)
+    init_projector()
+    fire_tracker = FireTracker(iou_threshold=TRACK_IOU_THRESHOLD, confirm_hits=TRACK_CONFIRM_HITS,
+                               max_age=TRACK_MAX_AGE)
+    track_incidents.clear()
+    sensor_queue = pipeline.add_queue('sensors', block=block)
+    inference_queue = pipeline.add_queue('inference', block=block)
+    annotate_queue = pipeline.add_queue('annotate', block=block)
+    display_queue = pipeline.add_queue('display', block=block)
+    record_queue = pipeline.add_queue('record', maxsize=VIDEO_QUEUE_SIZE,
+                                      drop_oldest=VIDEO_DROP_POLICY != 'drop_newest',
+                                      block=block or VIDEO_DROP_POLICY == 'block')
+    # Fire events must not be overwritten by later frames while AWS is slow
+    event_queue = pipeline.add_queue('events', maxsize=4, drop_oldest=False, block=block)
+    log_queue = pipeline.add_queue('log', maxsize=4, drop_oldest=False, block=block)
+
+    annotate_outputs = []
+    if not HEADLESS_MODE:
+        annotate_outputs.append(display_queue)
+    if RECORD_VIDEO and video_recorder is not None:
+        annotate_outputs.append(record_queue)
+
+    capture_outputs = [sensor_queue]
+    if clip_buffer:
+        # Never blocks capture: a slow pre-roll encoder just keeps fewer frames
+        preroll_queue = pipeline.add_queue('preroll', maxsize=2)
+        capture_outputs.append(preroll_queue)
+    pipeline.add_stage('capture', capture_stage, outputs=capture_outputs)
+    if clip_buffer:
+        pipeline.add_stage('preroll', preroll_stage, inbox=preroll_queue)
+    pipeline.add_stage('sensors', sensor_stage, inbox=sensor_queue, outputs=[inference_queue])
+    pipeline.add_stage('inference', inference_stage, inbox=inference_queue, outputs=[annotate_queue])
+    pipeline.add_stage('annotate', annotate_stage, inbox=annotate_queue, outputs=annotate_outputs)
+    if RECORD_VIDEO and video_recorder is not None:
+        pipeline.add_stage('record', record_stage, inbox=record_queue)
+    pipeline.add_stage('evidence', evidence_stage, inbox=event_queue, outputs=[log_queue])
+    pipeline.add_stage('log', log_stage, inbox=log_queue)
+
+    for stage in pipeline.stages:
+        stage.observer = stage_latency.labels(stage.name).observe
+
+def get_run_report(elapsed):
+    """End-to-end throughput/latency summary of this run"""
+    steps = timings.get_stats()
+    end_to_end = steps.get('end_to_end', {})
+    # Frames through the annotate stage = frames fully processed
+    frames = next(stage.processed for stage in pipeline.stages if stage.name == 'annotate')
+    return {
+        'frames': frames,
+        'elapsed_s': elapsed,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+        'latency_ms': {
+            'p50': end_to_end.get('p50_ms', 0.0),
+            'p95': end_to_end.get('p95_ms', 0.0),
+            'p99': end_to_end.get('p99_ms', 0.0),
+        },
+        'steps': steps,
+        'pipeline': pipeline.get_stats(),
+        'scheduler': scheduler.get_stats(),
+        'scene_gate': scene_gate.get_stats() if scene_gate else None,
+        'tiling': fire_detector.get_stats(),
+        'preprocess': preprocessor.get_stats() if preprocessor else None,
+    }
+
+# ============================================================
+# MAIN LOOP (display + supervision)
+# ============================================================
+def run(replay=False):
+    """Run until 'q', Ctrl+C, or the end of a replay. Returns the elapsed time"""
+    print("?? Starting intelligent detection...")
+    print("-" * 60)
+
+    pipeline.start()
+    started = time.time()
+    last_stats_time = time.time()
+    try:
+        while True:
+            # HighGUI must run on the main thread, so display is not a worker stage
+            if not HEADLESS_MODE:
+                packet = display_queue.get(timeout=0.1)
+                if packet is not None:
+                    cv2.imshow('GAGAN NETRA - Live Detection Feed', packet['annotated_frame'])
+                    display_queue.task_done()
+
+                # Press 'q' to quit
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    print("\\\\\\\\n?? User requested exit...")
+                    break
             else:
-                gps_text = f" | GPS: Searching ({coords['satellites']} sats)"
-        
-        overlay_text = f"PM2.5: {pm25} | Temp: {temp:.1f}C | Gas: {gas_res:.0f}{gps_text}"
-        cv2.rectangle(annotated_frame, (0, 0), (1200, 50), (0, 0, 0), -1)
-        cv2.putText(annotated_frame, overlay_text, (10, 35),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        
-        # Add alert if fire detected
-        if fire_detected and pm25 > FIRE_PM25_THRESHOLD:
-            # Quick classification for display
-            fire_type = detect_fire_or_smoke(max_fire_conf, pm25, temp, gas_res)
-            severity = get_severity(max_fire_conf, pm25, gas_res, fire_type)
-            alert_text = f"ALERT: {severity} {fire_type} DETECTED!"
-            cv2.rectangle(annotated_frame, (0, 60), (900, 120), (0, 0, 255), -1)
-            cv2.putText(annotated_frame, alert_text, (10, 100),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
-        
-        # Display frame (only if not in headless mode)
-        if not HEADLESS_MODE:
-            cv2.imshow('GAGAN NETRA - Live Detection Feed', annotated_frame)
-            
-            # Press 'q' to quit
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                print("\\\\\\\\n?? User requested exit...")
+                time.sleep(0.1 if replay else 0.5)
+
+            if replay and cap.finished and pipeline.is_idle():
+                print("[REPLAY] End of recording")
                 break
-        else:
-            time.sleep(0.033)  # ~30 FPS
-        
-        # Log event if fire detected and PM2.5 elevated
-        current_time = time.time()
-        if fire_detected and pm25 > FIRE_PM25_THRESHOLD:
-            if current_time - last_log_time > COOLDOWN:
-                log_burn_event(frame, max_fire_conf, pm25, gas_res, temp, human_detected)
-                last_log_time = current_time
-        
-        # Display stats every 30 frames
-        if frame_count % 30 == 0:
-            print(f"Frame:{frame_count} | PM2.5:{pm25} | Temp:{temp:.1f}°C | Gas:{gas_res:.0f}")
-            
-        if RECORD_VIDEO and 'video_writer' in locals():
-            video_writer.write(annotated_frame)
-        
-        time.sleep(0.033)  # ~30 FPS
-
-except KeyboardInterrupt:
-    print("\\\\\\\\n\\\\\\\\n??  Shutting down...")
-
-finally:
-    cap.release()
-    if RECORD_VIDEO and 'video_writer' in locals():
-        video_writer.release()
-        print(f"[*] Video file saved: {video_filename}")
-    cv2.destroyAllWindows()
+
+            if time.time() - last_stats_time > STATS_INTERVAL:
+                print(f"[PIPELINE] {pipeline.get_stats_string()}")
+                cam = cap.get_stats()
+                print(f"[CAMERA] frames {cam['frames']} | dropped {cam['dropped']} | "
+                      f"duplicates {cam['duplicates']} | reconnects {cam['reconnects']}")
+                print(f"[SCHEDULER] {scheduler.get_stats_string()}")
+                if scene_gate:
+                    gate = scene_gate.get_stats()
+                    print(f"[SCENE] skipped {gate['skipped']}/{gate['checked']} frames | "
+                          f"changed {gate['changed']} | forced {gate['forced']}")
+                if fire_detector.mode != 'off':
+                    tiles = fire_detector.get_stats()
+                    print(f"[TILES] {tiles['mode']} | {tiles['crops']} crops over {tiles['frames']} frames | "
+                          f"{tiles['full_frames']} fully tiled")
+                print(f"[SPOOL] backlog {spool.get_backlog()} | uploaded {spool.uploaded} | "
+                      f"failed {spool.failed} | {'online' if spool.online else 'offline'}")
+                last_stats_time = time.time()
+
+    except KeyboardInterrupt:
+        print("\\\\\\\\n\\\\\\\\n??  Shutting down...")
+
+    return time.time() - started
+
+def shutdown():
+    if pipeline:
+        # Capture stops first; events already queued still reach the CSV and spool
+        if not pipeline.stop():
+            print("[PIPELINE] ? Shutdown timed out with items still queued")
+    if metrics_snapshot:
+        metrics_snapshot.close()  # Final snapshot after the pipeline has drained
+    if metrics_server:
+        metrics_server.close()
+    if clip_buffer:
+        clip_buffer.close()  # Before the spool: finished clips are queued for upload
+    if spool:
+        spool.stop()
+    if flight_log:
+        flight_log.close()
+    if cap:
+        cap.release()
+    if video_recorder:
+        video_recorder.close()
+    if not HEADLESS_MODE:
+        cv2.destroyAllWindows()
     if pms_sensor:
         pms_sensor.close()
+    if bme_sampler:
+        bme_sampler.close()
     if gps:  # NEW
         gps.close()
     print("? Cleanup complete")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="GAGAN NETRA fire/smoke detection")
+    parser.add_argument('--headless', action='store_true', help="No display window")
+    parser.add_argument('--offline', action='store_true', help="Journal incidents but do not upload")
+    parser.add_argument('--device-id', default=DEVICE_ID)
+    parser.add_argument('--ingest', default=INGEST_ADDRESS, metavar='HOST:PORT',
+                        help="Upload through the ground ingestion service instead of AWS")
+    parser.add_argument('--fire-model', default=FIRE_MODEL)
+    parser.add_argument('--human-model', default=HUMAN_MODEL)
+    parser.add_argument('--object-model', default=OBJECT_MODEL)
+    parser.add_argument('--tile-mode', choices=TILE_MODES, default=TILE_MODE,
+                        help="Tiled fire detection for small fires at altitude")
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help="Prometheus /metrics port (0 = off)")
+    parser.add_argument('--metrics-snapshot', default=METRICS_SNAPSHOT,
+                        help="JSON metrics snapshot file ('' = off)")
+
+    replay = parser.add_argument_group('replay (no camera/sensors/GPS needed)')
+    replay.add_argument('--replay-video', help="Video file or image directory")
+    replay.add_argument('--replay-fps', type=float, help="Frame rate of the recording (default: from file, or 10)")
+    replay.add_argument('--replay-sensors', help="Sensor trace CSV/JSONL (timestamp, pm25, temperature, gas_resistance, ...)")
+    replay.add_argument('--replay-gps', help="GPS track CSV or MAVLink .tlog")
+    replay.add_argument('--replay-speed', type=float, default=1.0,
+                        help="1.0 = real time, 0 = as fast as possible")
+    replay.add_argument('--replay-start', type=float, help="Epoch time of the first frame")
+    replay.add_argument('--output-dir', default="replay_output",
+                        help="Where replay runs write CSV, evidence, spool and video")
+    replay.add_argument('--report', help="Write a JSON throughput/latency report here")
+    return parser.parse_args()
+
+def main():
+    global HEADLESS_MODE, FIRE_MODEL, HUMAN_MODEL, OBJECT_MODEL, TILE_MODE
+    global CSV_FILE, FLIGHT_SEGMENT_DIR, EVIDENCE_DIR, CLIP_DIR, SPOOL_DIR, VIDEO_SAVE_PATH
+    global DEVICE_ID, INGEST_ADDRESS
+    args = parse_args()
+    replay = args.replay_video is not None
+
+    HEADLESS_MODE = HEADLESS_MODE or args.headless
+    FIRE_MODEL, HUMAN_MODEL, OBJECT_MODEL = args.fire_model, args.human_model, args.object_model
+    TILE_MODE = args.tile_mode
+    DEVICE_ID, INGEST_ADDRESS = args.device_id, args.ingest
+    if replay:
+        # Keep replay artefacts away from real flight data
+        os.makedirs(args.output_dir, exist_ok=True)
+        CSV_FILE = os.path.join(args.output_dir, os.path.basename(CSV_FILE))
+        FLIGHT_SEGMENT_DIR = os.path.join(args.output_dir, FLIGHT_SEGMENT_DIR)
+        EVIDENCE_DIR = os.path.join(args.output_dir, EVIDENCE_DIR)
+        CLIP_DIR = os.path.join(args.output_dir, CLIP_DIR)
+        SPOOL_DIR = os.path.join(args.output_dir, SPOOL_DIR)
+        VIDEO_SAVE_PATH = os.path.join(args.output_dir, "flight_recordings")
+        if args.metrics_snapshot == METRICS_SNAPSHOT:
+            args.metrics_snapshot = os.path.join(args.output_dir, "metrics.json")
+
+    print("=" * 60)
+    print("GAGAN NETRA - PHASE 2")
+    print("Intelligent Fire/Smoke Detection with Sensor Fusion")
+    print("=" * 60)
+
+    try:
+        if replay:
+            init_replay(args)
+        else:
+            init_sensors()
+        init_models()
+        init_spool(offline=args.offline)
+        init_flight_log()
+        init_clip_buffer()
+        if not replay:
+            init_camera()
+
+        if not cap.wait_ready(timeout=CAMERA_START_TIMEOUT):
+            print("? No camera!")
+            exit(1)
+        print("? Camera ready\\\\\\\\n")
+
+        init_video_recorder()
+        build_pipeline(block=replay and args.replay_speed <= 0)
+        init_metrics(args.metrics_port, args.metrics_snapshot)
+        elapsed = run(replay=replay)
+
+        report = get_run_report(elapsed)
+        print(f"[RUN] {report['frames']} frames in {elapsed:.1f}s = {report['fps']:.1f} FPS | "
+              f"latency p50 {report['latency_ms']['p50']:.0f}ms "
+              f"p95 {report['latency_ms']['p95']:.0f}ms p99 {report['latency_ms']['p99']:.0f}ms")
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+metrics.py - In-process runtime metrics for GAGAN NETRA
+
+A small metrics registry (counters, gauges, fixed-bucket histograms) that
+is cheap enough for the hot loop: every series is created up front, and
+observing a value only bumps preallocated slots, with no allocation per
+frame. Values that other components already count (queue drops, spool
+backlog, sensor age...) are pulled by collector callbacks at scrape time
+instead of being pushed from the hot loop.
+
+Exposed as Prometheus text on http://<host>:<port>/metrics, as JSON on
+/metrics.json, and as a periodic compact JSON snapshot file.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; covers sub-ms overlay drawing up to multi-second stalls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1,
+                   0.15, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    return repr(value)
+
+
+def _json_value(value):
+    """JSON has no infinity (e.g. age of a sensor that never reported)"""
+    if isinstance(value, float):
+        return round(value, 3) if abs(value) != float('inf') else None
+    return value
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Monotonic count; one writer per series (no lock on the hot path)"""
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() only increments preallocated slots"""
+    kind = 'histogram'
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bucket bound containing quantile q (inf if in the overflow bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            if running >= rank:
+                return bound
+        return float('inf')
+
+
+class MetricFamily:
+    """All series of one metric name, keyed by label values"""
+
+    def __init__(self, name, help_text, metric_class, label_names=(), **kwargs):
+        self.name = name
+        self.help = help_text
+        self.metric_class = metric_class
+        self.label_names = tuple(label_names)
+        self.kwargs = kwargs
+        self.series = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self.series[()] = metric_class(**kwargs)
+
+    def labels(self, *values):
+        """Get (creating on first use) the series for these label values"""
+        series = self.series.get(values)
+        if series is None:
+            with self._lock:
+                series = self.series.setdefault(values, self.metric_class(**self.kwargs))
+        return series
+
+    def __getattr__(self, attr):
+        # Unlabelled families act like their single series (counter.inc(), ...)
+        if attr == 'series':
+            raise AttributeError(attr)
+        return getattr(self.series[()], attr)
+
+
+class MetricsRegistry:
+    def __init__(self, prefix='gagan_'):
+        self.prefix = prefix
+        self.families = {}
+        self.collectors = []
+        self.started_at = time.time()
+
+    def _add(self, name, help_text, metric_class, labels, **kwargs):
+        family = MetricFamily(self.prefix + name, help_text, metric_class, labels, **kwargs)
+        self.families[name] = family
+        return family
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(name, help_text, Counter, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(name, help_text, Gauge, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(name, help_text, Histogram, labels, buckets=buckets)
+
+    def add_collector(self, func):
+        """func() is called before every scrape/snapshot to refresh pulled gauges"""
+        self.collectors.append(func)
+
+    def collect(self):
+        for func in self.collectors:
+            try:
+                func()
+            except Exception as e:
+                print(f"[METRICS] Collector error: {e}")
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        self.collect()
+        lines = []
+        for family in self.families.values():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.metric_class.kind}")
+            for values, series in list(family.series.items()):
+                labels = _format_labels(family.label_names, values)
+                if family.metric_class is Histogram:
+                    running = 0
+                    names = family.label_names + ('le',)
+                    for bound, count in zip(series.buckets + (float('inf'),), series.counts):
+                        running += count
+                        le = _format_value(bound)
+                        lines.append(f"{family.name}_bucket{_format_labels(names, values + (le,))} {running}")
+                    lines.append(f"{family.name}_sum{labels} {series.sum}")
+                    lines.append(f"{family.name}_count{labels} {series.count}")
+                else:
+                    lines.append(f"{family.name}{labels} {_format_value(series.value)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Compact dict: counters/gauges as values, histograms as count/mean/p50/p95/p99"""
+        self.collect()
+        data = {'timestamp': round(time.time(), 3), 'uptime_s': round(time.time() - self.started_at, 1)}
+        for name, family in self.families.items():
+            entries = {}
+            for values, series in list(family.series.items()):
+                key = ','.join(str(v) for v in values) or 'value'
+                if family.metric_class is Histogram:
+                    entries[key] = {
+                        'count': series.count,
+                        'mean_ms': round(1000.0 * series.sum / series.count, 2) if series.count else 0.0,
+                        'p50_ms': _json_value(1000.0 * series.quantile(0.50)),
+                        'p95_ms': _json_value(1000.0 * series.quantile(0.95)),
+                        'p99_ms': _json_value(1000.0 * series.quantile(0.99)),
+                    }
+                else:
+                    entries[key] = _json_value(series.value)
+            data[name] = entries['value'] if list(entries) == ['value'] else entries
+        return data
+
+
+# ============================================================
+# EXPORTERS
+# ============================================================
+class MetricsServer:
+    """Serves /metrics (Prometheus) and /metrics.json from a daemon thread"""
+
+    def __init__(self, registry, port=9108, host='0.0.0.0'):
+        self.registry = registry
+        registry_ref = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body = json.dumps(registry_ref.snapshot(), default=str).encode()
+                    content_type = 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body = registry_ref.render_prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of main.log
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"[METRICS] Serving http://{host}:{self.server.server_port}/metrics")
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotWriter:
+    """Writes registry.snapshot() to `path` every `interval` seconds (atomic replace)"""
+
+    def __init__(self, registry, path, interval=10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.registry.snapshot(), f, separators=(',', ':'), default=str)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[METRICS] Snapshot failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self.thread.join(timeout=2)
+        self.write()
+
+
+def read_thermal_zones(root='/sys/class/thermal'):
+    """{zone type: temperature °C} from sysfs (empty off-Linux / in containers)"""
+    temps = {}
+    try:
+        zones = sorted(name for name in os.listdir(root) if name.startswith('thermal_zone'))
+    except OSError:
+        return temps
+    for zone in zones:
+        try:
+            with open(os.path.join(root, zone, 'type')) as f:
+                name = f.read().strip()
+            with open(os.path.join(root, zone, 'temp')) as f:
+                temps[name] = int(f.read().strip()) / 1000.0
+        except (OSError, ValueError):
+            continue
+    return temps
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+pipeline.py - Staged, multi-threaded processing pipeline for GAGAN NETRA
+
+Each stage runs in its own thread and is connected to the next one through a
+bounded StageQueue. By default a full queue drops its oldest item, so slow
+consumers always see the freshest frame instead of building up latency.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sequence (0.0 if empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class LatencyRecorder:
+    """Named latency samples (seconds) with p50/p95/p99 summaries"""
+
+    def __init__(self, size=10000):
+        self.size = size
+        self.observers = {}  # name -> callable(seconds), e.g. a metrics histogram
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.size)
+            samples.append(seconds)
+        observer = self.observers.get(name)
+        if observer is not None:
+            observer(seconds)
+
+    @contextmanager
+    def time(self, name):
+        """Record how long the `with` block took under `name`"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def get_samples(self, name):
+        with self._lock:
+            return list(self._samples.get(name, ()))
+
+    def get_stats(self):
+        """Get count and mean/p50/p95/p99/max in milliseconds for every name"""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+        stats = {}
+        for name, samples in snapshot.items():
+            stats[name] = {
+                'count': len(samples),
+                'mean_ms': 1000.0 * sum(samples) / len(samples) if samples else 0.0,
+                'p50_ms': 1000.0 * percentile(samples, 50),
+                'p95_ms': 1000.0 * percentile(samples, 95),
+                'p99_ms': 1000.0 * percentile(samples, 99),
+                'max_ms': 1000.0 * max(samples) if samples else 0.0,
+            }
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class StageQueue:
+    """Bounded hand-off queue between two pipeline stages"""
+
+    def __init__(self, name, maxsize=1, drop_oldest=True, block=False):
+        self.name = name
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest  # False = reject the incoming item instead
+        self.block = block              # True = wait for space, never drop (offline replay)
+        self.dropped = 0
+        self.unfinished = 0             # Items put but not yet marked done by the consumer
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        """Add an item, applying the drop policy when full. Returns False if item was rejected"""
+        with self._cond:
+            if self.block:
+                self._cond.wait_for(lambda: self._closed or len(self._items) < self.maxsize)
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                self.dropped += 1
+                if not self.drop_oldest:
+                    return False
+                self._items.popleft()
+            else:
+                self.unfinished += 1
+            self._items.append(item)
+            self._cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """Pop the oldest item, or return None after timeout / when closed"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                item = self._items.popleft()
+                self._cond.notify_all()
+                return item
+            return None
+
+    def task_done(self):
+        """Mark an item returned by get() as fully processed"""
+        with self._cond:
+            self.unfinished -= 1
+
+    def close(self):
+        """Wake up all waiting consumers and reject further items"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Stage(threading.Thread):
+    """
+    Worker thread that applies `func` to items from `inbox` and forwards
+    the result to every queue in `outputs`.
+
+    A stage without an inbox is a source: `func` is called with no
+    arguments and is expected to block until it has something to emit.
+    Returning None from `func` drops the item.
+    """
+
+    def __init__(self, name, func, inbox=None, outputs=(), history=10000):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.outputs = list(outputs)
+        self.running = False
+
+        # Per-stage counters
+        self.processed = 0           # Items handled (sources: items produced)
+        self.emitted = 0             # Results passed on to the outputs
+        self.errors = 0
+        self.busy_time = 0.0
+        self.last_latency = 0.0
+        self.latencies = deque(maxlen=history)
+        self.observer = None  # Optional callable(seconds), e.g. a metrics histogram
+        self.started_at = None
+
+    def run(self):
+        self.running = True
+        self.started_at = time.time()
+        while self.running:
+            if self.inbox is not None:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    continue
+                args = (item,)
+            else:
+                args = ()
+
+            t0 = time.perf_counter()
+            try:
+                result = self.func(*args)
+                # Latency covers the work only, not waiting on full outputs
+                self._record_latency(time.perf_counter() - t0)
+                # A source returning None produced nothing; any other stage handled its item
+                if result is not None or self.inbox is not None:
+                    self.processed += 1
+                if result is not None:
+                    self.emitted += 1
+                    for queue in self.outputs:
+                        queue.put(result)
+            except Exception as e:
+                self._record_latency(time.perf_counter() - t0)
+                self.errors += 1
+                print(f"[PIPELINE] {self.name} error: {e}")
+            finally:
+                if self.inbox is not None:
+                    self.inbox.task_done()
+
+    def _record_latency(self, seconds):
+        self.last_latency = seconds
+        self.busy_time += seconds
+        self.latencies.append(seconds)
+        if self.observer is not None:
+            self.observer(seconds)
+
+    def stop(self):
+        self.running = False
+
+    def get_stats(self):
+        """Get processed/error counts, throughput and latency percentiles"""
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        latencies = list(self.latencies)
+        return {
+            'processed': self.processed,
+            'emitted': self.emitted,
+            'errors': self.errors,
+            'fps': self.processed / elapsed if elapsed > 0 else 0.0,
+            'avg_ms': 1000.0 * self.busy_time / self.processed if self.processed else 0.0,
+            'last_ms': 1000.0 * self.last_latency,
+            'p50_ms': 1000.0 * percentile(latencies, 50),
+            'p95_ms': 1000.0 * percentile(latencies, 95),
+            'p99_ms': 1000.0 * percentile(latencies, 99),
+        }
+
+
+class Pipeline:
+    """Owns the stages and queues of one processing graph"""
+
+    def __init__(self):
+        self.stages = []
+        self.queues = []
+
+    def add_queue(self, name, maxsize=1, drop_oldest=True, block=False):
+        queue = StageQueue(name, maxsize=maxsize, drop_oldest=drop_oldest, block=block)
+        self.queues.append(queue)
+        return queue
+
+    def add_stage(self, name, func, inbox=None, outputs=()):
+        stage = Stage(name, func, inbox=inbox, outputs=outputs)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self, timeout=2.0, drain_timeout=5.0):
+        """
+        Stop the sources, let the other stages work off what is already
+        queued (up to drain_timeout seconds), then stop all stages.
+        Returns False if queued items were left unprocessed.
+        """
+        sources = [stage for stage in self.stages if stage.inbox is None]
+        for stage in sources:
+            stage.stop()
+        for stage in sources:
+            if stage.is_alive():
+                stage.join(timeout)
+
+        # Queues no stage reads (display, read by the main thread) would never drain
+        consumed = [queue for queue in self.queues if any(stage.inbox is queue for stage in self.stages)]
+        for queue in self.queues:
+            if not any(queue is other for other in consumed):
+                queue.close()
+        deadline = time.monotonic() + drain_timeout
+        while any(queue.unfinished for queue in consumed) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        drained = not any(queue.unfinished for queue in consumed)
+
+        for stage in self.stages:
+            stage.stop()
+        for queue in self.queues:
+            queue.close()
+        for stage in self.stages:
+            if stage.is_alive():
+                stage.join(timeout)
+        return drained
+
+    def is_idle(self):
+        """True when every queued item has been fully processed"""
+        return all(queue.unfinished == 0 for queue in self.queues)
+
+    def get_stats(self):
+        """Get counters for every stage and queue"""
+        return {
+            'stages': {stage.name: stage.get_stats() for stage in self.stages},
+            'queues': {queue.name: {'depth': len(queue), 'dropped': queue.dropped}
+                       for queue in self.queues},
+        }
+
+    def get_stats_string(self):
+        """Get a one-line summary suitable for the flight log"""
+        stats = self.get_stats()
+        parts = [f"{name}:{s['fps']:.1f}fps/{s['avg_ms']:.0f}ms"
+                 for name, s in stats['stages'].items()]
+        drops = [f"{name}:{q['dropped']}" for name, q in stats['queues'].items() if q['dropped']]
+        line = " | ".join(parts)
+        if drops:
+            line += " | dropped " + ",".join(drops)
+        return line
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+pms7003_reader.py - Streaming PMS7003 reader for GAGAN NETRA
+
+A background thread reads the UART byte stream, resynchronises on the
+0x42 0x4D frame header, validates frame length and checksum, and publishes
+decoded samples into a SampleBuffer. The detection loop only ever reads the
+latest sample; it never touches the serial port.
+"""
+
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import serial
+
+from sensor_buffer import SampleBuffer
+
+FRAME_HEADER = b'\x42\x4d'
+FRAME_SIZE = 32
+FRAME_LENGTH = FRAME_SIZE - 4  # Value of the length field: 13 data words + checksum
+
+PMSSample = namedtuple('PMSSample', [
+    'timestamp',
+    'pm1_0_cf1', 'pm2_5_cf1', 'pm10_cf1',  # µg/m³, factory (CF=1) calibration
+    'pm1_0', 'pm2_5', 'pm10',              # µg/m³, atmospheric environment
+    'n0_3', 'n0_5', 'n1_0', 'n2_5', 'n5_0', 'n10',  # particles > size per 0.1 L
+])
+
+
+class PMS7003Parser:
+    """Incremental parser: feed raw bytes, get back complete valid samples"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.frames = 0
+        self.checksum_errors = 0
+        self.length_errors = 0
+        self.resyncs = 0
+
+    def feed(self, data, timestamp=None):
+        """Append bytes from the stream and return the list of decoded samples"""
+        self.buffer.extend(data)
+        timestamp = time.time() if timestamp is None else timestamp
+        samples = []
+
+        while True:
+            start = self.buffer.find(FRAME_HEADER)
+            if start < 0:
+                # Keep a trailing 0x42 that may be the first half of a header
+                keep = 1 if self.buffer[-1:] == FRAME_HEADER[:1] else 0
+                if len(self.buffer) > keep:
+                    self.resyncs += 1
+                    del self.buffer[:len(self.buffer) - keep]
+                break
+            if start > 0:
+                self.resyncs += 1
+                del self.buffer[:start]
+
+            if len(self.buffer) < 4:
+                break
+            length = (self.buffer[2] << 8) | self.buffer[3]
+            if length != FRAME_LENGTH:
+                # False header inside payload data; skip it and resync
+                self.length_errors += 1
+                del self.buffer[:1]
+                continue
+
+            if len(self.buffer) < FRAME_SIZE:
+                break
+            frame = bytes(self.buffer[:FRAME_SIZE])
+            expected = (frame[30] << 8) | frame[31]
+            if sum(frame[:30]) & 0xFFFF != expected:
+                self.checksum_errors += 1
+                del self.buffer[:1]
+                continue
+
+            del self.buffer[:FRAME_SIZE]
+            self.frames += 1
+            words = struct.unpack('>13H', frame[4:30])
+            samples.append(PMSSample(timestamp, *words[:12]))
+
+        return samples
+
+
+class PMS7003Reader:
+    def __init__(self, port='/dev/ttyTHS1', baudrate=9600, history=120, stream=None, max_age=5.0):
+        """
+        stream: optional object with read(n) -> bytes (e.g. a pty or a fake);
+        when omitted, the serial port is opened here.
+        max_age: readings older than this are reported as stale (stalled stream)
+        """
+        self.port = port
+        self.max_age = max_age
+        self.stream = stream if stream is not None else serial.Serial(port, baudrate=baudrate, timeout=0.5)
+        self.parser = PMS7003Parser()
+        self.buffer = SampleBuffer(history)
+        self.read_errors = 0
+        self.running = True
+        self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.read_thread.start()
+
+    def _read_loop(self):
+        """Background thread: stream bytes into the parser"""
+        while self.running:
+            try:
+                data = self.stream.read(FRAME_SIZE)
+            except Exception as e:
+                self.read_errors += 1
+                print(f"[PMS7003] Read error: {e}")
+                time.sleep(1)
+                continue
+            if not data:
+                continue
+            for sample in self.parser.feed(data):
+                self.buffer.publish(sample)
+
+    def get_latest(self):
+        """Get the latest PMSSample, or None before the first valid frame"""
+        return self.buffer.get_latest()
+
+    def sample_at(self, timestamp):
+        """Get the newest PMSSample captured at or before `timestamp`"""
+        return self.buffer.sample_at(timestamp)
+
+    def get_age(self):
+        """Seconds since the latest valid frame"""
+        return self.buffer.get_age()
+
+    def is_stale(self):
+        """True if there is no reading newer than max_age"""
+        return self.buffer.get_age() > self.max_age
+
+    def get_stats(self):
+        return {
+            'frames': self.parser.frames,
+            'checksum_errors': self.parser.checksum_errors,
+            'length_errors': self.parser.length_errors,
+            'resyncs': self.parser.resyncs,
+            'read_errors': self.read_errors,
+        }
+
+    def close(self):
+        self.running = False
+        self.read_thread.join(timeout=2)
+        if hasattr(self.stream, 'close'):
+            self.stream.close()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+preprocess.py - Shared detector input preparation for GAGAN NETRA
+
+Ultralytics letterboxes, converts BGR->RGB, transposes, normalises and
+uploads every frame inside each model call, so with three detectors the
+same work is done three times per frame. FramePreprocessor does it once:
+
+    - the frame is resized straight into a preallocated, pre-padded
+      letterbox canvas (no per-frame allocation on the CPU side)
+    - the uint8 canvas is uploaded (a quarter of the bytes of float32) into
+      a preallocated device buffer, where channel flip, transpose and
+      scaling to 0-1 happen
+    - the result is cached for the frame object it was made from, so every
+      model with the same input size reuses it
+
+SharedInputModel wraps a YOLO model so calls with a raw frame go through
+the preprocessor and boxes are mapped back to frame coordinates. Engines
+that share an input size therefore share one tensor; a single multi-head
+batch call would additionally need the heads exported as one engine.
+
+Without torch (e.g. benchmark.py on a plain CPU) the input is a float32
+NCHW numpy array built the same way.
+"""
+
+import cv2
+import numpy as np
+
+from tiled_inference import MergedResult, result_arrays
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+class PreparedFrame:
+    """A frame letterboxed to `size` and converted to model input"""
+
+    def __init__(self, tensor, scale, pad):
+        self.tensor = tensor   # 1x3xHxW, RGB, 0-1
+        self.scale = scale     # Model pixels per frame pixel
+        self.pad = pad         # (left, top) padding in model pixels
+
+    def to_frame(self, boxes):
+        """Map (N, 4) xyxy boxes from model input to frame coordinates"""
+        left, top = self.pad
+        return (boxes - np.array([left, top, left, top], dtype=np.float32)) / self.scale
+
+
+class FramePreprocessor:
+    def __init__(self, device=None, half=None, pad_value=114):
+        """
+        device: torch device for the input tensor (default: cuda if available, else cpu)
+        half: float16 input (default: on cuda)
+        """
+        if torch is not None:
+            self.device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+            self.half = self.device.type == 'cuda' if half is None else half
+        else:
+            self.device, self.half = None, False
+        self.pad_value = pad_value
+
+        self.prepared = 0
+        self.reused = 0
+
+        self._buffers = {}   # (size, frame shape) -> preallocated canvas / input buffers
+        self._cache = {}     # size -> (frame, PreparedFrame) of the latest frame
+
+    def _geometry(self, frame_shape, size):
+        height, width = frame_shape[:2]
+        scale = min(size / height, size / width)
+        new_w, new_h = round(width * scale), round(height * scale)
+        left, top = (size - new_w) // 2, (size - new_h) // 2
+        return scale, (new_w, new_h), (left, top)
+
+    def _get_buffers(self, frame_shape, size):
+        key = (size, frame_shape)
+        buffers = self._buffers.get(key)
+        if buffers is None:
+            # The frame size changed (e.g. camera reconnect): drop the old buffers for this size
+            for old in [k for k in self._buffers if k[0] == size]:
+                del self._buffers[old]
+            scale, resized, pad = self._geometry(frame_shape, size)
+            canvas = np.full((size, size, 3), self.pad_value, dtype=np.uint8)
+            left, top = pad
+            view = canvas[top:top + resized[1], left:left + resized[0]]
+            buffers = {'scale': scale, 'resized': resized, 'pad': pad, 'canvas': canvas, 'view': view,
+                       # Only padding above/below keeps the view contiguous enough to resize into
+                       'staging': None if view.flags['C_CONTIGUOUS']
+                       else np.empty((resized[1], resized[0], 3), dtype=np.uint8)}
+            if torch is not None:
+                host = torch.from_numpy(canvas)
+                if self.device.type == 'cuda':
+                    host = host.pin_memory()
+                    buffers['canvas'] = host.numpy()
+                    buffers['view'] = buffers['canvas'][top:top + resized[1], left:left + resized[0]]
+                buffers['host'] = host
+                buffers['upload'] = torch.empty((size, size, 3), dtype=torch.uint8, device=self.device)
+                buffers['input'] = torch.empty((1, 3, size, size), device=self.device,
+                                               dtype=torch.float16 if self.half else torch.float32)
+            else:
+                buffers['input'] = np.empty((1, 3, size, size), dtype=np.float32)
+            self._buffers[key] = buffers
+        return buffers
+
+    def prepare(self, frame, size=640):
+        """Model input for `frame` at `size` x `size`; reused if this frame was prepared already"""
+        cached = self._cache.get(size)
+        if cached is not None and cached[0] is frame:
+            self.reused += 1
+            return cached[1]
+
+        buffers = self._get_buffers(frame.shape, size)
+        if buffers['staging'] is None:
+            cv2.resize(frame, buffers['resized'], dst=buffers['view'], interpolation=cv2.INTER_LINEAR)
+        else:
+            cv2.resize(frame, buffers['resized'], dst=buffers['staging'], interpolation=cv2.INTER_LINEAR)
+            buffers['view'][:] = buffers['staging']
+
+        if torch is not None:
+            upload = buffers['upload']
+            upload.copy_(buffers['host'], non_blocking=True)
+            # BGR HWC uint8 -> RGB CHW 0-1, on the device
+            tensor = buffers['input']
+            for channel in range(3):
+                tensor[0, channel].copy_(upload[..., 2 - channel])
+            tensor.mul_(1.0 / 255)
+        else:
+            tensor = buffers['input']
+            np.multiply(buffers['canvas'][..., ::-1].transpose(2, 0, 1), 1.0 / 255, out=tensor[0])
+
+        prepared = PreparedFrame(tensor, buffers['scale'], buffers['pad'])
+        self._cache[size] = (frame, prepared)
+        self.prepared += 1
+        return prepared
+
+    def get_stats(self):
+        return {'prepared': self.prepared, 'reused': self.reused}
+
+
+class SharedInputModel:
+    """
+    A YOLO model fed from a FramePreprocessor
+
+    Calls with a single frame use the shared input; lists (tiled crops)
+    and anything else go to the model unchanged. Other attributes are
+    passed through to the model.
+    """
+
+    def __init__(self, model, preprocessor, size=640):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.size = size
+
+    def __call__(self, frame, conf=0.25, verbose=False):
+        if not isinstance(frame, np.ndarray) or frame.ndim != 3:
+            return self.model(frame, conf=conf, verbose=verbose)
+        prepared = self.preprocessor.prepare(frame, self.size)
+        boxes, confs, classes = result_arrays(self.model(prepared.tensor, conf=conf, verbose=verbose))
+        if len(boxes):
+            height, width = frame.shape[:2]
+            boxes = np.clip(prepared.to_frame(boxes), 0, [width, height, width, height])
+        return [MergedResult(boxes, confs, classes)]
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
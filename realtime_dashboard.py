@@ -1,10 +1,14 @@
+import os
 import streamlit as st
 import boto3
 from datetime import datetime
 import pandas as pd
 import plotly.express as px
 from streamlit_autorefresh import st_autorefresh
-import requests
+from incident_store import IncidentStore
+from incident_rollups import IncidentRollups
+from hotspot_index import HotspotIndex
+from evidence_cache import EvidenceCache, PREVIEW_WIDTH
 
 # ============================================================
 # CONFIGURATION & UNICODE SYMBOLS
@@ -64,38 +68,73 @@ st.markdown("""
 DEFAULT_LAT = 18.53516
 DEFAULT_LON = 73.81134
 
-@st.cache_data(ttl=5)
+# Drones polled for new incidents even before their first one is in the table
+# (a fleet: GAGAN_DEVICE_IDS=GAGAN_NETRA_01,GAGAN_NETRA_02,...)
+DEVICE_IDS = os.environ.get('GAGAN_DEVICE_IDS', 'GAGAN_NETRA_01').split(',')
+
+# Incidents within this radius and time window are drawn as one hotspot
+HOTSPOT_RADIUS_M = 150.0
+HOTSPOT_WINDOW = 6 * 3600.0
+SEVERITY_COLORS = {'CRITICAL': '#ef553b', 'HIGH': '#ffa15a', 'MEDIUM': '#fecb52', 'LOW': '#636efa'}
+
+def to_incident_frame(items):
+    df = pd.DataFrame(items)
+
+    # Convert to numeric, errors='coerce' turns non-numbers into NaN
+    df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce').fillna(0)
+    df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce').fillna(0)
+
+    # Replace (0,0) or NaN with C-DAC Pune coordinates
+    mask = (df['latitude'] == 0) | (df['longitude'] == 0)
+    df.loc[mask, 'latitude'] = DEFAULT_LAT
+    df.loc[mask, 'longitude'] = DEFAULT_LON
+
+    # Where the fire is (georeferenced onboard, schema v4), else where the UAV was
+    for axis in ('latitude', 'longitude'):
+        df[f'site_{axis}'] = df[axis]
+        if f'fire_{axis}' in df:
+            df[f'site_{axis}'] = pd.to_numeric(df[f'fire_{axis}'], errors='coerce').fillna(df[axis])
+
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
 def fetch_incidents():
+    """
+    Merge incidents uploaded since the last refresh into this session's DataFrame.
+    The first run scans the table; later runs only query new items (incident_store.py).
+    """
+    if 'incident_store' not in st.session_state:
+        st.session_state.incident_store = IncidentStore(table)
+        st.session_state.incidents = pd.DataFrame()
+        st.session_state.rollups = IncidentRollups()
+        # Fallback-coordinate (GPS lost) incidents are kept out of the hotspots
+        st.session_state.hotspots = HotspotIndex(radius_m=HOTSPOT_RADIUS_M, window=HOTSPOT_WINDOW,
+                                                 exclude=[(DEFAULT_LAT, DEFAULT_LON)])
     try:
-        response = table.scan()
-        items = response.get('Items', [])
-        if items:
-            df = pd.DataFrame(items)
-            
-            # Convert to numeric, errors='coerce' turns non-numbers into NaN
-            df['latitude'] = pd.to_numeric(df['latitude'], errors='coerce').fillna(0)
-            df['longitude'] = pd.to_numeric(df['longitude'], errors='coerce').fillna(0)
-
-            # Replace (0,0) or NaN with C-DAC Pune coordinates
-            mask = (df['latitude'] == 0) | (df['longitude'] == 0)
-            df.loc[mask, 'latitude'] = DEFAULT_LAT
-            df.loc[mask, 'longitude'] = DEFAULT_LON
-
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            return df.sort_values('timestamp', ascending=False)
-        return pd.DataFrame()
+        new_items = st.session_state.incident_store.refresh(DEVICE_IDS)
     except Exception as e:
         st.error(f"Error: {e}")
-        return pd.DataFrame()
+        return st.session_state.incidents
+
+    if new_items:
+        new_df = to_incident_frame(new_items)
+        st.session_state.rollups.update(new_df)
+        st.session_state.hotspots.update(new_df, latitude='site_latitude', longitude='site_longitude')
+        df = pd.concat([st.session_state.incidents, new_df], ignore_index=True)
+        df = df.drop_duplicates('incident_id', keep='last')
+        st.session_state.incidents = df.sort_values('timestamp', ascending=False).reset_index(drop=True)
+    return st.session_state.incidents
 
 df = fetch_incidents()
+rollups = st.session_state.rollups
+hotspots = st.session_state.hotspots
 
-def get_image_bytes(url):
-    try:
-        response = requests.get(url)
-        return response.content
-    except Exception as e:
-        return None
+@st.cache_resource
+def get_evidence_cache():
+    """One evidence cache (memory + disk LRU, pooled HTTP session) shared by all sessions"""
+    return EvidenceCache(cache_dir="evidence_cache")
+
+evidence_cache = get_evidence_cache()
 
 # ============================================================
 # HEADER & TREND METRICS
@@ -108,26 +147,16 @@ if df.empty:
     st.warning(f"{U_WARN} System active. Waiting for UAV data...")
     st.stop()
 
-# Calculate Trends for Metrics
-latest_pm = df['pm25'].iloc[0]
-prev_pm = df['pm25'].iloc[1] if len(df) > 1 else latest_pm
-pm_delta = latest_pm - prev_pm
+# Header metrics come from the running rollups, not the full DataFrame
+summary = rollups.get_summary()
+current_avg_pm = summary['avg_pm25']
+avg_delta = summary['avg_pm25_delta']  # vs. the average without the latest record
 
 col1, col2, col3, col4 = st.columns(4)
 with col1:
-    st.metric("Total Incidents", len(df))
+    st.metric("Total Incidents", summary['total'])
 with col2:
-    critical_count = len(df[df['severity'] == 'CRITICAL'])
-    st.metric("Critical Alerts", critical_count)
-# 1. Calculate Averages
-current_avg_pm = df['pm25'].mean()
-
-# 2. Calculate previous average (excluding the latest record) for the trend arrow
-if len(df) > 1:
-    prev_avg_pm = df['pm25'].iloc[1:].mean()
-    avg_delta = current_avg_pm - prev_avg_pm
-else:
-    avg_delta = 0
+    st.metric("Critical Alerts", summary['critical'])
 
 with col3:
     # This now shows the Average PM2.5 with a trend arrow
@@ -140,7 +169,7 @@ with col3:
 
 with col4:
     # Metric for the last detection time
-    st.metric("Last Detection", df['timestamp'].iloc[0].strftime("%H:%M:%S"))
+    st.metric("Last Detection", summary['last_detection'].strftime("%H:%M:%S"))
 
 st.markdown("---")
 
@@ -151,10 +180,13 @@ st.subheader(f"{U_FIRE} Recent Incidents")
 
 if 'page' not in st.session_state: st.session_state.page = 0
 if 'selected_img' not in st.session_state: st.session_state.selected_img = None
+if 'download_img' not in st.session_state: st.session_state.download_img = None
 
 items_per_page = 10
 start_idx = st.session_state.page * items_per_page
 page_df = df.iloc[start_idx : start_idx + items_per_page].copy()
+# Thumbnails for the whole page in parallel (cached after the first fetch)
+thumbnails = evidence_cache.prefetch_thumbnails(page_df['evidence_url'].tolist())
 
 # Table Headers
 h_cols = st.columns([0.5, 2, 1, 1, 1, 1, 2, 0.8])
@@ -179,8 +211,12 @@ for i, (idx, row) in enumerate(page_df.iterrows(), start=start_idx + 1):
     r_cols[5].write(f"{float(row['temperature']):.1f}\u00B0C")
     r_cols[6].write(row['fire_source'])
     
-    if r_cols[7].button(f"{U_CAMERA}", key=f"btn_{idx}"):
+    thumb = thumbnails.get(row['evidence_url'])
+    if thumb:
+        r_cols[7].image(thumb, use_container_width=True)
+    if r_cols[7].button(f"{U_CAMERA}", key=f"btn_{row['incident_id']}"):
         st.session_state.selected_img = row['evidence_url']
+        st.session_state.download_img = None
         st.rerun()
     st.markdown('<hr style="margin: 2px 0; border: 0.5px solid rgba(255,255,255,0.1);">', unsafe_allow_html=True)
 
@@ -196,6 +232,7 @@ if st.session_state.selected_img:
     v1.subheader(f"{U_INFO} Event: {sel['fire_source']} ({sel['timestamp'].strftime('%H:%M:%S')})")
     if v2.button(f"{U_CLOSE} Close"):
         st.session_state.selected_img = None
+        st.session_state.download_img = None
         st.rerun()
         
     c_info, c_img = st.columns([1, 1.2])
@@ -233,27 +270,43 @@ if st.session_state.selected_img:
     
         g_url = f"https://www.google.com/maps/search/?api=1&query={sel['latitude']},{sel['longitude']}"
         st.markdown(f"[**{U_MAP} Open in Google Maps**]({g_url})")
+        # Projected fire position, once the UAV had altitude and attitude for it
+        if isinstance(sel.get('fire_latitude'), str) and sel['fire_latitude']:
+            st.write(f"**Fire at:** `{sel['fire_latitude']}, {sel['fire_longitude']}` "
+                     f"\u00B1 {float(sel.get('fire_position_error_m', 0)):.0f} m")
+            f_url = f"https://www.google.com/maps/search/?api=1&query={sel['fire_latitude']},{sel['fire_longitude']}"
+            st.markdown(f"[**{U_MAP} Fire position in Google Maps**]({f_url})")
+        # Pre/post-roll clip, linked once the UAV has uploaded it
+        if isinstance(sel.get('clip_url'), str) and sel['clip_url']:
+            st.markdown(f"[**\U0001F3AC Incident clip**]({sel['clip_url']})")
     with c_img:
-        # 1. Display the Image
-        st.image(sel['evidence_url'], caption=f"UAV Snapshot: {sel['fire_source']}", use_container_width=True)
-        
-        # 2. Prepare Download Logic
-        img_bytes = get_image_bytes(sel['evidence_url'])
+        # 1. Display a cached preview (generated once per incident)
+        preview = evidence_cache.get_thumbnail(sel['evidence_url'], PREVIEW_WIDTH)
+        st.image(preview if preview else sel['evidence_url'],
+                 caption=f"UAV Snapshot: {sel['fire_source']}", use_container_width=True)
         
-        if img_bytes:
-            # Create a filename based on timestamp
-            timestamp_str = sel['timestamp'].strftime('%Y%m%d_%H%M%S')
-            file_name = f"GaganNetra_{timestamp_str}.jpg"
-            
-            st.download_button(
-                label=f"\U0001F4E5 Download Evidence Image",
-                data=img_bytes,
-                file_name=file_name,
-                mime="image/jpeg",
-                use_container_width=True
-            )
+        # 2. The full-size original is only fetched once the user asks for it
+        if st.session_state.download_img != sel['evidence_url']:
+            if st.button(f"\U0001F4E5 Download Evidence Image", use_container_width=True):
+                st.session_state.download_img = sel['evidence_url']
+                st.rerun()
         else:
-            st.error("Could not prepare image for download.")
+            img_bytes = evidence_cache.get_original(sel['evidence_url'])
+            
+            if img_bytes:
+                # Create a filename based on timestamp
+                timestamp_str = sel['timestamp'].strftime('%Y%m%d_%H%M%S')
+                file_name = f"GaganNetra_{timestamp_str}.jpg"
+                
+                st.download_button(
+                    label=f"\U0001F4E5 Save {file_name}",
+                    data=img_bytes,
+                    file_name=file_name,
+                    mime="image/jpeg",
+                    use_container_width=True
+                )
+            else:
+                st.error("Could not prepare image for download.")
 
 # Pagination Controls
 st.markdown("---")
@@ -272,39 +325,67 @@ if p3.button(f"Next {U_NEXT}", disabled=len(df) <= (start_idx + items_per_page))
 st.markdown("---")
 st.subheader(f"{U_MAP} Hotspots")
 
+def build_hotspot_map(hotspots):
+    """One circle per hotspot, sized by incident count and coloured by peak severity"""
+    frame = hotspots.frame()
+    frame['size'] = HOTSPOT_RADIUS_M * frame['incidents'] ** 0.5
+    frame['color'] = frame['peak_severity'].map(SEVERITY_COLORS).fillna('#636efa') + 'c0'
+    return frame
+
+if st.session_state.get('map_version') != hotspots.version:
+    st.session_state.hotspot_map = build_hotspot_map(hotspots)
+    st.session_state.map_version = hotspots.version
+hotspot_df = st.session_state.hotspot_map
+
 # Global Map
-st.map(df[['latitude', 'longitude']])
+if hotspot_df.empty:
+    st.info(f"{U_MAP} No incidents with GPS coordinates yet")
+else:
+    st.map(hotspot_df, latitude='latitude', longitude='longitude', size='size', color='color')
+    st.dataframe(hotspot_df.head(10)[['hotspot_id', 'incidents', 'peak_severity', 'peak_confidence',
+                                      'peak_pm25', 'first_seen', 'last_seen', 'latitude', 'longitude']],
+                 hide_index=True, use_container_width=True)
+stats = hotspots.get_stats()
+st.caption(f"{stats['hotspots']} hotspots from {stats['incidents']} located incidents "
+           f"(within {HOTSPOT_RADIUS_M:.0f} m) | {stats['unlocated']} without GPS not shown")
 
 st.markdown("---")
 
+def build_charts(rollups):
+    """Plotly figures from the compact rollups (rebuilt only when new incidents arrive)"""
+    # PM2.5 trend, downsampled to a fixed number of points
+    df_trend = rollups.trend_frame(max_points=500)
+    fig_line = px.line(df_trend, x='timestamp', y='pm25', 
+                       labels={'pm25': 'PM2.5 Level', 'timestamp': 'Time'},
+                       hover_data=['incidents'], markers=True)
+    fig_line.update_traces(line_color='#ff4b4b', line_width=3)
+    fig_line.update_layout(hovermode="x unified")
+
+    # Event Type Bar Chart
+    fig_bar = px.bar(rollups.source_frame(), x='Event Type', y='Count', 
+                     title="Incident Frequency by Type",
+                     color='Count', color_continuous_scale='Reds')
+
+    # Severity Distribution
+    fig_pie = px.pie(rollups.severity_frame(), names='severity', values='Count', title="Severity Breakdown",
+                     color='severity', color_discrete_map=SEVERITY_COLORS)
+    return fig_line, fig_bar, fig_pie
+
+if st.session_state.get('charts_version') != rollups.version:
+    st.session_state.charts = build_charts(rollups)
+    st.session_state.charts_version = rollups.version
+fig_line, fig_bar, fig_pie = st.session_state.charts
+
 # PM2.5 Trend Graph (Full Width)
 st.subheader(f"{U_CHART} PM2.5 Intensity Over Time")
-# Ensure data is sorted by time for a proper line flow
-df_trend = df.sort_values('timestamp')
-fig_line = px.line(df_trend, x='timestamp', y='pm25', 
-                   labels={'pm25': 'PM2.5 Level', 'timestamp': 'Time'},
-                   markers=True)
-fig_line.update_traces(line_color='#ff4b4b', line_width=3)
-fig_line.update_layout(hovermode="x unified")
 st.plotly_chart(fig_line, use_container_width=True)
 
 col_a, col_b = st.columns(2)
 
 with col_a:
-    # Event Type Bar Chart
-    event_counts = df['fire_source'].value_counts().reset_index()
-    event_counts.columns = ['Event Type', 'Count']
-    fig_bar = px.bar(event_counts, x='Event Type', y='Count', 
-                     title="Incident Frequency by Type",
-                     color='Count', color_continuous_scale='Reds')
     st.plotly_chart(fig_bar, use_container_width=True)
 
 with col_b:
-    # Severity Distribution
-    fig_pie = px.pie(df, names='severity', title="Severity Breakdown",
-                     color='severity', color_discrete_map={
-                         'CRITICAL': '#ef553b', 'HIGH': '#ffa15a', 'MEDIUM': '#fecb52', 'LOW': '#636efa'
-                     })
     st.plotly_chart(fig_pie, use_container_width=True)
 
 st.caption(f"{U_DRONE} GAGAN NETRA Cloud Dashboard \u00A9 2026")
\ No newline at end of file
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+replay.py - Hardware-free replay sources for GAGAN NETRA
+
+Drop-in stand-ins for ThreadedCamera, PMS7003Reader, BME688Sampler and
+CubeOrangeGPS that play back recorded data:
+
+    ReplayCamera   frames from a video file or an image directory
+    ReplayPMS7003  PM values from a CSV/JSONL sensor trace
+    ReplayBME688   temperature/humidity/pressure/gas from the same trace
+    ReplayGPS      a recorded track (CSV) or MAVLink telemetry log (.tlog)
+
+All sources share one ReplayClock. Frame timestamps are derived from the
+frame index, so a replay is deterministic: speed=1.0 plays back in real
+time, speed=0 plays back as fast as the pipeline can consume frames.
+"""
+
+import bisect
+import csv
+import json
+import math
+import os
+import time
+from datetime import datetime
+
+import cv2
+
+from bme688_sampler import BMESample
+from gps_reader import CubeOrangeGPS
+from pms7003_reader import PMSSample
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def parse_timestamp(value):
+    """Epoch seconds from a number or an ISO-8601 / 'YYYY-mm-dd HH:MM:SS' string"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _float(row, key, default):
+    value = row.get(key)
+    if value in (None, ''):
+        return default
+    return float(value)
+
+
+class ReplayClock:
+    """Maps trace time to wall time; speed=0 means no waiting at all"""
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.t0_trace = None
+        self.t0_wall = None
+        self.current = None
+
+    def wait_until(self, t_trace):
+        """Block until trace time `t_trace` is due, then make it the current time"""
+        if self.t0_trace is None:
+            self.t0_trace = t_trace
+            self.t0_wall = time.time()
+        if self.speed > 0:
+            delay = self.t0_wall + (t_trace - self.t0_trace) / self.speed - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        self.current = t_trace
+
+    def now(self):
+        """Current trace time (time of the last frame handed out)"""
+        if self.current is not None:
+            return self.current
+        return self.t0_trace if self.t0_trace is not None else 0.0
+
+
+# ============================================================
+# CAMERA
+# ============================================================
+class ReplayCamera:
+    """Plays back a video file or image directory with the ThreadedCamera interface"""
+
+    def __init__(self, path, clock, fps=None, start_time=0.0):
+        self.path = path
+        self.clock = clock
+        self.start_time = start_time
+        self.finished = False
+        self.seq = 0
+        self._pending = None
+
+        if os.path.isdir(path):
+            self.images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+            self.capture = None
+            self.fps = fps or 10.0
+        else:
+            self.images = None
+            self.capture = cv2.VideoCapture(path)
+            if not self.capture.isOpened():
+                raise IOError(f"Cannot open replay video {path}")
+            self.fps = fps or self.capture.get(cv2.CAP_PROP_FPS) or 10.0
+
+    def _decode_next(self):
+        if self.images is not None:
+            if self.seq >= len(self.images):
+                return None
+            return cv2.imread(self.images[self.seq])
+        ret, frame = self.capture.read()
+        return frame if ret else None
+
+    def _next_frame(self):
+        if self._pending is not None:
+            frame, self._pending = self._pending, None
+            return frame
+        return self._decode_next()
+
+    def read_new(self, timeout=None):
+        """
+        Get the next frame once it is due on the replay clock
+
+        Returns: (seq, timestamp, frame); frame is None at the end of the replay
+        """
+        frame = None if self.finished else self._next_frame()
+        if frame is None:
+            self.finished = True
+            return self.seq, self.clock.now(), None
+        timestamp = self.start_time + self.seq / self.fps
+        self.clock.wait_until(timestamp)
+        self.seq += 1
+        return self.seq, timestamp, frame
+
+    def read(self):
+        return self.read_new()
+
+    def wait_ready(self, timeout=10.0):
+        """Decode the first frame ahead of time. Returns False if the source is empty"""
+        if self._pending is None:
+            self._pending = self._decode_next()
+        return self._pending is not None
+
+    def get_frame_size(self):
+        if self._pending is None:
+            return 0, 0
+        return self._pending.shape[1], self._pending.shape[0]
+
+    def get_stats(self):
+        return {'frames': self.seq, 'dropped': 0, 'duplicates': 0,
+                'read_failures': 0, 'reconnects': 0}
+
+    def release(self):
+        if self.capture is not None:
+            self.capture.release()
+
+
+# ============================================================
+# SENSORS
+# ============================================================
+class SensorTrace:
+    """
+    Time-ordered sensor rows from a CSV or JSONL file.
+
+    Required: timestamp. Recognised: pm25 (or pm2_5), pm1_0, pm10,
+    temperature, humidity, pressure, gas_resistance. The flight log CSV
+    written by main.py is a valid trace.
+    """
+
+    def __init__(self, path):
+        if path.endswith(('.jsonl', '.json')):
+            with open(path) as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            with open(path, newline='') as f:
+                rows = list(csv.DictReader(f))
+        rows = [row for row in rows if row.get('timestamp') not in (None, '')]
+        for row in rows:
+            row['timestamp'] = parse_timestamp(row['timestamp'])
+        rows.sort(key=lambda row: row['timestamp'])
+        self.rows = rows
+        self.times = [row['timestamp'] for row in rows]
+
+    def start_time(self):
+        return self.times[0] if self.times else None
+
+    def row_at(self, timestamp):
+        """Newest row at or before `timestamp` (None before the trace starts)"""
+        idx = bisect.bisect_right(self.times, timestamp) - 1
+        return self.rows[idx] if idx >= 0 else None
+
+
+class ReplayPMS7003:
+    """PMS7003Reader stand-in backed by a SensorTrace"""
+
+    def __init__(self, trace, clock, max_age=5.0):
+        self.trace = trace
+        self.clock = clock
+        self.max_age = max_age
+
+    def sample_at(self, timestamp):
+        row = self.trace.row_at(timestamp)
+        if row is None:
+            return None
+        pm25 = int(_float(row, 'pm25', _float(row, 'pm2_5', 0)))
+        pm1_0 = int(_float(row, 'pm1_0', pm25))
+        pm10 = int(_float(row, 'pm10', pm25))
+        return PMSSample(row['timestamp'], pm1_0, pm25, pm10, pm1_0, pm25, pm10, 0, 0, 0, 0, 0, 0)
+
+    def get_latest(self):
+        return self.sample_at(self.clock.now())
+
+    def get_age(self):
+        sample = self.get_latest()
+        return self.clock.now() - sample.timestamp if sample else float('inf')
+
+    def is_stale(self):
+        sample = self.get_latest()
+        return sample is None or self.clock.now() - sample.timestamp > self.max_age
+
+    def get_stats(self):
+        return {'frames': len(self.trace.rows), 'checksum_errors': 0, 'length_errors': 0,
+                'resyncs': 0, 'read_errors': 0}
+
+    def close(self):
+        pass
+
+
+class ReplayBME688:
+    """BME688Sampler stand-in backed by a SensorTrace"""
+
+    def __init__(self, trace, clock, max_age=5.0):
+        self.trace = trace
+        self.clock = clock
+        self.max_age = max_age
+
+    def get_age(self):
+        sample = self.get_latest()
+        return self.clock.now() - sample.timestamp if sample else float('inf')
+
+    def sample_at(self, timestamp):
+        row = self.trace.row_at(timestamp)
+        if row is None:
+            return None
+        return BMESample(row['timestamp'], _float(row, 'temperature', 25.0),
+                         _float(row, 'humidity', 0.0), _float(row, 'pressure', 0.0),
+                         _float(row, 'gas_resistance', 100000), True)
+
+    def get_latest(self):
+        return self.sample_at(self.clock.now())
+
+    def is_stale(self):
+        sample = self.get_latest()
+        return sample is None or self.clock.now() - sample.timestamp > self.max_age
+
+    def get_reading(self):
+        sample = self.get_latest()
+        if sample is None:
+            return None
+        reading = sample._asdict()
+        reading['stale'] = self.is_stale()
+        return reading
+
+    def get_stats(self):
+        return {'samples': len(self.trace.rows), 'read_errors': 0}
+
+    def close(self):
+        pass
+
+
+# ============================================================
+# GPS
+# ============================================================
+class ReplayGPS(CubeOrangeGPS):
+    """
+    CubeOrangeGPS fed from a recorded track instead of a live vehicle.
+
+    Track CSV columns: timestamp, lat, lon, alt, [alt_relative, heading (deg),
+    roll, pitch, yaw (rad), satellites, fix_type]. Files ending in .tlog are
+    replayed as MAVLink telemetry logs.
+    """
+
+    def __init__(self, path, clock, history=100000):
+        super().__init__(history=history, connect_vehicle=False)
+        self.clock = clock
+        self._fix_times = []
+        self._fix = []  # (fix_type, satellites)
+
+        if path.endswith('.tlog'):
+            self.load_tlog(path)  # handle_message below also records the fix history
+        else:
+            self._load_track(path)
+
+        self.connected = bool(len(self.positions))
+
+    def _load_track(self, path):
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                t = parse_timestamp(row['timestamp'])
+                alt = _float(row, 'alt', 0.0)
+                self.positions.append(t, lat=_float(row, 'lat', 0.0), lon=_float(row, 'lon', 0.0),
+                                      alt=alt, alt_relative=_float(row, 'alt_relative', alt),
+                                      heading=_float(row, 'heading', 0.0))
+                self.attitudes.append(t, roll=_float(row, 'roll', 0.0),
+                                      pitch=_float(row, 'pitch', 0.0),
+                                      yaw=_float(row, 'yaw', math.radians(_float(row, 'heading', 0.0))))
+                self._record_fix(t, int(_float(row, 'fix_type', 3)), int(_float(row, 'satellites', 10)))
+
+    def _record_fix(self, timestamp, fix_type, satellites):
+        if self._fix_times and timestamp < self._fix_times[-1]:
+            return
+        self._fix_times.append(timestamp)
+        self._fix.append((fix_type, satellites))
+
+    def handle_message(self, msg, timestamp=None):
+        if timestamp is None:
+            timestamp = getattr(msg, '_timestamp', None) or time.time()
+        super().handle_message(msg, timestamp)
+        if msg.get_type() == 'GPS_RAW_INT':
+            self._record_fix(timestamp, self.fix_type, self.satellites)
+
+    def start_time(self):
+        time_range = self.positions.get_time_range()
+        return time_range[0] if time_range else None
+
+    def _fix_at(self, timestamp):
+        idx = bisect.bisect_right(self._fix_times, timestamp) - 1
+        return self._fix[idx] if idx >= 0 else (0, 0)
+
+    def get_coordinates(self):
+        """Coordinates at the current replay time"""
+        now = self.clock.now()
+        coords = super().get_coordinates()
+        position, _ = self.positions.sample_at(now)
+        if position:
+            coords.update(lat=position['lat'], lon=position['lon'], alt=position['alt'],
+                          alt_relative=position['alt_relative'], heading=position['heading'])
+        coords['fix_type'], coords['satellites'] = self._fix_at(now)
+        return coords
+
+    def position_at(self, timestamp):
+        coords = super().position_at(timestamp)
+        coords['fix_type'], coords['satellites'] = self._fix_at(timestamp)
+        return coords
+
+    def has_fix(self):
+        return self._fix_at(self.clock.now())[0] >= 2
+
+    def close(self):
+        print("[GPS] Replay closed")
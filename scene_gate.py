@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+scene_gate.py - Skip inference on static scenes for GAGAN NETRA
+
+While hovering or on the ground, consecutive frames are often nearly
+identical. SceneGate compares a small grayscale copy of each frame with the
+one the detectors last ran on, and reports whether the scene has changed
+enough to be worth running them again:
+
+    - frames are reduced to `width` pixels wide before anything else
+      (averaging 4x4 samples per pixel, so sensor noise averages out)
+    - a global brightness shift (auto exposure) is subtracted first
+    - the scene counts as changed when any block of the `grid` has more
+      than `sensitivity` of its pixels differing by `pixel_threshold`
+      gray levels, so a small new flame is not averaged away
+
+The comparison is against the last *inferred* frame, so slow drift still
+adds up to a refresh, and `max_age` seconds forces one regardless.
+"""
+
+import cv2
+import numpy as np
+
+
+class SceneGate:
+    def __init__(self, width=96, grid=(6, 4), pixel_threshold=12, sensitivity=0.02, max_age=1.0):
+        """
+        grid: (columns, rows) of blocks
+        sensitivity: fraction of a block's pixels that must change (lower = more inference)
+        max_age: seconds after which inference runs even on an unchanged scene
+        """
+        self.width = width
+        self.grid = grid
+        self.pixel_threshold = pixel_threshold
+        self.sensitivity = sensitivity
+        self.max_age = max_age
+
+        self.checked = 0
+        self.changed = 0
+        self.forced = 0
+        self.skipped = 0
+        self.last_score = 0.0  # Highest changed fraction of any block, last frame
+
+        self._reference = None
+        self._reference_time = None
+
+    def _thumbnail(self, frame):
+        columns, rows = self.grid
+        height = max(rows, round(frame.shape[0] * self.width / frame.shape[1]))
+        # Whole blocks only, so the block view below is a plain reshape
+        size = (self.width - self.width % columns, height - height % rows)
+        if frame.shape[1] > 4 * size[0]:
+            # Point-sample down to 4x first; INTER_AREA over a full frame costs ~10x more
+            frame = cv2.resize(frame, (4 * size[0], 4 * size[1]), interpolation=cv2.INTER_NEAREST)
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def change_score(self, small):
+        """Highest fraction of changed pixels in any block vs. the reference"""
+        diff = small - self._reference
+        diff -= int(np.mean(diff))  # Exposure changes move every pixel alike
+        changed = np.abs(diff) > self.pixel_threshold
+        columns, rows = self.grid
+        height, width = changed.shape
+        blocks = changed.reshape(rows, height // rows, columns, width // columns)
+        return float(blocks.mean(axis=(1, 3)).max())
+
+    def should_run(self, frame, now):
+        """True if the detectors should run on `frame`, False to reuse their last results"""
+        self.checked += 1
+        small = self._thumbnail(frame)
+        if self._reference is None or self._reference.shape != small.shape:
+            run = True
+            self.last_score = 1.0
+        else:
+            self.last_score = self.change_score(small)
+            run = self.last_score > self.sensitivity
+            if run:
+                self.changed += 1
+            elif now - self._reference_time >= self.max_age:
+                run = True
+                self.forced += 1
+        if run:
+            self._reference = small
+            self._reference_time = now
+        else:
+            self.skipped += 1
+        return run
+
+    def get_stats(self):
+        return {
+            'checked': self.checked,
+            'changed': self.changed,
+            'forced': self.forced,
+            'skipped': self.skipped,
+            'last_score': self.last_score,
+        }
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+sensor_buffer.py - Latest-value slot and ring buffer for sensor samples
+
+Written by a single sensor thread and read by any number of consumers
+without locks: publishing replaces one list slot and one attribute, both
+of which are atomic under the GIL.
+"""
+
+import time
+
+
+class SampleBuffer:
+    def __init__(self, size=120):
+        self.size = size
+        self.latest = None  # Most recent sample, or None before the first one
+        self._ring = [None] * size
+        self._count = 0
+
+    def publish(self, sample):
+        """Store a new sample (sensor thread only)"""
+        self._ring[self._count % self.size] = sample
+        self._count += 1
+        self.latest = sample
+
+    def get_latest(self):
+        return self.latest
+
+    def get_count(self):
+        """Total number of samples published so far"""
+        return self._count
+
+    def get_history(self):
+        """Get buffered samples, oldest first"""
+        count = self._count
+        ring = list(self._ring)
+        if count <= self.size:
+            return ring[:count]
+        start = count % self.size
+        return ring[start:] + ring[:start]
+
+    def sample_at(self, timestamp):
+        """Get the newest sample captured at or before `timestamp` (None if none buffered)"""
+        sample = self.latest
+        if sample is None or sample.timestamp <= timestamp:
+            return sample
+        for sample in reversed(self.get_history()):
+            if sample.timestamp <= timestamp:
+                return sample
+        return None
+
+    def get_age(self, now=None):
+        """Seconds since the latest sample was captured (inf if none yet)"""
+        sample = self.latest
+        if sample is None:
+            return float('inf')
+        return (time.time() if now is None else now) - sample.timestamp
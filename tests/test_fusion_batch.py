@@ -0,0 +1,50 @@
+import itertools
+
+import numpy as np
+
+from fusion_batch import FIRE_TYPES, SEVERITIES, SOURCES, classify_batch, random_inputs
+from fusion_rules import classify_fire_source, detect_fire_or_smoke, get_severity
+
+
+def scalar_results(fire_conf, pm25, temp, gas_res, human_detected):
+    results = []
+    for f, p, t, g, h in zip(fire_conf, pm25, temp, gas_res, human_detected):
+        fire_type = detect_fire_or_smoke(float(f), float(p), float(t), float(g))
+        results.append((fire_type, classify_fire_source(float(p), float(g), float(t), bool(h), fire_type),
+                        get_severity(float(f), float(p), float(g), fire_type)))
+    return results
+
+
+def batch_results(fire_conf, pm25, temp, gas_res, human_detected):
+    fire_type, fire_source, severity = classify_batch(fire_conf, pm25, temp, gas_res, human_detected)
+    return list(zip(FIRE_TYPES[fire_type], SOURCES[fire_source], SEVERITIES[severity]))
+
+
+def assert_same(inputs):
+    expected, got = scalar_results(*inputs), batch_results(*inputs)
+    mismatches = [(i, expected[i], got[i]) for i in range(len(expected)) if expected[i] != got[i]]
+    assert not mismatches, mismatches[:5]
+
+
+def test_random_inputs_match_scalar_rules():
+    assert_same(random_inputs(20000, seed=1))
+
+
+def test_threshold_boundaries_match_scalar_rules():
+    # Every threshold in fusion_rules, just below, on and just above it
+    fire_confs = [0.3, 0.4, 0.5, 0.6, 0.75]
+    pm25s = [35, 50, 80, 100, 120, 150, 200, 250]
+    temps = [25.0 + rise for rise in (3.0, 5.0)] + [27, 28]
+    gas_ress = [20000, 30000, 40000, 50000, 80000, 100000, 150000, 200000]
+    around = lambda values, step: sorted({v + d for v in values for d in (-step, 0, step)})
+    rows = list(itertools.product(around(fire_confs, 0.001), around(pm25s, 1), around(temps, 0.01),
+                                  around(gas_ress, 1), (False, True)))
+    assert_same([np.array(column) for column in zip(*rows)])
+
+
+def test_human_detected_defaults_to_false():
+    inputs = random_inputs(1000, seed=2)
+    without = classify_batch(*inputs[:4])
+    with_false = classify_batch(*inputs[:4], np.zeros(1000, dtype=bool))
+    for a, b in zip(without, with_false):
+        np.testing.assert_array_equal(a, b)
@@ -0,0 +1,110 @@
+import math
+import sys
+
+import pytest
+
+from gps_reader import CubeOrangeGPS, TimeSeriesRing
+
+
+class Message:
+    """Stand-in for a pymavlink message"""
+
+    def __init__(self, msg_type, **fields):
+        self._type = msg_type
+        self.__dict__.update(fields)
+
+    def get_type(self):
+        return self._type
+
+
+def position(lat, lon, alt=550.0, hdg=0):
+    return Message('GLOBAL_POSITION_INT', lat=int(lat * 1e7), lon=int(lon * 1e7), alt=int(alt * 1000),
+                   relative_alt=int((alt - 500) * 1000), hdg=hdg, vx=300, vy=400)
+
+
+def attitude(yaw, roll=0.0, pitch=0.0):
+    return Message('ATTITUDE', roll=roll, pitch=pitch, yaw=yaw)
+
+
+@pytest.fixture
+def gps():
+    return CubeOrangeGPS(connect_vehicle=False)
+
+
+def test_position_is_interpolated_between_samples(gps):
+    gps.handle_message(position(18.5, 73.8, alt=550.0), timestamp=10.0)
+    gps.handle_message(position(18.6, 73.9, alt=560.0), timestamp=12.0)
+    coords = gps.position_at(10.5)
+    assert coords['lat'] == pytest.approx(18.525)
+    assert coords['lon'] == pytest.approx(73.825)
+    assert coords['alt'] == pytest.approx(552.5)
+    assert coords['alt_relative'] == pytest.approx(52.5)
+    assert coords['position_dt'] == pytest.approx(0.5)
+    assert gps.get_coordinates()['speed'] == pytest.approx(5.0)
+
+
+def test_outside_the_buffered_range_clamps_to_the_nearest_sample(gps):
+    gps.handle_message(position(18.5, 73.8), timestamp=10.0)
+    gps.handle_message(position(18.6, 73.9), timestamp=12.0)
+    before, after = gps.position_at(9.0), gps.position_at(15.0)
+    assert (before['lat'], before['position_dt']) == (pytest.approx(18.5), pytest.approx(1.0))
+    assert (after['lat'], after['position_dt']) == (pytest.approx(18.6), pytest.approx(3.0))
+
+
+def test_without_history_the_latest_values_are_used(gps):
+    coords = gps.position_at(100.0)
+    assert coords['lat'] == 0.0 and coords['position_dt'] == math.inf
+
+
+def test_heading_and_yaw_interpolate_across_the_wraparound(gps):
+    gps.handle_message(position(18.5, 73.8, hdg=35000), timestamp=0.0)   # 350°
+    gps.handle_message(position(18.5, 73.8, hdg=1000), timestamp=1.0)    # 10°
+    gps.handle_message(attitude(math.pi - 0.1), timestamp=0.0)
+    gps.handle_message(attitude(-math.pi + 0.1), timestamp=1.0)
+    coords = gps.position_at(0.75)
+    assert coords['heading'] == pytest.approx(5.0)
+    # Along the short arc through ±pi, not back through 0
+    assert coords['yaw'] == pytest.approx(-math.pi + 0.05)
+    assert gps.position_at(0.25)['yaw'] == pytest.approx(math.pi - 0.05)
+
+
+def test_unknown_heading_keeps_the_last_known_one(gps):
+    gps.handle_message(position(18.5, 73.8, hdg=9000), timestamp=0.0)
+    gps.handle_message(position(18.5, 73.8, hdg=65535), timestamp=1.0)
+    assert gps.position_at(1.0)['heading'] == pytest.approx(90.0)
+
+
+def test_ring_keeps_the_newest_samples_in_order():
+    ring = TimeSeriesRing(('x',), size=4)
+    for t in range(10):
+        assert ring.append(float(t), x=t * 10.0)
+    assert not ring.append(3.0, x=0.0)  # Out of order: ignored
+    assert len(ring) == 4
+    assert ring.get_time_range() == (6.0, 9.0)
+    values, dt = ring.sample_at(7.5)
+    assert values['x'] == pytest.approx(75.0) and dt == pytest.approx(0.5)
+    assert ring.sample_at(2.0)[0]['x'] == 60.0  # Older than the ring: clamped
+
+
+def test_from_tlog_replays_the_recorded_messages(monkeypatch):
+    messages = [position(18.5, 73.8), Message('GPS_RAW_INT', fix_type=3, satellites_visible=14),
+                attitude(0.5), position(18.6, 73.9)]
+    for t, msg in enumerate(messages):
+        msg._timestamp = 100.0 + t
+
+    class Log:
+        def recv_match(self, type):
+            while messages:
+                msg = messages.pop(0)
+                if msg.get_type() in type:
+                    return msg
+            return None
+
+    # pymavlink's mavutil is only needed to read the file; feed the messages directly
+    mavutil = type('mavutil', (), {'mavlink_connection': staticmethod(lambda path: Log())})
+    monkeypatch.setitem(sys.modules, 'pymavlink', type('pymavlink', (), {'mavutil': mavutil}))
+    gps = CubeOrangeGPS.from_tlog('flight.tlog')
+    assert gps.positions.get_time_range() == (100.0, 103.0)
+    assert gps.has_fix() and gps.satellites == 14
+    assert gps.position_at(101.5)['lat'] == pytest.approx(18.55)
+    assert gps.position_at(102.0)['yaw'] == pytest.approx(0.5)
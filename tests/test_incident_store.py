@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+
+moto = pytest.importorskip('moto')
+
+from incident_store import IncidentStore, create_table, load_items, synthetic_items
+from upload_spool import UPLOADED_AT_FORMAT
+
+REGION = 'ap-south-1'
+
+
+@pytest.fixture
+def table():
+    with moto.mock_aws():
+        yield create_table(boto3.resource('dynamodb', region_name=REGION), 'Incidents')
+
+
+def items_at(start, count, devices=2):
+    return list(synthetic_items(count, devices=devices, start=start))
+
+
+def test_first_refresh_scans_everything(table):
+    start = datetime.now(timezone.utc) - timedelta(hours=1)
+    load_items(table, items_at(start, 40))
+    store = IncidentStore(table, scan_segments=4)
+    fresh = store.refresh()
+    assert len(fresh) == 40
+    assert set(store.watermarks) == {'GAGAN_NETRA_01', 'GAGAN_NETRA_02'}
+    assert store.refresh() == []
+
+
+def test_later_refreshes_query_only_new_uploads(table, monkeypatch):
+    start = datetime.now(timezone.utc) - timedelta(hours=1)
+    load_items(table, items_at(start, 20))
+    store = IncidentStore(table, lookback=0)
+    store.refresh()
+
+    new = items_at(start + timedelta(minutes=30), 6)
+    load_items(table, new)
+    scans = []
+    monkeypatch.setattr(table, 'scan', lambda **kwargs: scans.append(kwargs))
+    fresh = store.refresh()
+    assert {i['incident_id'] for i in fresh} == {i['incident_id'] for i in new}
+    assert scans == []
+
+
+def test_an_updated_item_is_returned_again(table):
+    start = datetime.now(timezone.utc) - timedelta(hours=1)
+    items = items_at(start, 4)
+    load_items(table, items)
+    store = IncidentStore(table)
+    store.refresh()
+
+    # E.g. a clip attached later: the spool bumps uploaded_at
+    later = datetime.now(timezone.utc).strftime(UPLOADED_AT_FORMAT)
+    table.update_item(Key={'incident_id': items[0]['incident_id']},
+                      UpdateExpression='SET clip_url = :c, uploaded_at = :u',
+                      ExpressionAttributeValues={':c': 'clip.avi', ':u': later})
+    fresh = store.refresh()
+    assert [i['incident_id'] for i in fresh] == [items[0]['incident_id']]
+    assert fresh[0]['clip_url'] == 'clip.avi'
+
+
+def test_late_visible_items_inside_the_lookback_are_not_missed(table):
+    start = datetime.now(timezone.utc) - timedelta(hours=1)
+    load_items(table, items_at(start, 4, devices=1))
+    store = IncidentStore(table, lookback=60)
+    store.refresh()
+
+    # Uploaded just before the watermark but only visible now (eventually consistent GSI)
+    watermark = datetime.strptime(store.watermarks['GAGAN_NETRA_01'], UPLOADED_AT_FORMAT)
+    late = items_at(watermark.replace(tzinfo=timezone.utc) - timedelta(seconds=30), 1, devices=1)
+    load_items(table, late)
+    assert [i['incident_id'] for i in store.refresh()] == [late[0]['incident_id']]
+
+
+def test_new_devices_are_polled(table):
+    store = IncidentStore(table)
+    assert store.refresh(device_ids=['GAGAN_NETRA_07']) == []
+    items = items_at(datetime.now(timezone.utc), 3)
+    for item in items:
+        item['device_id'] = 'GAGAN_NETRA_07'
+    load_items(table, items)
+    assert len(store.refresh()) == 3
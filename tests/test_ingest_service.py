@@ -0,0 +1,184 @@
+import asyncio
+import threading
+
+import pytest
+
+from ingest_service import IngestClient, IngestServer, LocalBackend, encode_frame, read_frame
+
+
+def put(incident_id, blob=None):
+    entry = {'op': 'put', 'id': incident_id, 'item': {'incident_id': incident_id, 'pm25': 120},
+             's3_key': f"evidence/{incident_id}.jpg" if blob else None, 'blob_size': len(blob) if blob else 0}
+    return entry, blob
+
+
+def update(incident_id, attributes):
+    return {'op': 'update', 'id': f"{incident_id}:1", 'key': {'incident_id': incident_id},
+            'attributes': attributes, 's3_key': None, 'blob_size': 0}, None
+
+
+async def connect(server, device_id='GAGAN_NETRA_01'):
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    writer.write(encode_frame({'op': 'hello', 'device_id': device_id}))
+    assert (await read_frame(reader))[0]['op'] == 'welcome'
+    return reader, writer
+
+
+async def send(writer, seq, batch):
+    writer.write(encode_frame({'op': 'batch', 'seq': seq, 'entries': [entry for entry, _ in batch]},
+                              [blob for _, blob in batch if blob]))
+    await writer.drain()
+
+
+def run_server(backend, check, **kwargs):
+    async def main():
+        server = IngestServer(backend, host='127.0.0.1', port=0, flush_interval=0.005, **kwargs)
+        await server.start()
+        try:
+            return await asyncio.wait_for(check(server), 10)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = LocalBackend(str(tmp_path))
+    yield backend
+    backend.close()
+
+
+def test_round_trip_stores_items_evidence_and_updates(backend, tmp_path):
+    async def check(server):
+        reader, writer = await connect(server)
+        await send(writer, 1, [put('a', b'jpeg-a'), put('b'), update('a', {'clip_url': 'clip.avi'})])
+        reply, _ = await read_frame(reader)
+        writer.close()
+        return reply
+
+    reply = run_server(backend, check)
+    assert reply == {'op': 'ack', 'seq': 1, 'entries': 3, 'duplicates': 0, 'rejected': {}}
+    assert backend.count() == 2
+    stored = backend.get('a')
+    assert stored['device_id'] == 'GAGAN_NETRA_01' and stored['clip_url'] == 'clip.avi'
+    assert (tmp_path / 'objects' / 'evidence' / 'a.jpg').read_bytes() == b'jpeg-a'
+
+
+def test_resent_batches_are_acknowledged_without_a_second_write(backend):
+    async def check(server):
+        reader, writer = await connect(server)
+        batch = [put('a'), update('a', {'detections': 3})]
+        await send(writer, 1, batch)
+        await read_frame(reader)
+        writes = server.m_flushes.labels('ok').value
+        await send(writer, 2, batch)  # The ack was lost: the spool sends it again
+        reply, _ = await read_frame(reader)
+        writer.close()
+        return reply, server.m_flushes.labels('ok').value - writes
+
+    reply, writes = run_server(backend, check)
+    assert reply['duplicates'] == 2 and writes == 0
+    assert backend.count() == 1
+
+
+def test_invalid_and_unstorable_entries_are_rejected_by_id(backend):
+    async def check(server):
+        reader, writer = await connect(server)
+        bad_key = ({'op': 'put', 'id': 'c', 'item': {'incident_id': 'c'}, 's3_key': '../../escape',
+                    'blob_size': 1}, b'x')
+        await send(writer, 1, [put('a'), ({'op': 'put', 'id': 'b', 'blob_size': 0}, None), bad_key, put('d')])
+        reply, _ = await read_frame(reader)
+        writer.close()
+        return reply
+
+    reply = run_server(backend, check)
+    assert reply['op'] == 'ack' and set(reply['rejected']) == {'b', 'c'}
+    assert backend.get('a') and backend.get('d') and backend.count() == 2
+
+
+class FlakyBackend(LocalBackend):
+    """Throttles every other write"""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.writes = 0
+
+    def write(self, entries, uploaded_at):
+        self.writes += 1
+        if self.writes % 2 == 0:
+            raise RuntimeError("ThrottlingException")
+        super().write(entries, uploaded_at)
+
+
+def test_transient_errors_fail_the_batch_instead_of_rejecting(tmp_path):
+    backend = FlakyBackend(str(tmp_path))
+
+    async def check(server):
+        reader, writer = await connect(server)
+        backend.writes = 1  # The first (whole flush) write fails
+        await send(writer, 1, [put(f"i{n}") for n in range(6)])
+        first, _ = await read_frame(reader)
+        await send(writer, 2, [put(f"i{n}") for n in range(6)])
+        retry, _ = await read_frame(reader)
+        writer.close()
+        return first, retry
+
+    first, retry = run_server(backend, check)
+    assert first['op'] == 'error' and 'Throttling' in first['error']
+    assert retry['op'] == 'ack' and retry['rejected'] == {}
+    assert backend.count() == 6
+    backend.close()
+
+
+class BlockingBackend(LocalBackend):
+    def __init__(self, root):
+        super().__init__(root)
+        self.release = threading.Event()
+
+    def write(self, entries, uploaded_at):
+        self.release.wait(10)
+        super().write(entries, uploaded_at)
+
+
+def test_a_full_queue_stops_reading_until_the_writer_catches_up(tmp_path):
+    backend = BlockingBackend(str(tmp_path))
+
+    async def check(server):
+        reader, writer = await connect(server)
+        async def send_all():
+            for seq in range(1, 41):
+                await send(writer, seq, [put(f"{seq}-{n}", b'x' * 4096) for n in range(10)])
+
+        sender = asyncio.create_task(send_all())
+        await asyncio.sleep(0.3)
+        depth, read = server.queue.qsize(), server.m_batches.value
+        acked = server.get_stats()['stored']
+        backend.release.set()
+        replies = [(await read_frame(reader))[0] for _ in range(40)]
+        await sender
+        writer.close()
+        return depth, read, acked, replies
+
+    depth, read, acked, replies = run_server(backend, check, max_queue=50, batch_size=20)
+    # The writer holds one flush; the queue is full and the connection is no longer read
+    assert depth == 50 and read < 10 and acked == 0
+    assert [r['seq'] for r in replies] == list(range(1, 41))
+    assert all(r['op'] == 'ack' for r in replies)
+    assert backend.count() == 400
+    backend.close()
+
+
+def test_blocking_client_round_trip(backend, tmp_path):
+    (tmp_path / 'blob').write_bytes(b'jpeg')
+
+    async def check(server):
+        client = IngestClient('127.0.0.1', server.port, device_id='GAGAN_NETRA_02')
+        entries = [{'op': 'put', 'id': 'x', 'item': {'incident_id': 'x'}, 's3_key': 'evidence/x.jpg',
+                    'blob': 'blob'}]
+        reply = await asyncio.get_running_loop().run_in_executor(None, client.send_batch, entries,
+                                                                 str(tmp_path))
+        client.close()
+        return reply
+
+    assert run_server(backend, check)['op'] == 'ack'
+    assert backend.get('x')['device_id'] == 'GAGAN_NETRA_02'
@@ -0,0 +1,87 @@
+import struct
+import time
+
+import pytest
+
+pytest.importorskip('serial')
+
+from pms7003_reader import FRAME_SIZE, PMS7003Parser, PMS7003Reader
+
+
+def frame(pm2_5=35, pm10=50):
+    """A valid 32-byte frame: header, length 28, 13 data words, checksum"""
+    words = [10, pm2_5, pm10, 11, pm2_5, pm10, 1000, 500, 100, 20, 5, 1, 0]
+    body = b'\x42\x4d' + struct.pack('>H', FRAME_SIZE - 4) + struct.pack('>13H', *words)
+    return body + struct.pack('>H', sum(body) & 0xFFFF)
+
+
+def test_decodes_a_frame():
+    samples = PMS7003Parser().feed(frame(pm2_5=42, pm10=60), timestamp=5.0)
+    assert len(samples) == 1
+    sample = samples[0]
+    assert (sample.timestamp, sample.pm2_5, sample.pm10, sample.pm2_5_cf1, sample.n0_3) == (5.0, 42, 60, 42, 1000)
+
+
+def test_bad_checksum_is_dropped_and_the_next_frame_read():
+    parser = PMS7003Parser()
+    corrupt = bytearray(frame(pm2_5=99))
+    corrupt[10] ^= 0xFF
+    samples = parser.feed(bytes(corrupt) + frame(pm2_5=7))
+    assert [s.pm2_5 for s in samples] == [7]
+    assert parser.checksum_errors == 1
+
+
+def test_resyncs_after_garbage_and_false_headers():
+    parser = PMS7003Parser()
+    # Noise, then a 0x42 0x4D with a wrong length field inside it
+    garbage = b'\x00\x13\x42\x4d\x00\x05\xff' + b'\x42'
+    samples = parser.feed(garbage + frame(pm2_5=12) + b'\x99' + frame(pm2_5=13))
+    assert [s.pm2_5 for s in samples] == [12, 13]
+    assert parser.length_errors == 1
+    assert parser.resyncs >= 2
+
+
+def test_short_reads_are_reassembled():
+    parser = PMS7003Parser()
+    data = frame(pm2_5=20) + frame(pm2_5=21)
+    samples = []
+    for i in range(0, len(data), 5):  # Frames split at arbitrary points, even inside the header
+        samples += parser.feed(data[i:i + 5])
+    assert [s.pm2_5 for s in samples] == [20, 21]
+    assert parser.checksum_errors == parser.length_errors == 0
+
+
+def test_truncated_frame_waits_for_the_rest():
+    parser = PMS7003Parser()
+    assert parser.feed(frame()[:FRAME_SIZE - 1]) == []
+    assert len(parser.buffer) == FRAME_SIZE - 1
+    assert len(parser.feed(frame()[FRAME_SIZE - 1:])) == 1
+
+
+class FakeStream:
+    """read(n) like a serial port: a chunk of the queued bytes, or b'' after a short wait"""
+
+    def __init__(self, data):
+        self.data = bytearray(data)
+
+    def read(self, n):
+        if not self.data:
+            time.sleep(0.01)
+            return b''
+        chunk = bytes(self.data[:7])
+        del self.data[:7]
+        return chunk
+
+
+def test_reader_publishes_from_a_stream_and_goes_stale():
+    reader = PMS7003Reader(stream=FakeStream(frame(pm2_5=30) + frame(pm2_5=31)), max_age=0.2)
+    try:
+        deadline = time.time() + 5
+        while reader.get_stats()['frames'] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert reader.get_latest().pm2_5 == 31
+        assert not reader.is_stale()
+        time.sleep(0.3)
+        assert reader.is_stale()
+    finally:
+        reader.close()
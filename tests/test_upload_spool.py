@@ -0,0 +1,122 @@
+import json
+import os
+import time
+
+import boto3
+import pytest
+
+moto = pytest.importorskip('moto')
+
+from incident_store import create_table
+from upload_spool import UploadSpool
+
+BUCKET = 'test-bucket'
+REGION = 'ap-south-1'
+
+
+@pytest.fixture
+def aws():
+    with moto.mock_aws():
+        s3 = boto3.client('s3', region_name=REGION)
+        table = create_table(boto3.resource('dynamodb', region_name=REGION), 'Incidents')
+        yield s3, table
+
+
+def make_spool(spool_dir, s3, table, **kwargs):
+    return UploadSpool(str(spool_dir), BUCKET, 'Incidents', region=REGION, s3_client=s3, table=table,
+                       min_backoff=0.02, max_backoff=0.05, fsync=False, **kwargs)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def item(incident_id):
+    return {'incident_id': incident_id, 'device_id': 'GAGAN_NETRA_01', 'pm25': 120, 'severity': 'HIGH'}
+
+
+def enqueue(spool, incident_id):
+    spool.enqueue(item(incident_id), blob=b'jpeg ' + incident_id.encode(), s3_key=f"evidence/{incident_id}.jpg")
+
+
+def stored_ids(table):
+    return {i['incident_id'] for i in table.scan()['Items']}
+
+
+def test_batch_uploads_evidence_and_items(tmp_path, aws):
+    s3, table = aws
+    s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': REGION})
+    spool = make_spool(tmp_path, s3, table)
+    for i in range(3):
+        enqueue(spool, f"inc-{i}")
+    spool.update('inc-1', {'clip_url': 'https://example/clip.avi'})
+    spool.start()
+    wait_for(lambda: spool.get_backlog() == 0)
+    spool.stop()
+
+    assert stored_ids(table) == {'inc-0', 'inc-1', 'inc-2'}
+    assert table.get_item(Key={'incident_id': 'inc-1'})['Item']['clip_url'] == 'https://example/clip.avi'
+    assert s3.get_object(Bucket=BUCKET, Key='evidence/inc-2.jpg')['Body'].read() == b'jpeg inc-2'
+    assert spool.uploaded == 4 and spool.failed == 0
+    assert os.listdir(tmp_path / 'blobs') == []
+    assert os.path.getsize(tmp_path / 'journal.jsonl') == 0  # Compacted
+
+
+def test_offline_backlog_is_uploaded_after_reconnect(tmp_path, aws):
+    s3, table = aws
+    spool = make_spool(tmp_path, s3, table)
+    for i in range(5):
+        enqueue(spool, f"inc-{i}")
+    spool.start()
+    # No bucket yet: every upload fails like a network error, nothing is set aside
+    wait_for(lambda: spool.failures >= 2)
+    assert not spool.online and spool.get_backlog() == 5 and spool.failed == 0
+
+    s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': REGION})
+    wait_for(lambda: spool.get_backlog() == 0)
+    spool.stop()
+    assert spool.online
+    assert stored_ids(table) == {f"inc-{i}" for i in range(5)}
+
+
+def test_journal_is_replayed_after_a_crash(tmp_path, aws):
+    s3, table = aws
+    s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': REGION})
+    spool = make_spool(tmp_path, s3, table)
+    for i in range(3):
+        enqueue(spool, f"inc-{i}")
+    spool._mark_done({'id': 'inc-0'})  # Uploaded before the crash
+    # Power lost mid-write: a torn last line, and the spool is never stopped
+    with open(tmp_path / 'journal.jsonl', 'a') as f:
+        f.write('{"op": "put", "id": "inc-3", "it')
+
+    recovered = make_spool(tmp_path, s3, table)
+    assert list(recovered.pending) == ['inc-1', 'inc-2']
+    recovered.start()
+    wait_for(lambda: recovered.get_backlog() == 0)
+    recovered.stop()
+    assert stored_ids(table) == {'inc-1', 'inc-2'}
+
+
+def test_bad_entries_are_set_aside_and_the_rest_uploaded(tmp_path, aws):
+    s3, table = aws
+    s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': REGION})
+    spool = make_spool(tmp_path, s3, table)
+    enqueue(spool, 'inc-0')
+    enqueue(spool, 'no-blob')
+    os.remove(tmp_path / 'blobs' / 'no-blob.bin')
+    spool.enqueue(item(''))  # Empty key: DynamoDB ValidationException
+    enqueue(spool, 'inc-1')
+    spool.start()
+    wait_for(lambda: spool.get_backlog() == 0)
+    spool.stop()
+
+    assert stored_ids(table) == {'inc-0', 'inc-1'}
+    assert spool.uploaded == 2 and spool.failed == 2
+    with open(tmp_path / 'failed.jsonl') as f:
+        failed = [json.loads(line) for line in f]
+    assert [entry['id'] for entry in failed] == ['no-blob', '']
+    assert all(entry['error'] for entry in failed)
@@ -1,21 +1,151 @@
+#!/usr/bin/env python3
+"""
+threaded_camera.py - Background capture thread for GAGAN NETRA
+
+The capture thread always holds only the newest frame. Every frame gets a
+monotonically increasing sequence number and a capture timestamp, so
+consumers can wait for a frame they have not seen yet (read_new) and skip
+duplicates. If the V4L2 device drops out (e.g. /dev/video42 while FFmpeg
+restarts), the thread reconnects with a short exponential backoff.
+"""
+
 import threading
+import time
+
 import cv2
 
+
 class ThreadedCamera:
-    def __init__(self, src=0):
-        self.capture = cv2.VideoCapture(src, cv2.CAP_V4L2)
-        self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 2)
-        self.thread = threading.Thread(target=self.update, args=())
-        self.thread.daemon = True
+    def __init__(self, src=0, api=cv2.CAP_V4L2, buffer_size=1,
+                 max_failures=10, min_backoff=0.1, max_backoff=2.0):
+        """
+        max_failures: consecutive failed reads before the device is reopened
+        min_backoff/max_backoff: reconnect delay range (seconds)
+        """
+        self.src = src
+        self.api = api
+        self.buffer_size = buffer_size
+        self.max_failures = max_failures
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        # Latest-frame slot, guarded by the condition variable
+        self._cond = threading.Condition()
+        self.frame = None
+        self.seq = 0
+        self.timestamp = 0.0
+        self._last_read_seq = 0
+
+        # Counters
+        self.dropped_frames = 0    # Captured but replaced before anyone read them
+        self.duplicate_reads = 0   # read() returned a frame that was already read
+        self.read_failures = 0
+        self.reconnects = 0
+
+        self.capture = self._open()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self.update, daemon=True)
         self.thread.start()
 
+    def _open(self):
+        """Open the device, falling back to the default backend. Returns None on failure"""
+        for api in (self.api, None):
+            capture = cv2.VideoCapture(self.src) if api is None else cv2.VideoCapture(self.src, api)
+            if capture.isOpened():
+                capture.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+                return capture
+            capture.release()
+        return None
+
     def update(self):
-        while True:
+        """Background thread: read frames and publish them into the slot"""
+        backoff = self.min_backoff
+        failures = 0
+        while not self._stop.is_set():
+            if self.capture is None:
+                self.capture = self._open()
+                if self.capture is None:
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                self.reconnects += 1
+                print(f"[CAMERA] Reconnected to {self.src}")
+
             ret, frame = self.capture.read()
             if not ret:
-                break
-            self.frame = frame
+                self.read_failures += 1
+                failures += 1
+                if failures >= self.max_failures:
+                    print(f"[CAMERA] {self.src} stopped delivering frames, reconnecting...")
+                    self.capture.release()
+                    self.capture = None
+                    failures = 0
+                else:
+                    self._stop.wait(0.01)
+                continue
+
+            failures = 0
+            backoff = self.min_backoff
+            with self._cond:
+                if self.frame is not None and self.seq != self._last_read_seq:
+                    self.dropped_frames += 1
+                self.frame = frame
+                self.seq += 1
+                self.timestamp = time.time()
+                self._cond.notify_all()
 
     def read(self):
-        return self.frame
+        """
+        Get the latest frame without waiting
+
+        Returns: (seq, timestamp, frame); frame is None before the first capture
+        """
+        with self._cond:
+            if self.frame is not None and self.seq == self._last_read_seq:
+                self.duplicate_reads += 1
+            self._last_read_seq = self.seq
+            return self.seq, self.timestamp, self.frame
+
+    def read_new(self, timeout=None):
+        """
+        Wait for a frame that has not been read yet
+
+        Returns: (seq, timestamp, frame); frame is None on timeout
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq > self._last_read_seq, timeout):
+                return self.seq, self.timestamp, None
+            self._last_read_seq = self.seq
+            return self.seq, self.timestamp, self.frame
+
+    def wait_ready(self, timeout=10.0):
+        """Block until the first frame arrives. Returns False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.frame is not None, timeout)
+
+    def get(self, prop_id):
+        """Pass-through to VideoCapture.get (0 while disconnected)"""
+        capture = self.capture
+        return capture.get(prop_id) if capture is not None else 0
+
+    def get_frame_size(self):
+        """(width, height) of the latest frame, or (0, 0) before the first one"""
+        frame = self.frame
+        if frame is None:
+            return 0, 0
+        return frame.shape[1], frame.shape[0]
+
+    def get_stats(self):
+        return {
+            'frames': self.seq,
+            'dropped': self.dropped_frames,
+            'duplicates': self.duplicate_reads,
+            'read_failures': self.read_failures,
+            'reconnects': self.reconnects,
+        }
 
+    def release(self):
+        self._stop.set()
+        self.thread.join(timeout=2)
+        if self.capture is not None:
+            self.capture.release()
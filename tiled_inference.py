@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+tiled_inference.py - Tiled high-resolution detection for GAGAN NETRA
+
+A full camera frame passed to the detector is shrunk to its input size, so
+from flight altitude an early fire or a thin smoke plume ends up a few
+pixels wide and is missed. TiledDetector wraps a YOLO model and also runs
+it on overlapping full-resolution crops:
+
+    full      the whole frame is covered by overlapping tiles (used at or
+              above `full_altitude`, where fires are smallest)
+    adaptive  a coarse full-frame pass runs first, and crops are only taken
+              around its weak candidates (confidence between
+              `candidate_conf` and the detection threshold) to confirm them
+
+All crops of a frame go to the model as one batched call. Their boxes are
+mapped back to frame coordinates and merged with the coarse pass by
+class-aware NMS that grows each kept box over the ones it suppresses.
+Overlap is measured as intersection over the smaller box, so the pieces of
+a fire cut by a tile seam collapse into one box.
+
+The wrapper has the YOLO call signature and returns a list with one result
+whose `boxes` iterate like ultralytics Boxes (xyxy, conf, cls).
+"""
+
+import math
+import types
+
+import numpy as np
+
+TILE_MODES = ('off', 'adaptive', 'full')
+
+
+# ============================================================
+# BOX GEOMETRY
+# ============================================================
+def pairwise_overlap(a, b, metric='iou'):
+    """
+    Pairwise overlap of xyxy boxes: (N, 4) x (M, 4) -> (N, M)
+
+    metric: 'iou' (intersection over union) or 'ios' (intersection over
+    the smaller box, 1.0 when one box contains the other)
+    """
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    if metric == 'ios':
+        return inter / np.maximum(np.minimum(area_a, area_b), 1e-9)
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def _suppress(boxes, scores, threshold, classes, metric):
+    """Greedy suppression: (score order, keep mask, owner = kept box that suppressed each box)"""
+    order = np.argsort(-scores, kind='stable')
+    ordered = boxes[order]
+    if classes is not None:
+        # Shift each class to its own region so cross-class pairs never overlap
+        span = float(ordered.max()) + 1.0
+        ordered = ordered + (np.asarray(classes, dtype=np.float32).reshape(-1)[order] * span)[:, None]
+    overlap = pairwise_overlap(ordered, ordered, metric)
+    keep = np.ones(len(order), dtype=bool)
+    owner = np.arange(len(order))
+    for i in range(len(order)):
+        if keep[i]:
+            suppressed = keep[i + 1:] & (overlap[i, i + 1:] > threshold)
+            owner[i + 1:][suppressed] = i
+            keep[i + 1:] &= ~suppressed
+    return order, keep, owner
+
+
+def nms(boxes, scores, threshold=0.5, classes=None, metric='iou'):
+    """
+    Greedy non-maximum suppression
+
+    The overlap matrix is computed once for all pairs; each kept box then
+    suppresses its lower-scored neighbours with one vector operation.
+    classes: boxes of different classes never suppress each other
+    Returns indices of the kept boxes, best first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    if not len(boxes):
+        return np.zeros(0, dtype=np.int64)
+    order, keep, _ = _suppress(boxes, scores, threshold, classes, metric)
+    return order[keep]
+
+
+def merge_boxes(boxes, scores, classes, threshold=0.6, metric='ios'):
+    """
+    NMS that grows each kept box to cover the boxes it suppresses
+
+    Repeated until nothing merges, so the halves of a fire split by a tile
+    seam end up as one box. Returns (boxes, scores, classes), best first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    classes = np.asarray(classes, dtype=np.float32).reshape(-1)
+    while len(boxes):
+        order, keep, owner = _suppress(boxes, scores, threshold, classes, metric)
+        ordered = boxes[order]
+        kept = np.flatnonzero(keep)
+        merged = ordered[kept].copy()
+        slot = np.searchsorted(kept, owner)  # Row of `merged` each box belongs to
+        np.minimum.at(merged[:, 0], slot, ordered[:, 0])
+        np.minimum.at(merged[:, 1], slot, ordered[:, 1])
+        np.maximum.at(merged[:, 2], slot, ordered[:, 2])
+        np.maximum.at(merged[:, 3], slot, ordered[:, 3])
+        done = len(kept) == len(boxes)
+        boxes, scores, classes = merged, scores[order][kept], classes[order][kept]
+        if done:
+            break
+    return boxes, scores, classes
+
+
+def tile_grid(width, height, tile, overlap=0.2):
+    """
+    Overlapping tiles covering a width x height frame: (N, 4) xyxy ints
+
+    Tiles are `tile` pixels square (smaller only if the frame is) and are
+    spread evenly, so the overlap is at least `overlap` of a tile.
+    """
+    def starts(length):
+        if length <= tile:
+            return [0]
+        stride = tile * (1.0 - overlap)
+        count = math.ceil((length - tile) / stride) + 1
+        return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+    return np.array([(x, y, min(width, x + tile), min(height, y + tile))
+                     for y in starts(height) for x in starts(width)], dtype=np.int64).reshape(-1, 4)
+
+
+def crop_around(box, width, height, tile):
+    """A tile x tile crop centred on `box`, shifted to stay inside the frame"""
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    x0 = int(min(max(cx - tile / 2, 0), max(width - tile, 0)))
+    y0 = int(min(max(cy - tile / 2, 0), max(height - tile, 0)))
+    return x0, y0, min(width, x0 + tile), min(height, y0 + tile)
+
+
+# ============================================================
+# RESULTS
+# ============================================================
+def result_arrays(results):
+    """(boxes (N, 4), confs (N,), classes (N,)) from a list of YOLO results"""
+    boxes, confs, classes = [], [], []
+    for result in results:
+        if not result.boxes:
+            continue
+        for box in result.boxes:
+            boxes.append(_numpy(box.xyxy[0]))
+            confs.append(float(box.conf[0]))
+            classes.append(float(box.cls[0]) if getattr(box, 'cls', None) is not None else 0.0)
+    return (np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            np.array(confs, dtype=np.float32), np.array(classes, dtype=np.float32))
+
+
+def _numpy(value):
+    return value.cpu().numpy() if hasattr(value, 'cpu') else np.asarray(value)
+
+
+class MergedBoxes:
+    """Merged detections with the parts of the ultralytics Boxes API main.py uses"""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        for i in range(len(self.conf)):
+            yield types.SimpleNamespace(xyxy=self.xyxy[i:i + 1], conf=self.conf[i:i + 1],
+                                        cls=self.cls[i:i + 1])
+
+
+class MergedResult:
+    def __init__(self, xyxy, conf, cls):
+        self.boxes = MergedBoxes(xyxy, conf, cls)
+
+
+# ============================================================
+# TILED DETECTOR
+# ============================================================
+class TiledDetector:
+    def __init__(self, model, mode='adaptive', tile=640, overlap=0.2, candidate_conf=0.15,
+                 full_altitude=60.0, max_crops=4, merge_threshold=0.6, max_batch=0):
+        """
+        model: YOLO model (or anything with its call signature accepting a list of images)
+        tile: crop size in frame pixels; the model input size keeps crops at full resolution
+        full_altitude: metres above home at or above which 'adaptive' tiles the
+                       whole frame (None = never)
+        max_crops: candidate crops per frame in adaptive mode (highest confidence first)
+        merge_threshold: intersection-over-smaller-box above which boxes are merged
+        max_batch: largest batch per model call (0 = all crops at once), for
+                   engines exported with a fixed batch size
+        """
+        if mode not in TILE_MODES:
+            raise ValueError(f"Unknown tile mode {mode!r} (expected one of {TILE_MODES})")
+        self.model = model
+        self.mode = mode
+        self.tile = tile
+        self.overlap = overlap
+        self.candidate_conf = candidate_conf
+        self.full_altitude = full_altitude
+        self.max_crops = max_crops
+        self.merge_threshold = merge_threshold
+        self.max_batch = max_batch
+
+        self.frames = 0
+        self.full_frames = 0   # Frames tiled completely
+        self.crops_run = 0
+        self.last_crops = 0
+
+    def select_mode(self, altitude=None):
+        """The mode used for a frame taken at `altitude` (metres above home, None = unknown)"""
+        if self.mode != 'adaptive':
+            return self.mode
+        if self.full_altitude is not None and altitude is not None and altitude >= self.full_altitude:
+            return 'full'
+        return 'adaptive'
+
+    def _run_batch(self, images, conf):
+        results = []
+        step = self.max_batch or len(images)
+        for start in range(0, len(images), step):
+            results.extend(self.model(images[start:start + step], conf=conf, verbose=False))
+        return results
+
+    def __call__(self, frame, conf=0.25, verbose=False, altitude=None):
+        self.frames += 1
+        mode = self.select_mode(altitude)
+        height, width = frame.shape[:2]
+        if mode == 'off':
+            self.last_crops = 0
+            return self.model(frame, conf=conf, verbose=verbose)
+
+        if mode == 'full':
+            crops = tile_grid(width, height, self.tile, self.overlap)
+            if len(crops) == 1:
+                self.last_crops = 0  # The frame fits in one tile: nothing to gain
+                return self.model(frame, conf=conf, verbose=verbose)
+            # The full frame rides in the same batch, for fires larger than a tile
+            results = self._run_batch([frame] + [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in crops],
+                                      conf)
+            coarse, tiled = results[:1], results[1:]
+            self.full_frames += 1
+        else:
+            coarse = self.model(frame, conf=min(conf, self.candidate_conf), verbose=verbose)
+            boxes, confs, _ = result_arrays(coarse)
+            weak = np.flatnonzero(confs < conf)
+            weak = weak[np.argsort(-confs[weak], kind='stable')]
+            crops = []
+            for i in weak:
+                box = boxes[i]
+                # One crop can confirm several nearby candidates
+                if any(box[0] >= x0 and box[1] >= y0 and box[2] <= x1 and box[3] <= y1
+                       for x0, y0, x1, y1 in crops):
+                    continue
+                if len(crops) >= self.max_crops:
+                    break
+                crops.append(crop_around(box, width, height, self.tile))
+            crops = np.array(crops, dtype=np.int64).reshape(-1, 4)
+            tiled = self._run_batch([frame[y0:y1, x0:x1] for x0, y0, x1, y1 in crops], conf) \
+                if len(crops) else []
+
+        self.last_crops = len(crops)
+        self.crops_run += len(crops)
+        return [self._merge(coarse, tiled, crops, conf)]
+
+    def _merge(self, coarse, tiled, crops, conf):
+        """Coarse + crop detections in frame coordinates, above `conf`, overlaps merged"""
+        parts = [result_arrays(coarse)]
+        for (x0, y0, x1, y1), result in zip(crops, tiled):
+            boxes, confs, classes = result_arrays([result])
+            if len(boxes):
+                boxes = boxes + np.array([x0, y0, x0, y0], dtype=np.float32)
+                boxes = np.clip(boxes, [x0, y0, x0, y0], [x1, y1, x1, y1])
+            parts.append((boxes, confs, classes))
+        boxes = np.concatenate([p[0] for p in parts])
+        confs = np.concatenate([p[1] for p in parts])
+        classes = np.concatenate([p[2] for p in parts])
+        above = confs >= conf
+        boxes, confs, classes = boxes[above], confs[above], classes[above]
+        return MergedResult(*merge_boxes(boxes, confs, classes, self.merge_threshold))
+
+    def get_stats(self):
+        return {
+            'mode': self.mode,
+            'frames': self.frames,
+            'full_frames': self.full_frames,
+            'crops': self.crops_run,
+            'last_crops': self.last_crops,
+        }
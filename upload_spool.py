@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+upload_spool.py - Offline-first upload spool for GAGAN NETRA
+
+Incidents are appended to an on-disk journal (plus one evidence blob per
+incident) and drained to S3/DynamoDB by a background uploader thread.
+Nothing is dropped when the UAV is offline: pending entries survive a
+restart and are retried with exponential backoff once connectivity returns.
+
+Journal format (one JSON object per line):
+    {"op": "put",    "id": ..., "item": {...}, "s3_key": ..., "blob": ..., "content_type": ...}
+    {"op": "update", "id": ..., "key": {...}, "attributes": {...}, "s3_key": ..., "blob": ..., ...}
+    {"op": "done",   "id": ...}
+
+Updates add attributes to an item already queued with "put" (e.g. a clip
+recorded after the incident); they are applied in journal order.
+
+An entry that can never be uploaded (its blob file is gone, DynamoDB
+rejects the item) is moved to failed.jsonl (blob to failed/) instead of
+blocking the entries behind it; any other error means "offline".
+
+With an IngestClient (ingest_service.py) batches go to the ground
+ingestion service over one persistent connection instead of straight to
+AWS; the service acknowledges a batch once it has stored it, listing
+the entries it rejected (those are set aside like failed AWS entries).
+"""
+
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ParamValidationError
+
+
+# uploaded_at is stamped on every item at upload time; the dashboard polls
+# for new incidents by it (fixed width, so strings sort by time)
+UPLOADED_AT_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+# AWS errors caused by the entry itself; throttling, credentials, missing
+# tables etc. affect every entry and are retried like a network error
+ENTRY_ERROR_CODES = {'ValidationException', 'SerializationException', 'ItemCollectionSizeLimitExceededException',
+                     'EntityTooLarge', 'InvalidArgument', 'KeyTooLongError', 'InvalidRequest'}
+
+
+class SerialisationError(TypeError):
+    """An entry holds a value that cannot be written as JSON"""
+
+
+def _is_entry_error(error):
+    """True if retrying cannot help: the entry itself is bad"""
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code') in ENTRY_ERROR_CODES
+    # Missing blob file; botocore refusing the request parameters; an
+    # unserialisable value. Anything else (bugs included) means "offline"
+    return isinstance(error, (FileNotFoundError, ParamValidationError, SerialisationError))
+
+
+def _to_json(value):
+    """json.dumps fallback for DynamoDB Decimals"""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise SerialisationError(f"Cannot serialise {type(value).__name__}")
+
+
+def set_attributes(table, key, attributes):
+    """DynamoDB update_item setting `attributes` on the item with `key`"""
+    names = {f"#a{i}": name for i, name in enumerate(attributes)}
+    values = {f":v{i}": value for i, value in enumerate(attributes.values())}
+    table.update_item(
+        Key=key,
+        UpdateExpression='SET ' + ', '.join(f"#a{i} = :v{i}" for i in range(len(attributes))),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+class UploadSpool:
+    def __init__(self, spool_dir, bucket, table_name, region='ap-south-1',
+                 s3_client=None, table=None, endpoint_url=None, ingest=None,
+                 batch_size=25, min_backoff=1.0, max_backoff=60.0, fsync=True):
+        self.spool_dir = spool_dir
+        self.blob_dir = os.path.join(spool_dir, 'blobs')
+        self.journal_path = os.path.join(spool_dir, 'journal.jsonl')
+        self.bucket = bucket
+        self.table_name = table_name
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.batch_size = batch_size
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.fsync = fsync
+
+        # Clients may be injected (moto / DynamoDB Local); otherwise created once, lazily
+        self.s3_client = s3_client
+        self.table = table
+        self.ingest = ingest  # IngestClient: upload through the ground service instead
+
+        self.pending = OrderedDict()  # incident_id -> journal entry
+        self.uploaded = 0
+        self.failures = 0
+        self.failed = 0     # Entries moved to failed.jsonl
+        self.online = False
+        self.running = False
+        self.upload_thread = None
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._load_journal()
+        self._journal = open(self.journal_path, 'a')
+        if self.pending:
+            print(f"[SPOOL] Recovered {len(self.pending)} pending incident(s)")
+
+    # ------------------------------------------------------------
+    # Journal
+    # ------------------------------------------------------------
+    def _load_journal(self):
+        """Rebuild the pending set from the journal, ignoring a torn last line"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line, parse_float=Decimal)
+                except ValueError:
+                    continue
+                if entry.get('op') in ('put', 'update'):
+                    self.pending[entry['id']] = entry
+                elif entry.get('op') == 'done':
+                    self.pending.pop(entry['id'], None)
+
+    def _append(self, entry):
+        line = json.dumps(entry, default=_to_json)
+        with self._journal_lock:
+            self._journal.write(line + '\n')
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+        return line
+
+    def _compact(self):
+        """Truncate the journal once everything in it has been uploaded"""
+        with self._cond, self._journal_lock:
+            if self.pending:
+                return
+            self._journal.close()
+            self._journal = open(self.journal_path, 'w')
+
+    # ------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------
+    def enqueue(self, item, blob=None, s3_key=None, content_type='image/jpeg', blob_path=None):
+        """
+        Durably queue an incident for upload
+
+        item must contain 'incident_id'; blob (bytes) is uploaded to s3_key first.
+        blob_path: file already holding the blob (e.g. the local evidence JPEG);
+        it is hard-linked into the spool instead of written a second time.
+        """
+        incident_id = item['incident_id']
+        blob_name = None
+        if blob is not None or blob_path is not None:
+            blob_name = f"{incident_id}.bin"
+            self._store_blob(blob_name, blob, blob_path)
+
+        with self._cond:
+            line = self._append({
+                'op': 'put',
+                'id': incident_id,
+                'item': item,
+                's3_key': s3_key,
+                'blob': blob_name,
+                'content_type': content_type,
+            })
+            # Same representation as after a restart
+            self.pending[incident_id] = json.loads(line, parse_float=Decimal)
+            self._cond.notify()
+
+    def update(self, incident_id, attributes, blob=None, s3_key=None, content_type='image/jpeg',
+               blob_path=None):
+        """
+        Durably queue new attributes for an incident already enqueued
+
+        The blob, if any, is uploaded to s3_key first; the item's uploaded_at
+        is bumped so the dashboard picks up the change.
+        """
+        update_id = f"{incident_id}:{uuid.uuid4().hex[:12]}"  # Several updates may be pending
+        blob_name = None
+        if blob is not None or blob_path is not None:
+            blob_name = update_id.replace(':', '_') + '.bin'
+            self._store_blob(blob_name, blob, blob_path)
+
+        with self._cond:
+            line = self._append({
+                'op': 'update',
+                'id': update_id,
+                'key': {'incident_id': incident_id},
+                'attributes': attributes,
+                's3_key': s3_key,
+                'blob': blob_name,
+                'content_type': content_type,
+            })
+            self.pending[update_id] = json.loads(line, parse_float=Decimal)
+            self._cond.notify()
+
+    def _store_blob(self, blob_name, blob, blob_path):
+        path = os.path.join(self.blob_dir, blob_name)
+        tmp_path = path + '.tmp'
+        if blob_path is not None:
+            try:
+                os.link(blob_path, tmp_path)
+            except OSError:
+                if blob is None:
+                    with open(blob_path, 'rb') as f:
+                        blob = f.read()
+            else:
+                if self.fsync:
+                    fd = os.open(tmp_path, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                os.replace(tmp_path, path)
+                return
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def get_backlog(self):
+        """Number of incidents waiting for upload"""
+        return len(self.pending)
+
+    # ------------------------------------------------------------
+    # Uploader thread
+    # ------------------------------------------------------------
+    def start(self):
+        self.running = True
+        self.upload_thread = threading.Thread(target=self._upload_loop, daemon=True)
+        self.upload_thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the uploader; anything still pending stays in the journal"""
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self.upload_thread:
+            self.upload_thread.join(timeout)
+        if self.ingest:
+            self.ingest.close()
+        with self._journal_lock:
+            self._journal.close()
+
+    def _get_clients(self):
+        if self.s3_client is None or self.table is None:
+            config = Config(
+                connect_timeout=2,
+                read_timeout=5,
+                retries={'max_attempts': 2, 'mode': 'standard'},
+                max_pool_connections=4,
+            )
+            if self.s3_client is None:
+                self.s3_client = boto3.client('s3', region_name=self.region, config=config,
+                                              endpoint_url=self.endpoint_url)
+            if self.table is None:
+                dynamodb = boto3.resource('dynamodb', region_name=self.region, config=config,
+                                          endpoint_url=self.endpoint_url)
+                self.table = dynamodb.Table(self.table_name)
+        return self.s3_client, self.table
+
+    def _upload_loop(self):
+        backoff = self.min_backoff
+        while self.running:
+            with self._cond:
+                while self.running and not self.pending:
+                    self._cond.wait(1.0)
+                if not self.running:
+                    break
+                batch = list(self.pending.values())[:self.batch_size]
+
+            try:
+                try:
+                    rejected = self._upload_batch(batch)
+                except Exception as e:
+                    if not _is_entry_error(e):
+                        raise
+                    # Find the bad entries; the rest still go up
+                    self._upload_each(batch)
+                else:
+                    self._settle(batch, rejected)
+            except Exception as e:
+                self.failures += 1
+                if self.online:
+                    print(f"[SPOOL] Upload failed, going offline: {e}")
+                self.online = False
+                # Sleep, but wake up promptly on stop()
+                with self._cond:
+                    self._cond.wait_for(lambda: not self.running, timeout=backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+
+            if not self.online:
+                print("[SPOOL] Online - uploading backlog")
+            self.online = True
+            backoff = self.min_backoff
+            if not self.pending:
+                self._compact()
+
+    def _upload_batch(self, batch):
+        """Upload entries; returns {id: reason} for those the ingest service rejected"""
+        if self.ingest:
+            return self.ingest.send_batch(batch, self.blob_dir).get('rejected') or {}
+        s3_client, table = self._get_clients()
+
+        # Evidence first, so an item never points at a missing object
+        for entry in batch:
+            if entry.get('blob') and entry.get('s3_key'):
+                with open(os.path.join(self.blob_dir, entry['blob']), 'rb') as f:
+                    s3_client.put_object(
+                        Bucket=self.bucket,
+                        Key=entry['s3_key'],
+                        Body=f.read(),
+                        ACL='public-read',
+                        ContentType=entry.get('content_type', 'image/jpeg')
+                    )
+
+        uploaded_at = datetime.now(timezone.utc).strftime(UPLOADED_AT_FORMAT)
+        with table.batch_writer() as writer:
+            for entry in batch:
+                if entry.get('op', 'put') == 'put':
+                    writer.put_item(Item=dict(entry['item'], uploaded_at=uploaded_at))
+        # Updates after the puts (a batch may hold both for one incident)
+        for entry in batch:
+            if entry.get('op') == 'update':
+                set_attributes(table, entry['key'], dict(entry['attributes'], uploaded_at=uploaded_at))
+        return {}
+
+    def _upload_each(self, batch):
+        """Upload entries one at a time, setting aside those that fail on their own"""
+        for entry in batch:
+            try:
+                rejected = self._upload_batch([entry])
+            except Exception as e:
+                if not _is_entry_error(e):
+                    raise
+                self._set_aside(entry, e)
+            else:
+                self._settle([entry], rejected)
+
+    def _settle(self, batch, rejected):
+        """Mark uploaded entries done; set aside the ones the ingest service rejected"""
+        for entry in batch:
+            if entry['id'] in rejected:
+                self._set_aside(entry, rejected[entry['id']])
+            else:
+                self._mark_done(entry)
+
+    def _set_aside(self, entry, error):
+        """Move an entry that cannot be uploaded (and its blob) out of the journal"""
+        print(f"[SPOOL] ? Cannot upload {entry['id']}, moved to failed.jsonl: {error}")
+        if entry.get('blob'):
+            failed_dir = os.path.join(self.spool_dir, 'failed')
+            os.makedirs(failed_dir, exist_ok=True)
+            try:
+                os.replace(os.path.join(self.blob_dir, entry['blob']), os.path.join(failed_dir, entry['blob']))
+            except OSError:
+                pass
+        with open(os.path.join(self.spool_dir, 'failed.jsonl'), 'a') as f:
+            f.write(json.dumps(dict(entry, error=str(error)), default=_to_json) + '\n')
+        self.failed += 1
+        self._mark_done(entry, uploaded=False)
+
+    def _mark_done(self, entry, uploaded=True):
+        self._append({'op': 'done', 'id': entry['id']})
+        with self._cond:
+            self.pending.pop(entry['id'], None)
+        if uploaded:
+            self.uploaded += 1
+        if entry.get('blob'):
+            try:
+                os.remove(os.path.join(self.blob_dir, entry['blob']))
+            except OSError:
+                pass
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+video_recorder.py - Segmented flight recorder for GAGAN NETRA
+
+Replaces the single ever-growing flight_*.avi written at a hardcoded 5 fps:
+
+    Timing    frames are placed by capture timestamp. Gaps are filled by
+              repeating the previous frame and frames that arrive faster
+              than the segment rate are skipped, so playback runs at real
+              speed whatever the loop rate was. Each segment's fps is the
+              capture rate measured so far.
+    Segments  the recording rotates every `segment_seconds` or
+              `segment_bytes`, and after capture gaps longer than
+              `max_gap`, so a crash loses at most the open segment.
+
+Writing happens on the pipeline's 'record' stage thread; queueing and the
+drop policy under backpressure are handled by its StageQueue (see main.py).
+"""
+
+import os
+import statistics
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+
+DROP_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+class VideoRecorder:
+    def __init__(self, directory, fps=5.0, fourcc='XVID', extension='avi', prefix='flight',
+                 segment_seconds=60.0, segment_bytes=512 * 2**20, max_gap=2.0):
+        """
+        fps: segment rate if the capture rate cannot be measured from the
+             first frames (held back for up to `max_gap` seconds)
+        max_gap: capture gaps longer than this (seconds) start a new segment
+                 instead of being filled with repeated frames
+        """
+        self.directory = directory
+        self.nominal_fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.extension = extension
+        self.prefix = prefix
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.max_gap = max_gap
+
+        self.filename = None
+        self.fps = fps
+        self.segments = 0
+        self.frames_written = 0
+        self.frames_duplicated = 0  # Repeats written to keep real-time playback
+        self.frames_skipped = 0     # Arrived faster than the segment rate
+        self.lag = 0.0              # Seconds from pipeline entry to written, last frame
+
+        self._writer = None
+        self._size = None
+        self._segment_start = 0.0
+        self._segment_frames = 0
+        self._size_checked_at = 0  # _segment_frames at the last file size check
+        self._last_frame = None
+        self._last_timestamp = None
+        self._intervals = deque(maxlen=100)
+        self._warmup = []  # (frame, timestamp, received) before the first segment
+
+        os.makedirs(directory, exist_ok=True)
+
+    # ------------------------------------------------------------
+    # Segments
+    # ------------------------------------------------------------
+    def _measured_fps(self):
+        if len(self._intervals) < 5:
+            return self.nominal_fps
+        interval = statistics.median(self._intervals)
+        return min(60.0, max(1.0, round(1.0 / interval, 1))) if interval > 0 else self.nominal_fps
+
+    def _open_segment(self, frame, timestamp):
+        self._close_segment()
+        self._size = (frame.shape[1], frame.shape[0])
+        self.fps = self._measured_fps()
+        stamp = datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S")
+        self.filename = os.path.join(self.directory,
+                                     f"{self.prefix}_{stamp}_{self.segments:04d}.{self.extension}")
+        self._writer = cv2.VideoWriter(self.filename, self.fourcc, self.fps, self._size)
+        self._segment_start = timestamp
+        self._segment_frames = 0
+        self._size_checked_at = 0
+        self.segments += 1
+        print(f"[VIDEO] Recording segment {self.filename} ({self.fps:.1f} fps)")
+
+    def _close_segment(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+            print(f"[VIDEO] Segment saved: {self.filename} ({self._segment_frames} frames)")
+
+    def _segment_full(self, timestamp):
+        if timestamp - self._segment_start >= self.segment_seconds:
+            return True
+        # File size only changes meaningfully every few frames
+        if self._segment_frames - self._size_checked_at >= 30:
+            self._size_checked_at = self._segment_frames
+            try:
+                return os.path.getsize(self.filename) >= self.segment_bytes
+            except OSError:
+                return False
+        return False
+
+    # ------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------
+    def write(self, frame, timestamp, received=None):
+        """
+        Record `frame` captured at `timestamp` (epoch seconds)
+
+        received: time.perf_counter() when the frame entered the pipeline,
+        used for the lag metric
+        """
+        gap = None if self._last_timestamp is None else timestamp - self._last_timestamp
+        if gap is not None and gap < 0:
+            self.frames_skipped += 1  # Out of order
+            return
+        if gap is not None and 0 < gap <= self.max_gap:
+            self._intervals.append(gap)
+        self._last_timestamp = timestamp
+
+        if self._warmup is not None:
+            # Measure the capture rate before the first segment fixes its fps
+            self._warmup.append((frame, timestamp, received))
+            if len(self._intervals) < 5 and timestamp - self._warmup[0][1] < self.max_gap:
+                return
+            warmup, self._warmup = self._warmup, None
+            for args in warmup:
+                self._place(*args, gap=0.0)
+            return
+        self._place(frame, timestamp, received, gap)
+
+    def _place(self, frame, timestamp, received, gap):
+        if (self._writer is None or gap > self.max_gap or self._segment_full(timestamp)):
+            self._open_segment(frame, timestamp)
+        if (frame.shape[1], frame.shape[0]) != self._size:
+            frame = cv2.resize(frame, self._size)
+
+        # Frames that should exist in this segment once `frame` is shown
+        target = int((timestamp - self._segment_start) * self.fps) + 1
+        if target <= self._segment_frames:
+            self.frames_skipped += 1
+        else:
+            for _ in range(target - self._segment_frames - 1):
+                self._writer.write(self._last_frame)
+                self.frames_duplicated += 1
+            self._writer.write(frame)
+            self._segment_frames = target
+            self._last_frame = frame
+            self.frames_written += 1
+        if received is not None:
+            self.lag = time.perf_counter() - received
+
+    def get_stats(self):
+        return {
+            'segments': self.segments,
+            'file': self.filename,
+            'fps': self.fps,
+            'written': self.frames_written,
+            'duplicated': self.frames_duplicated,
+            'skipped': self.frames_skipped,
+            'lag_s': self.lag,
+        }
+
+    def close(self):
+        if self._warmup:
+            warmup, self._warmup = self._warmup, None
+            for args in warmup:
+                self._place(*args, gap=0.0)
+        self._close_segment()